@@ -0,0 +1,355 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .cached_objects import CacheDir, cache_stats, touch_cache_entry
+from .prefix_list import PrefixListEntry
+from .version import __version__
+
+
+def _to_json(obj):
+    # Config views, prefix list entries, ...
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError("{!r} is not JSON serializable".format(obj))
+
+def get_fingerprint(obj):
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, default=_to_json).encode("utf-8")
+    ).hexdigest()
+
+class BuildState(object):
+    """Fingerprints of the clients used by the previous build
+
+    Clients are fingerprinted on the basis of their configuration, with
+    the options inherited from the general one, and of the AS-SETs they
+    use: clients which have been added, removed or changed since the
+    previous build are reported.
+
+    One state is kept for each build ID, saved as JSON.
+    """
+
+    DIRNAME = "build_state"
+
+    def __init__(self, cache_dir, build_id):
+        self.path = os.path.join(cache_dir, self.DIRNAME,
+                                 "{}.json".format(build_id))
+
+        self.prev = _load_state(self.path)
+
+        # <ip>: {"id", "fp", "as_sets_fp"}
+        self.clients = {}
+        self.clients_order = []
+
+    def add_client(self, client):
+        """Fingerprint the client's configuration.
+
+        It must be done before the enrichers add their data to it.
+        """
+        self.clients[client["ip"]] = {
+            "id": client["id"],
+            "fp": get_fingerprint(
+                dict((k, v) for k, v in client.items() if k != "id")
+            ),
+            "as_sets_fp": None
+        }
+        self.clients_order.append(client["ip"])
+
+    def set_client_as_sets(self, ip, as_set_names):
+        self.clients[ip]["as_sets_fp"] = get_fingerprint(as_set_names)
+
+    def get_clients_diff(self):
+        """Clients added, removed and changed since the previous build.
+
+        Returns:
+            dict, {"added", "removed", "changed"}: lists of IP addresses,
+            or None if the state of the previous build is not available.
+        """
+        if self.prev is None:
+            return None
+
+        prev_clients = self.prev["clients"]
+        res = {"added": [], "removed": [], "changed": []}
+        for ip in self.clients_order:
+            if ip not in prev_clients:
+                res["added"].append(ip)
+            elif prev_clients[ip]["fp"] != self.clients[ip]["fp"] or \
+                prev_clients[ip]["as_sets_fp"] != \
+                    self.clients[ip]["as_sets_fp"]:
+                res["changed"].append(ip)
+        res["removed"] = sorted(
+            [ip for ip in prev_clients if ip not in self.clients]
+        )
+        return res
+
+    def log_report(self):
+        diff = self.get_clients_diff()
+        if diff is None:
+            logging.info("Build state of the previous build not available: "
+                         "all the clients are processed.")
+            return
+
+        logging.info("Clients since the previous build: {} added, "
+                     "{} removed, {} changed, {} unchanged.".format(
+                         len(diff["added"]), len(diff["removed"]),
+                         len(diff["changed"]),
+                         len(self.clients) - len(diff["added"]) -
+                         len(diff["changed"])
+                     ))
+        for ip in diff["added"]:
+            logging.info("Client added: {} {}".format(
+                self.clients[ip]["id"], ip))
+        for ip in diff["removed"]:
+            logging.info("Client removed: {} {}".format(
+                self.prev["clients"][ip]["id"], ip))
+        for ip in diff["changed"]:
+            logging.info("Client changed: {} {}".format(
+                self.clients[ip]["id"], ip))
+
+    def save(self):
+        if self.prev is not None and self.prev["clients"] == self.clients:
+            # Nothing new.
+            return
+
+        _save_state(self.path, {"clients": self.clients})
+
+class EnrichmentResults(object):
+    """Results of the enrichment tasks, shared among builds
+
+    Results of the enrichment tasks (IRRDB expansions, PeeringDB info)
+    are saved along with a fingerprint of their input and with the
+    tokens of the cached objects they have been built from (see
+    CachedObject.get_cache_token()), so that the tasks don't need to
+    load and process the same cached data again.
+
+    Results saved by the builds that are run within the same process
+    (see MultiTargetBuilder) are always reused. When a cache directory
+    is given, results are also saved there and reused by the next
+    builds, as long as the input is the same and the cached objects
+    they come from have not expired nor changed; they are saved as JSON.
+    """
+
+    FILENAME = "enrichment_results.json"
+
+    def __init__(self, cache_dir=None, cache_expiry=None):
+        self.cache_dir = cache_dir
+        self.cache_expiry = cache_expiry
+
+        self.lock = threading.Lock()
+
+        self.path = None
+        self.prev = None
+        if cache_dir:
+            self.path = os.path.join(cache_dir, BuildState.DIRNAME,
+                                     self.FILENAME)
+            self.prev = _load_state(self.path, _decode_results)
+
+        # <key>: {"fp", "data", "tokens"}
+        self.results = {}
+        self.changed = False
+
+        self.reset_stats()
+
+    def __getstate__(self):
+        # Results are copied to the processes that build the targets
+        # (see MultiTargetBuilder), where a new lock is created.
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def reset_stats(self):
+        with self.lock:
+            self.reused = 0
+            self.computed = 0
+
+    def _is_token_valid(self, token):
+        filename, ts, mtime, size = token
+        try:
+            st = os.stat(os.path.join(self.cache_dir, filename))
+        except OSError:
+            return False
+        if (st.st_mtime, st.st_size) != (mtime, size):
+            return False
+        return ts > int(time.time()) - self.cache_expiry
+
+    def _get_prev(self, key, fp):
+        if self.prev is None:
+            return None
+
+        entry = self.prev["results"].get(key)
+        if not entry or entry["fp"] != fp:
+            return None
+
+        for token in entry["tokens"]:
+            if not self._is_token_valid(token):
+                return None
+
+        return entry
+
+    def get(self, key, fp):
+        """Result of an enrichment task.
+
+        Args:
+            key: identifies the task.
+
+            fp (str): fingerprint of the task's input.
+
+        Returns:
+            dict, {"data"}: the data saved with set(), or None if the
+            result is not available.
+        """
+        with self.lock:
+            entry = self.results.get(key)
+        if not entry or entry["fp"] != fp:
+            entry = self._get_prev(key, fp)
+            if not entry:
+                return None
+            with self.lock:
+                self.results[key] = entry
+
+        # The cached objects are still used by this build.
+        for token in entry["tokens"]:
+            if token:
+                cache_stats.hit(token[0])
+
+        with self.lock:
+            self.reused += 1
+
+        return entry
+
+    def set(self, key, fp, data, objects):
+        """Save the result of an enrichment task.
+
+        Args:
+            key: identifies the task.
+
+            fp (str): fingerprint of the task's input.
+
+            data: the result, a list of PrefixListEntry or any other
+                JSON serializable data; it must not be changed after it's
+                saved.
+
+            objects (list): CachedObject used to build the result; if the
+                data of any of them are not in the cache, the result is
+                not saved for the next builds.
+        """
+        with self.lock:
+            self.results[key] = {
+                "fp": fp,
+                "data": data,
+                "tokens": [obj.get_cache_token() for obj in objects]
+            }
+            self.changed = True
+            self.computed += 1
+
+    def log_report(self):
+        logging.info("Enrichment results: {} reused, {} computed".format(
+            self.reused, self.computed
+        ))
+
+    def save(self):
+        """Save the results for the next builds.
+
+        Results of the previous builds that have not been used by this
+        one (for example, those for the other address family) are kept,
+        unless their cached data have expired in the meantime.
+        """
+        if not self.path:
+            return
+
+        min_ts = int(time.time()) - self.cache_expiry
+
+        results = {}
+        expired = False
+        if self.prev is not None:
+            for key, entry in self.prev["results"].items():
+                if all(token[1] > min_ts for token in entry["tokens"]):
+                    results[key] = entry
+                else:
+                    expired = True
+
+        if self.prev is not None and not self.changed and not expired:
+            # Nothing new.
+            return
+
+        with self.lock:
+            for key, entry in self.results.items():
+                if None not in entry["tokens"]:
+                    results[key] = entry
+                elif key in results:
+                    del results[key]
+
+        _save_state(self.path, {"results": _encode_results(results)})
+
+def _encode_results(results):
+    # Keys are usually tuples, they can't be used as JSON object names.
+    return [[list(key) if isinstance(key, tuple) else key, entry]
+            for key, entry in results.items()]
+
+def _decode_results(state):
+    results = {}
+    for key, entry in state["results"]:
+        data = entry["data"]
+        # Prefix lists are saved as lists of dicts (see _to_json()).
+        if isinstance(data, list) and data and isinstance(data[0], dict):
+            entry["data"] = [PrefixListEntry.from_dict(prefix)
+                             for prefix in data]
+        results[tuple(key) if isinstance(key, list) else key] = entry
+    state["results"] = results
+
+def _load_state(path, decode=None):
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+        if state.get("version") != __version__:
+            return None
+        if decode:
+            decode(state)
+    except Exception as e:
+        logging.debug("Error while reading the build state "
+                      "from {}: {}".format(path, str(e)))
+        return None
+    touch_cache_entry(path)
+    return state
+
+def _save_state(path, state):
+    state["version"] = __version__
+
+    dir_path = os.path.dirname(path)
+    try:
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=_to_json)
+        os.rename(tmp_path, path)
+    except Exception as e:
+        logging.warning("Error while saving the build state "
+                        "to {}: {}".format(path, str(e)))
+
+CacheDir.register_entries_dir(BuildState.DIRNAME,
+                              "build state and enrichment results")
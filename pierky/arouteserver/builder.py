@@ -15,15 +15,20 @@
 
 import ipaddr
 import logging
+import multiprocessing
 import os
 import re
 import sys
 import time
 import yaml
 
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from jinja2 import ChoiceLoader, Environment, FileSystemLoader, \
+                   StrictUndefined
 
+from .build_state import BuildState, EnrichmentResults, get_fingerprint
+from .config.base import ParsedConfigCache
 from .config.general import ConfigParserGeneral
+from .config.index import ConfigIndex
 from .config.bogons import ConfigParserBogons
 from .config.asns import ConfigParserASNS
 from .config.clients import ConfigParserClients
@@ -31,17 +36,42 @@ from .config.roa import ConfigParserROAEntries
 from .enrichers.irrdb import IRRDBConfigEnricher_OriginASNs, \
                              IRRDBConfigEnricher_Prefixes
 from .enrichers.peeringdb import PeeringDBConfigEnricher
+from .enrichers.scheduler import ConfigEnrichersScheduler
 from .errors import MissingDirError, MissingFileError, BuilderError, \
                     ARouteServerError, PeeringDBError, PeeringDBNoInfoError, \
                     MissingArgumentError, TemplateRenderingError, \
                     CompatibilityIssuesError
-from .irrdb import ASSet, RSet, IRRDBTools
-from .cached_objects import CachedObject
+from .irrdb import ASSet, RSet, IRRDBTools, ParsingPool
+from .cached_objects import CachedObject, CircuitBreakers, FetchDeadline, \
+                            cache_stats, fetch_durations
 from .peering_db import PeeringDBNet
+from .prefix_list import PrefixListSafeDumper
+from .templates_cache import TemplatesBundle, TemplatesBytecodeCache
+from .templates_filters import bird_prefix_list, bird_asn_list, \
+                               openbgpd_prefix_list, openbgpd_asn_list
+from .prefix_set import PrefixSet, aggregate_prefix_list, merge_ranges, \
+                         prune_prefix_list, subtract_ranges
 
 
 class ConfigBuilder(object):
 
+    # Enrichers used to add data from external sources to the
+    # configuration. They are executed concurrently, on the basis of
+    # the data they need and produce: see ConfigEnrichersScheduler.
+    ENRICHERS = (IRRDBConfigEnricher_OriginASNs,
+                 IRRDBConfigEnricher_Prefixes,
+                 PeeringDBConfigEnricher)
+
+    # Data available to the enrichers before any of them runs.
+    ENRICHERS_AVAILABLE_DATA = ("cfg_general", "cfg_bogons", "cfg_clients",
+                                "cfg_asns", "cfg_roas")
+
+    # - threads: tasks are processed by a pool of worker threads;
+    # - async: IRRDB data are acquired concurrently on a single thread,
+    #   by running up to 'irrdb_async_concurrency' bgpq3 processes at the
+    #   same time, before worker threads start.
+    ENRICHERS_ENGINES = ("threads", "async")
+
     def validate_bgpspeaker_specific_configuration(self):
         """Check compatibility between config and target BGP speaker
 
@@ -70,20 +100,23 @@ class ConfigBuilder(object):
         logging.error(msg)
         return False
 
-    def enrich_j2_environment(self, env):
+    @classmethod
+    def enrich_j2_environment(cls, env, ip_ver=None, **kwargs):
         pass
 
     @staticmethod
-    def _get_cfg(obj_or_path, cls, descr, **kwargs):
+    def _get_cfg(obj_or_path, cls, descr, parsed_cfg_cache=None, deps=None,
+                 **kwargs):
         assert obj_or_path is not None
         if isinstance(obj_or_path, cls):
             return obj_or_path
         elif isinstance(obj_or_path, str):
-            if not os.path.isfile(obj_or_path):
+            if not os.path.exists(obj_or_path):
                 raise MissingFileError(obj_or_path)
             obj = cls(**kwargs)
             try:
-                obj.load(obj_or_path)
+                obj.load(obj_or_path, parsed_cfg_cache=parsed_cfg_cache,
+                         deps=deps)
             except ARouteServerError as e:
                 raise BuilderError(
                     "One or more errors occurred while loading "
@@ -101,15 +134,7 @@ class ConfigBuilder(object):
             raise MissingDirError(path)
         return path
 
-    def __init__(self, template_dir=None, template_name=None,
-                 cache_dir=None, cache_expiry=CachedObject.DEFAULT_EXPIRY,
-                 bgpq3_path="bgpq3", bgpq3_host=IRRDBTools.BGPQ3_DEFAULT_HOST,
-                 bgpq3_sources=IRRDBTools.BGPQ3_DEFAULT_SOURCES, threads=4,
-                 ip_ver=None, ignore_errors=[], live_tests=False,
-                 cfg_general=None, cfg_bogons=None, cfg_clients=None,
-                 cfg_roas=None,
-                 **kwargs):
-
+    def _set_template(self, template_dir, template_name):
         self.template_dir = self._check_is_dir(
             "template_dir", template_dir
         )
@@ -123,6 +148,27 @@ class ConfigBuilder(object):
         if not os.path.isfile(self.template_path):
             raise MissingFileError(self.template_path)
 
+    def __init__(self, template_dir=None, template_name=None,
+                 cache_dir=None, cache_expiry=CachedObject.DEFAULT_EXPIRY,
+                 bgpq3_path="bgpq3", bgpq3_host=IRRDBTools.BGPQ3_DEFAULT_HOST,
+                 bgpq3_sources=IRRDBTools.BGPQ3_DEFAULT_SOURCES, threads=4,
+                 adaptive_concurrency=False, min_threads=1, max_threads=16,
+                 enrichers_engine="threads", irrdb_async_concurrency=32,
+                 irrdb_timeout=600, peeringdb_timeout=30,
+                 enrichment_deadline=None, fetch_retries=2,
+                 circuit_breaker_threshold=5, circuit_breaker_reset=60,
+                 parsing_processes=0, parsing_min_prefixes=1000,
+                 prune_irrdb_prefixes=False, aggregate_prefix_lists=False,
+                 cache_parsed_cfg=False, incremental_build=False,
+                 cache_compiled_templates=False,
+                 parsed_cfg_cache=None, enrichment_results=None,
+                 ip_ver=None, ignore_errors=[], live_tests=False,
+                 cfg_general=None, cfg_general_overrides=None,
+                 cfg_bogons=None, cfg_clients=None, cfg_roas=None,
+                 **kwargs):
+
+        self._set_template(template_dir, template_name)
+
         self.cache_dir = self._check_is_dir(
             "cache_dir", cache_dir
         )
@@ -134,6 +180,39 @@ class ConfigBuilder(object):
         self.bgpq3_sources = bgpq3_sources
 
         self.threads = threads
+        self.adaptive_concurrency = adaptive_concurrency
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+
+        if enrichers_engine not in self.ENRICHERS_ENGINES:
+            raise BuilderError(
+                "Invalid enrichers engine: {}; it must be one of {}".format(
+                    enrichers_engine, ", ".join(self.ENRICHERS_ENGINES)
+                )
+            )
+        self.enrichers_engine = enrichers_engine
+        self.irrdb_async_concurrency = irrdb_async_concurrency
+
+        self.irrdb_timeout = irrdb_timeout
+        self.peeringdb_timeout = peeringdb_timeout
+        self.enrichment_deadline = enrichment_deadline
+        self.fetch_deadline = None
+
+        self.fetch_retries = fetch_retries
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_reset = circuit_breaker_reset
+        self.circuit_breakers = None
+
+        # None = one process per CPU, 0 = disabled (default).
+        # The pool is forked when the enrichers are started: it must be
+        # enabled only when no other threads are running at that time,
+        # as in the command line tool (see ParsingPool).
+        self.parsing_processes = parsing_processes
+        self.parsing_min_prefixes = parsing_min_prefixes
+        self.parsing_pool = None
+
+        self.prune_irrdb_prefixes = prune_irrdb_prefixes
+        self.aggregate_prefix_lists = aggregate_prefix_lists
 
         try:
             with open(os.path.join(self.cache_dir, "write_test"), "w") as f:
@@ -145,33 +224,58 @@ class ConfigBuilder(object):
                 )
             )
 
+        # parsed_cfg_cache and enrichment_results can be shared among
+        # the builds that are run within the same process.
+        self.parsed_cfg_cache = parsed_cfg_cache
+        if not self.parsed_cfg_cache and cache_parsed_cfg:
+            self.parsed_cfg_cache = ParsedConfigCache(self.cache_dir)
+
+        self.cache_compiled_templates = cache_compiled_templates
+
         self.ip_ver = ip_ver
         if self.ip_ver is not None:
             self.ip_ver = int(self.ip_ver)
             if self.ip_ver not in (4, 6):
                 raise BuilderError("Invalid IP version: {}".format(ip_ver))
 
+        self.build_state = None
+        if incremental_build:
+            self.build_state = BuildState(self.cache_dir, self.get_build_id())
+
+        self.enrichment_results = enrichment_results
+        self.save_enrichment_results = False
+        if not self.enrichment_results and incremental_build:
+            self.enrichment_results = EnrichmentResults(self.cache_dir,
+                                                        self.cache_expiry)
+            self.save_enrichment_results = True
+
         self.ignore_errors = ignore_errors or []
 
         self.live_tests = live_tests
 
         self.cfg_general = self._get_cfg(cfg_general,
                                          ConfigParserGeneral,
-                                         "general")
+                                         "general",
+                                         self.parsed_cfg_cache,
+                                         overrides=cfg_general_overrides)
         self.cfg_bogons = self._get_cfg(cfg_bogons,
                                         ConfigParserBogons,
-                                        "bogons")
+                                        "bogons",
+                                        self.parsed_cfg_cache)
         self.cfg_asns = self._get_cfg(cfg_clients,
                                          ConfigParserASNS,
-                                         "asns")
+                                         "asns",
+                                         self.parsed_cfg_cache)
         self.cfg_clients = self._get_cfg(cfg_clients,
                                          ConfigParserClients,
                                          "clients",
+                                         self.parsed_cfg_cache,
                                          general_cfg=self.cfg_general)
         if cfg_roas:
             self.cfg_roas = self._get_cfg(cfg_roas,
                                           ConfigParserROAEntries,
-                                          "roas")
+                                          "roas",
+                                          self.parsed_cfg_cache)
         else:
             self.cfg_roas = None
 
@@ -179,26 +283,45 @@ class ConfigBuilder(object):
 
         self.as_sets = None
 
+        self.index = None
+
         if not self.validate_bgpspeaker_specific_configuration():
             raise CompatibilityIssuesError(
                 "One or more compatibility issues have been found."
             )
 
-        logging.info("Started processing configuration "
-                     "for {}".format(self.template_path))
+        logging.info("Started processing configuration{}".format(
+            " for {}".format(self.template_path) if self.template_path else ""
+        ))
 
         start_time = int(time.time())
 
         self.enrich_config()
 
+        if self.prune_irrdb_prefixes:
+            self.prune_prefixes()
+
+        if self.aggregate_prefix_lists:
+            self.aggregate_prefixes()
+
         stop_time = int(time.time())
 
         logging.info("Configuration processing completed after "
                      "{} seconds.".format(stop_time - start_time))
 
+    def get_build_id(self):
+        """Identifier used to track per-build stats (cache hits/misses)."""
+        return "{}-{}".format(
+            self.__class__.__name__,
+            "ipv{}".format(self.ip_ver) if self.ip_ver else "all"
+        )
+
     def enrich_config(self):
         errors = False
 
+        cache_stats.reset()
+        fetch_durations.reset()
+
         # Unique ASNs from clients list.
         clients_asns = {}
 
@@ -219,6 +342,12 @@ class ConfigBuilder(object):
             )
             client["id"] = client_id
 
+        self.index = ConfigIndex(self.cfg_clients.cfg["clients"])
+
+        if self.build_state:
+            for client in self.cfg_clients.cfg["clients"]:
+                self.build_state.add_client(client)
+
         # BGP communities metadata
         for comm_name in ConfigParserGeneral.COMMUNITIES_SCHEMA:
             comm = ConfigParserGeneral.COMMUNITIES_SCHEMA[comm_name]
@@ -226,38 +355,242 @@ class ConfigBuilder(object):
             self.cfg_general["communities"][comm_name]["peer_as"] = comm.get("peer_as", False)
 
         # Enrichers
-        for enricher_class in (IRRDBConfigEnricher_OriginASNs,
-                               IRRDBConfigEnricher_Prefixes,
-                               PeeringDBConfigEnricher):
-            enricher = enricher_class(self, threads=self.threads)
-            try:
-                enricher.enrich()
-            except ARouteServerError as e:
+        if self.enrichment_results:
+            self.enrichment_results.reset_stats()
+        self.fetch_deadline = FetchDeadline(self.enrichment_deadline)
+        self.circuit_breakers = CircuitBreakers(
+            self.circuit_breaker_threshold, self.circuit_breaker_reset
+        )
+        if self.parsing_processes != 0:
+            self.parsing_pool = ParsingPool(self.parsing_processes,
+                                            self.parsing_min_prefixes)
+            self.parsing_pool.start()
+        scheduler = ConfigEnrichersScheduler(
+            self, self.ENRICHERS, self.ENRICHERS_AVAILABLE_DATA,
+            threads=self.threads,
+            adaptive_concurrency=self.adaptive_concurrency,
+            min_threads=self.min_threads, max_threads=self.max_threads
+        )
+        try:
+            if not scheduler.run():
                 errors = True
-                if str(e):
-                    logging.error(str(e))
+        finally:
+            if self.parsing_pool:
+                self.parsing_pool.close()
+
+        self.fetch_deadline.log_report()
+        self.circuit_breakers.log_report()
+
+        if self.build_state and not errors:
+            for client in self.cfg_clients.cfg["clients"]:
+                as_set_ids = client["cfg"]["filtering"]["irrdb"].get(
+                    "as_set_ids"
+                ) or []
+                self.build_state.set_client_as_sets(
+                    client["ip"],
+                    [self.as_sets[as_set_id]["name"]
+                     for as_set_id in as_set_ids]
+                )
+            self.build_state.log_report()
+            self.build_state.save()
+
+        if self.enrichment_results:
+            self.enrichment_results.log_report()
+            if self.save_enrichment_results and not errors:
+                self.enrichment_results.save()
+
+        logging.info("Cached data: {} hits, {} misses".format(
+            cache_stats.hits, cache_stats.misses
+        ))
+        cache_stats.save(self.cache_dir, self.get_build_id())
+        fetch_durations.save(self.cache_dir)
 
         if errors:
             raise BuilderError()
 
-    def render_template(self, output_file=None):
-        self.data = {}
-        self.data["ip_ver"] = self.ip_ver
-        self.data["cfg"] = self.cfg_general
-        self.data["bogons"] = self.cfg_bogons
-        self.data["clients"] = self.cfg_clients
-        self.data["asns"] = self.cfg_asns
-        self.data["as_sets"] = self.as_sets
-        self.data["roas"] = self.cfg_roas
-        self.data["live_tests"] = self.live_tests
+    def _get_prefix_lists(self):
+        # (description, container, key) of the lists of prefix list
+        # entries that are used to build the configuration.
+        res = [("bogons", self.cfg_bogons.cfg, "bogons")]
+        filtering = self.cfg_general["filtering"]
+        if filtering.get("global_black_list_pref"):
+            res.append(("global black list", filtering,
+                        "global_black_list_pref"))
+        for client in self.cfg_clients.cfg["clients"]:
+            filtering = client["cfg"]["filtering"]
+            if filtering.get("black_list_pref"):
+                res.append(("client {} black list".format(client["id"]),
+                            filtering, "black_list_pref"))
+        for as_set_id in sorted(self.as_sets or {}):
+            as_set = self.as_sets[as_set_id]
+            res.append(("AS-SET {}".format(as_set["name"]), as_set,
+                        "prefixes"))
+        return res
+
+    # IPv6 routes outside the Global Unicast space (2000::/3).
+    NON_GLOBAL_UNICAST_IPV6 = [("::", 0, 0, 2)] + [
+        (prefix, 3, 3, 128)
+        for prefix in ("::", "4000::", "6000::", "8000::", "a000::",
+                       "c000::", "e000::")
+    ]
+
+    def _get_rejected_prefixes(self):
+        # Routes that are rejected before the IRRDB checks, whatever
+        # the client is.
+        res = PrefixSet(self.cfg_bogons.cfg["bogons"])
+        res.add_entries(
+            self.cfg_general["filtering"]["global_black_list_pref"] or []
+        )
+        for prefix, length, ge, le in self.NON_GLOBAL_UNICAST_IPV6:
+            res.insert_range(prefix, length, ge, le)
+        return res
+
+    def prune_prefixes(self):
+        """Remove from the IRRDB prefix lists the routes that are
+        rejected anyway.
+
+        These are the routes that are bogons, that are in the global
+        black list or, for IPv6, that are outside the Global Unicast
+        space, since these checks are done before the IRRDB ones.
+        Also the routes whose length is not accepted by any of the
+        clients that use the AS-SET are removed, unless blackhole
+        filtering is enabled for that address family, because
+        blackhole filtering requests skip the prefix length check.
+        """
+        if not self.as_sets:
+            return
+
+        rejected = self._get_rejected_prefixes()
+
+        blackhole_filtering = self.cfg_general["blackhole_filtering"] or {}
+        max_lengths = {4: 32, 6: 128}
+
+        users = {}
+        for client in self.cfg_clients.cfg["clients"]:
+            irrdb = client["cfg"]["filtering"]["irrdb"]
+            for as_set_id in irrdb.get("as_set_ids") or []:
+                users.setdefault(as_set_id, []).append(client)
+
+        rejected_by_lengths = {}
+        tot_before = 0
+        tot_after = 0
+        for as_set_id in sorted(self.as_sets):
+            as_set = self.as_sets[as_set_id]
+            if not as_set["prefixes"]:
+                continue
+
+            # Prefix lengths accepted by the clients that use the AS-SET.
+            accepted = {4: [], 6: []}
+            for client in users.get(as_set_id, []):
+                ip_ver = ipaddr.IPAddress(client["ip"]).version
+                pref_len = client["cfg"]["filtering"][
+                    "ipv{}_pref_len".format(ip_ver)]
+                accepted[ip_ver].append((pref_len["min"], pref_len["max"]))
+
+            key = tuple(
+                tuple(merge_ranges(accepted[ip_ver]))
+                if accepted[ip_ver] and
+                    not blackhole_filtering.get(
+                        "policy_ipv{}".format(ip_ver))
+                else None
+                for ip_ver in (4, 6)
+            )
+            if key not in rejected_by_lengths:
+                as_set_rejected = rejected.union(PrefixSet())
+                for ip_ver, lengths in zip((4, 6), key):
+                    if lengths is None:
+                        continue
+                    for ge, le in subtract_ranges(
+                            [(0, max_lengths[ip_ver])], lengths):
+                        as_set_rejected.insert_range(
+                            "0.0.0.0" if ip_ver == 4 else "::", 0, ge, le)
+                rejected_by_lengths[key] = as_set_rejected
+
+            pruned = prune_prefix_list(as_set["prefixes"],
+                                       rejected_by_lengths[key])
+
+            logging.debug("IRRDB prefixes pruning, AS-SET {}: "
+                          "{} entries -> {}".format(
+                              as_set["name"], len(as_set["prefixes"]),
+                              len(pruned)))
+            tot_before += len(as_set["prefixes"])
+            tot_after += len(pruned)
+
+            as_set["prefixes"] = pruned
+
+        if tot_before:
+            logging.info("IRRDB prefixes pruning, routes rejected by "
+                         "other filters removed: {} entries -> {}".format(
+                             tot_before, tot_after))
+
+    def aggregate_prefixes(self):
+        """Aggregate the prefix lists used to build the configuration.
+
+        Every list is replaced by an equivalent one, that matches the
+        same routes using fewer entries.
+        """
+        tot_before = 0
+        tot_after = 0
+        for descr, container, key in self._get_prefix_lists():
+            entries = container[key]
+            if not entries:
+                continue
+
+            aggregated = aggregate_prefix_list(entries)
+
+            logging.debug("Prefix list aggregation, {}: "
+                          "{} entries -> {}".format(
+                              descr, len(entries), len(aggregated)))
+            tot_before += len(entries)
+            tot_after += len(aggregated)
+
+            container[key] = aggregated
+
+        if tot_before:
+            logging.info("Prefix lists aggregation: {} entries reduced "
+                         "to {} ({:.1f}% reduction)".format(
+                             tot_before, tot_after,
+                             100.0 * (tot_before - tot_after) / tot_before))
+
+    @classmethod
+    def get_j2_environment(cls, template_dir, cache_dir=None,
+                           cache_compiled_templates=False, ip_ver=None,
+                           **kwargs):
+        """Jinja2 environment used to render the templates.
+
+        Args:
+            template_dir (str): directory where the templates are.
+
+            cache_dir (str): cache directory; used only when
+                cache_compiled_templates is set.
+
+            cache_compiled_templates (bool): use the bundle of
+                compiled templates, if it's up to date, and cache the
+                templates compiled while rendering them (see
+                TemplatesBundle and TemplatesBytecodeCache).
+
+            ip_ver (int): target IP version, used by filters and tests.
+
+            kwargs: builder specific arguments used by filters (see
+                enrich_j2_environment).
+        """
+        loader = FileSystemLoader(template_dir)
+        bytecode_cache = None
+        if cache_compiled_templates:
+            bundle_loader = TemplatesBundle(
+                cache_dir, template_dir
+            ).get_loader()
+            if bundle_loader:
+                loader = ChoiceLoader([bundle_loader, loader])
+            bytecode_cache = TemplatesBytecodeCache(cache_dir)
 
         def ipaddr_ver(ip):
             return ipaddr.IPAddress(ip).version
 
         def current_ipver(ip):
-            if self.ip_ver is None:
+            if ip_ver is None:
                 return True
-            return ipaddr.IPAddress(ip).version == self.ip_ver
+            return ipaddr.IPAddress(ip).version == ip_ver
 
         def community_is_set(comm):
             if not comm:
@@ -267,7 +600,8 @@ class ConfigBuilder(object):
             return True
 
         env = Environment(
-            loader=FileSystemLoader(self.template_dir),
+            loader=loader,
+            bytecode_cache=bytecode_cache,
             trim_blocks=True,
             lstrip_blocks=True,
             undefined=StrictUndefined
@@ -276,7 +610,49 @@ class ConfigBuilder(object):
         env.filters["community_is_set"] = community_is_set
         env.filters["ipaddr_ver"] = ipaddr_ver
 
-        self.enrich_j2_environment(env)
+        cls.enrich_j2_environment(env, ip_ver, **kwargs)
+
+        return env
+
+    @classmethod
+    def compile_templates(cls, template_dir, cache_dir):
+        """Compile the templates into a bundle of Python modules.
+
+        The bundle is used by the next builds that use the same
+        templates, as long as they don't change (see TemplatesBundle).
+        """
+        # Filters and tests are looked up when templates are rendered:
+        # the environment used to compile them doesn't need the
+        # builder's arguments.
+        env = cls.get_j2_environment(template_dir)
+        bundle = TemplatesBundle(cache_dir, template_dir)
+        try:
+            bundle.build(env)
+        except Exception as e:
+            raise BuilderError(
+                "Error while compiling templates from {}: {}".format(
+                    template_dir, str(e)
+                )
+            )
+        return bundle
+
+    def render_template(self, output_file=None):
+        self.data = {}
+        self.data["ip_ver"] = self.ip_ver
+        self.data["cfg"] = self.cfg_general
+        self.data["bogons"] = self.cfg_bogons
+        self.data["clients"] = self.cfg_clients
+        self.data["asns"] = self.cfg_asns
+        self.data["as_sets"] = self.as_sets
+        self.data["clients_by_asn"] = self.index.clients_by_asn
+        self.data["roas"] = self.cfg_roas
+        self.data["live_tests"] = self.live_tests
+
+        env = self.get_j2_environment(
+            self.template_dir, cache_dir=self.cache_dir,
+            cache_compiled_templates=self.cache_compiled_templates,
+            ip_ver=self.ip_ver, **self.kwargs
+        )
 
         tpl = env.get_template(self.template_name)
 
@@ -314,6 +690,15 @@ class BIRDConfigBuilder(ConfigBuilder):
 
         return True
 
+    @classmethod
+    def enrich_j2_environment(cls, env, ip_ver=None, **kwargs):
+
+        def prefix_list(prefix_list, group=False):
+            return bird_prefix_list(prefix_list, ip_ver, group)
+
+        env.filters["bird_prefix_list"] = prefix_list
+        env.filters["bird_asn_list"] = bird_asn_list
+
 class OpenBGPDConfigBuilder(ConfigBuilder):
 
     LOCAL_FILES_IDS = ["header",
@@ -477,7 +862,8 @@ class OpenBGPDConfigBuilder(ConfigBuilder):
 
         return res
 
-    def enrich_j2_environment(self, env):
+    @classmethod
+    def enrich_j2_environment(cls, env, ip_ver=None, **kwargs):
 
         def convert_ext_comm(s):
             parts = s.split(":")
@@ -488,16 +874,16 @@ class OpenBGPDConfigBuilder(ConfigBuilder):
         env.filters["convert_ext_comm"] = convert_ext_comm
 
         def include_local_file(local_file_id):
-            if local_file_id not in self.LOCAL_FILES_IDS:
+            if local_file_id not in cls.LOCAL_FILES_IDS:
                 raise AssertionError(
                     "Local file ID '{}' is referenced in J2 "
                     "templates but is not in LOCAL_FILES_IDS."
                 )
-            local_files = self.kwargs.get("local_files") or []
+            local_files = kwargs.get("local_files") or []
             if local_file_id in local_files:
                 return 'include "{}"\n\n'.format(
                     os.path.join(
-                        self.kwargs.get("local_files_dir", "/etc/bgpd"),
+                        kwargs.get("local_files_dir", "/etc/bgpd"),
                         "{}.local".format(local_file_id)
                     )
                 )
@@ -505,11 +891,251 @@ class OpenBGPDConfigBuilder(ConfigBuilder):
 
         env.filters["include_local_file"] = include_local_file
 
+        env.filters["openbgpd_prefix_list"] = openbgpd_prefix_list
+        env.filters["openbgpd_asn_list"] = openbgpd_asn_list
+
 class TemplateContextDumper(ConfigBuilder):
 
-    def enrich_j2_environment(self, env):
+    @classmethod
+    def enrich_j2_environment(cls, env, ip_ver=None, **kwargs):
 
         def to_yaml(obj):
-            return yaml.safe_dump(obj, default_flow_style=False)
+            return yaml.dump(obj, Dumper=PrefixListSafeDumper,
+                             default_flow_style=False)
 
         env.filters["to_yaml"] = to_yaml
+
+class EnrichedDataBuilder(ConfigBuilder):
+    """Load the configuration and acquire the external data only
+
+    The same processing done by ConfigBuilder is performed, but nothing
+    is rendered.
+    """
+
+    def _set_template(self, template_dir, template_name):
+        self.template_dir = None
+        self.template_name = None
+        self.template_path = None
+
+    def render_template(self, output_file=None):
+        raise BuilderError(
+            "{} only loads the configuration and acquires the external "
+            "data: it can't render a configuration".format(
+                self.__class__.__name__
+            )
+        )
+
+class CacheWarmer(EnrichedDataBuilder):
+    """Refresh the cached data needed to build the configuration
+
+    The same clients/AS-SETs/address families processing done by
+    ConfigBuilder is performed, but no templates are rendered: the only
+    goal is to refresh the cached objects that are expired or that will
+    expire within the next ``refresh_margin`` seconds, so that a
+    subsequent build does not need to wait for external data sources.
+    """
+
+    DEFAULT_REFRESH_MARGIN = 3600
+
+    def __init__(self, refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 cache_expiry=CachedObject.DEFAULT_EXPIRY, **kwargs):
+        self.refresh_margin = refresh_margin
+
+        # Objects which will expire within the next 'refresh_margin'
+        # seconds are considered to be already expired, so they are
+        # fetched again and stored with a fresh timestamp.
+        ConfigBuilder.__init__(
+            self,
+            cache_expiry=max(0, cache_expiry - refresh_margin),
+            **kwargs
+        )
+
+        logging.info("Cache warm-up completed: {} AS-SETs and {} clients "
+                     "processed.".format(
+                         len(self.as_sets or {}),
+                         len(self.cfg_clients.cfg["clients"])
+                     ))
+
+# MultiTargetBuilder used by the processes that build the targets; it's
+# set by the pool's initializer, so that the workers get it with both
+# the fork and the spawn start methods.
+_multi_target_builder = None
+
+def _init_target_builder(multi_target_builder):
+    global _multi_target_builder
+    _multi_target_builder = multi_target_builder
+
+def _build_target(idx):
+    return _multi_target_builder.build_target(idx)
+
+class MultiTargetBuilder(object):
+    """Build many configurations from the same input files
+
+    The configuration files are loaded and the external data (IRRDB,
+    PeeringDB) are acquired only once, for all the targets: a first
+    build (EnrichedDataBuilder) runs the enrichers for all the address
+    families the targets need, then each target is built using the
+    usual pipeline (BIRDConfigBuilder, OpenBGPDConfigBuilder, ...), but
+    the parsed configurations and the results of the enrichment tasks
+    are taken from memory. The output is the same of the one produced
+    by separate builds.
+
+    Targets can use different general configurations (for example,
+    many route servers with their own router ID, see
+    cfg_general_overrides): the clients configuration and the external
+    data are still shared among them.
+
+    Args:
+        targets (list): each target is a dict with the following keys:
+
+            - builder_class: the ConfigBuilder class used to build it;
+
+            - output_file: path of the file where the configuration is
+              written;
+
+            - name (optional): used to refer to the target in the logs;
+
+            - any other key is passed to builder_class and overrides
+              the arguments that are common to all the targets.
+
+        processes (int): number of processes used to build the targets
+            once the data have been acquired; 1 = the targets are built
+            one after the other by the current process.
+
+        kwargs: arguments passed to all the builders.
+    """
+
+    def __init__(self, targets, processes=1, **kwargs):
+        self.targets = []
+        for target in targets:
+            target = dict(target)
+            if not target.get("builder_class"):
+                raise BuilderError("Missing builder class for target "
+                                   "{}".format(target))
+            if not target.get("output_file"):
+                raise BuilderError("Missing output file for target "
+                                   "{}".format(target))
+            target["name"] = target.get("name") or target["output_file"]
+            self.targets.append(target)
+
+        self.processes = processes
+        self.kwargs = kwargs
+
+        cache_dir = kwargs.get("cache_dir")
+        cache_expiry = kwargs.get("cache_expiry",
+                                  CachedObject.DEFAULT_EXPIRY)
+
+        # Entries are kept in memory even when they are not persisted.
+        self.parsed_cfg_cache = ParsedConfigCache(
+            cache_dir, persistent=kwargs.get("cache_parsed_cfg", False)
+        )
+        if kwargs.get("incremental_build", False):
+            self.enrichment_results = EnrichmentResults(cache_dir,
+                                                        cache_expiry)
+        else:
+            self.enrichment_results = EnrichmentResults()
+
+    def _get_builder_params(self, target):
+        params = dict(self.kwargs)
+        params.update(
+            (k, v) for k, v in target.items()
+            if k not in ("builder_class", "output_file", "name")
+        )
+        params["parsed_cfg_cache"] = self.parsed_cfg_cache
+        params["enrichment_results"] = self.enrichment_results
+        return params
+
+    def acquire_data(self):
+        """Acquire the external data needed by all the targets."""
+
+        # The general configuration determines which data are needed
+        # (max-prefix limits from PeeringDB, for example): data are
+        # acquired once for each general configuration used by the
+        # targets; those already acquired for the previous ones are
+        # reused.
+        groups = {}
+        groups_order = []
+        for target in self.targets:
+            params = self._get_builder_params(target)
+            key = (params.get("cfg_general"),
+                   get_fingerprint(params.get("cfg_general_overrides")))
+            if key not in groups:
+                groups[key] = []
+                groups_order.append(key)
+            groups[key].append(params)
+
+        for key in groups_order:
+            ip_vers = set([params.get("ip_ver") for params in groups[key]])
+
+            params = dict(groups[key][0])
+            params.update({
+                "ip_ver": ip_vers.pop() if len(ip_vers) == 1 else None,
+                "prune_irrdb_prefixes": False,
+                "aggregate_prefix_lists": False,
+                "incremental_build": False
+            })
+            EnrichedDataBuilder(**params)
+
+    def build_target(self, idx):
+        """Build a target.
+
+        Returns:
+            True if the target has been built successfully.
+        """
+        target = self.targets[idx]
+        params = self._get_builder_params(target)
+
+        # Data have already been acquired: expansions don't need to be
+        # parsed again.
+        params["parsing_processes"] = 0
+
+        logging.info("Building target {}".format(target["name"]))
+        try:
+            builder = target["builder_class"](**params)
+            with open(target["output_file"], "w") as f:
+                builder.render_template(output_file=f)
+        except ARouteServerError as e:
+            if str(e):
+                logging.error("Target {}: {}".format(target["name"], str(e)))
+            return False
+        except (IOError, OSError) as e:
+            logging.error("Target {}: can't write the output file: "
+                          "{}".format(target["name"], str(e)))
+            return False
+        return True
+
+    def build(self):
+        start_time = int(time.time())
+
+        self.acquire_data()
+
+        if self.processes > 1 and len(self.targets) > 1:
+            pool = multiprocessing.Pool(min(self.processes,
+                                            len(self.targets)),
+                                        initializer=_init_target_builder,
+                                        initargs=(self,))
+            try:
+                results = pool.map(_build_target, range(len(self.targets)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.build_target(idx)
+                       for idx in range(len(self.targets))]
+
+        self.enrichment_results.save()
+
+        stop_time = int(time.time())
+
+        failed = [target["name"]
+                  for target, res in zip(self.targets, results) if not res]
+        if failed:
+            raise BuilderError(
+                "The following targets have not been built: {}".format(
+                    ", ".join(failed)
+                )
+            )
+
+        logging.info("{} targets built after {} seconds.".format(
+            len(self.targets), stop_time - start_time
+        ))
@@ -13,18 +13,85 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 import json
 import logging
 import os
+import random
+import threading
 import time
 
-from .errors import CachedObjectsError
+from .errors import CachedObjectsError, ARouteServerError
 
 
+class MemoryCache(object):
+    """Thread-safe, size-bounded LRU cache of decoded cached objects
+
+    It sits in front of the on-disk cache, so that objects that are used
+    many times within the same process (the same ASN shared by many
+    clients, multi-IP clients, multiple builds) are read from disk and
+    decoded only once.
+
+    Data returned by the cache are shared among all the users of the same
+    object, so they must be treated as read-only.
+    """
+
+    DEFAULT_MAX_ENTRIES = 4096
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            # Move the entry to the end: most recently used.
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                del self.entries[key]
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+memory_cache = MemoryCache()
+
 class CachedObject(object):
 
     DEFAULT_EXPIRY = 43200
 
+    # Name of the external source the data are acquired from: objects
+    # that share the same source also share the same circuit breaker.
+    SOURCE = None
+
+    # Errors raised by _get_data() that are not transient: requests
+    # that fail with them are not retried.
+    PERMANENT_ERRORS = ()
+
+    # Jittered exponential backoff between retries: the delay before
+    # the n-th retry is a random value between 0 and
+    # min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2^n) seconds.
+    RETRY_BACKOFF_BASE = 1
+    RETRY_BACKOFF_MAX = 30
+
+    # Per-thread counter of the objects acquired from the external
+    # source, used to tell cache hits from actual requests.
+    _thread_data = threading.local()
+
+    @classmethod
+    def get_thread_fetches(cls):
+        return getattr(cls._thread_data, "fetches", 0)
+
     def __init__(self, **kwargs):
         self.cache_dir = kwargs.get("cache_dir", "var")
         if not self.cache_dir:
@@ -34,20 +101,95 @@ class CachedObject(object):
                                             self.DEFAULT_EXPIRY)
         self.raw_data = None
 
+        # Identifies the cached data raw_data have been loaded from or
+        # saved to: see get_cache_token().
+        self.cache_token = None
+
+        # Max time, in seconds, that acquiring data from the external
+        # source can take (None = no limit).
+        self.fetch_timeout = kwargs.get("fetch_timeout", None)
+
+        # FetchDeadline shared among all the objects used by the build.
+        self.deadline = kwargs.get("deadline", None)
+
+        # How many times a request that failed with a transient error
+        # is retried.
+        self.retries = kwargs.get("retries", 0)
+
+        # CircuitBreaker shared among all the objects that use the
+        # same source.
+        self.circuit_breaker = kwargs.get("circuit_breaker", None)
+
     def _get_object_filename(self):
         raise NotImplementedError()
 
+    def _get_descr(self):
+        return self._get_object_filename()
+
+    def get_fetch_timeout(self):
+        if self.deadline:
+            return self.deadline.get_timeout(self.fetch_timeout)
+        return self.fetch_timeout
+
     def _get_object_filepath(self):
         return os.path.join(self.cache_dir, self._get_object_filename())
 
+    def get_cached_size(self):
+        """Size of the cached data, if they are not expired yet.
+
+        Returns:
+            the size, in bytes, of the cache file or None if data are
+            not in the cache or they are expired.
+        """
+        file_path = self._get_object_filepath()
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if stat.st_mtime <= time.time() - self.cache_expiry_time:
+            return None
+        return stat.st_size
+
+    def get_cache_token(self):
+        """Identify the cached data the object is using.
+
+        Returns:
+            (filename, ts, mtime, size) tuple, or None if the data have
+            not been loaded from or saved into the cache: the file name of
+            the cache entry, the timestamp of the data and the modification
+            time and size of the file when it was read or written.
+        """
+        return self.cache_token
+
+    def _set_cache_token(self, ts, stat):
+        self.cache_token = (self._get_object_filename(), ts) + stat
+
     def load_data_from_cache(self):
+        return self._load_data_from_cache(self.cache_expiry_time)
+
+    def _load_data_from_cache(self, cache_expiry_time):
+        # cache_expiry_time = None: expired data are loaded too.
         file_path = self._get_object_filepath()
 
+        epoch_time = int(time.time())
+
+        cached = memory_cache.get(file_path)
+        if cached:
+            ts, raw_data, stat = cached
+            if cache_expiry_time is None or \
+                ts > epoch_time - cache_expiry_time:
+                self.raw_data = raw_data
+                self._set_cache_token(ts, stat)
+                return True
+            # Expired in memory: the file could have been refreshed
+            # in the meantime by another process.
+
         if not os.path.isfile(file_path):
             return False
 
         try:
             with open(file_path, "r") as f:
+                st = os.fstat(f.fileno())
                 data = json.load(f)
         except:
             logging.error(
@@ -60,26 +202,107 @@ class CachedObject(object):
         if not "data" in data:
             return False
 
-        epoch_time = int(time.time())
+        raw_data = self._decode_cached_data(data["data"])
+        stat = (st.st_mtime, st.st_size)
+
+        memory_cache.put(file_path, (data["ts"], raw_data, stat))
 
-        if data["ts"] <= epoch_time - self.cache_expiry_time:
+        if cache_expiry_time is not None and \
+            data["ts"] <= epoch_time - cache_expiry_time:
             return False
 
-        self.raw_data = data["data"]
+        self.raw_data = raw_data
+        self._set_cache_token(data["ts"], stat)
         return True
 
+    def _decode_cached_data(self, data):
+        # From the JSON representation saved in the cache file to raw_data.
+        return data
+
+    def _encode_cached_data(self, raw_data):
+        # From raw_data to its JSON representation.
+        return raw_data
+
     def _get_data(self):
         raise NotImplementedError()
 
     def load_data(self):
         if self.load_data_from_cache():
             logging.debug("Cache hit: {}".format(self._get_object_filepath()))
+            cache_stats.hit(self._get_object_filename())
             return
 
-        self.raw_data = self._get_data()
+        cache_stats.miss(self._get_object_filename())
+
+        attempt = 0
+        while True:
+            if self.deadline and self.deadline.expired():
+                self._load_data_fallback(self.deadline)
+                return
+
+            if self.circuit_breaker and not self.circuit_breaker.allow():
+                self._load_data_fallback(self.circuit_breaker)
+                return
+
+            CachedObject._thread_data.fetches = \
+                CachedObject.get_thread_fetches() + 1
+            start_time = time.time()
+            try:
+                self.raw_data = self._get_data()
+                break
+            except self.PERMANENT_ERRORS:
+                # The source is working properly.
+                if self.circuit_breaker:
+                    self.circuit_breaker.success()
+                raise
+            except ARouteServerError as e:
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
+
+                if self.deadline and self.deadline.expired():
+                    self._load_data_fallback(self.deadline)
+                    return
+
+                if attempt >= self.retries:
+                    raise
+
+                delay = random.uniform(
+                    0, min(self.RETRY_BACKOFF_MAX,
+                           self.RETRY_BACKOFF_BASE * 2 ** attempt)
+                )
+                if self.deadline:
+                    delay = self.deadline.get_timeout(delay)
+                logging.info("Error while acquiring {}, retrying in "
+                             "{:.1f} seconds: {}".format(
+                                 self._get_descr(), delay, str(e)))
+                time.sleep(delay)
+                attempt += 1
+
+        if self.circuit_breaker:
+            self.circuit_breaker.success()
+
+        fetch_durations.record(self._get_object_filename(),
+                               time.time() - start_time)
 
         self.save_data_to_cache()
 
+    def _load_data_fallback(self, tracker):
+        # Data can't be acquired from the source: expired data are used,
+        # if any, otherwise it fails fast.
+        descr = self._get_descr()
+
+        if self._load_data_from_cache(None):
+            logging.warning("{}: using expired cached data for {}".format(
+                tracker.get_reason(), descr))
+            tracker.add_stale(descr)
+            return
+
+        tracker.add_failed(descr)
+        raise CachedObjectsError(
+            "{}: no cached data available for {}".format(
+                tracker.get_reason(), descr)
+        )
+
     def save_data_to_cache(self):
         file_path = self._get_object_filepath()
 
@@ -87,7 +310,7 @@ class CachedObject(object):
 
         cache_data = {
             "ts": epoch_time,
-            "data": self.raw_data
+            "data": self._encode_cached_data(self.raw_data)
         }
 
         if self.raw_data:
@@ -96,7 +319,588 @@ class CachedObject(object):
                     os.makedirs(os.path.dirname(file_path))
                 with open(file_path, "w") as f:
                     json.dump(cache_data, f)
+                st = os.stat(file_path)
             except Exception as e:
                 raise CachedObjectsError(
                     "Error while saving data to the cache: {}".format(str(e))
                 )
+
+            stat = (st.st_mtime, st.st_size)
+            memory_cache.put(file_path, (epoch_time, self.raw_data, stat))
+            self._set_cache_token(epoch_time, stat)
+
+class CacheStats(object):
+    """Hit/miss counters of the cached objects used during a build
+
+    Every object is counted only once, on the basis of the first time it
+    is loaded during the build: objects used many times, or loaded again
+    after they have been prefetched, don't alter the counters.
+
+    The names of the cached objects which are used are also tracked,
+    so that the unreferenced ones can be evicted from the cache.
+    """
+
+    FILENAME = "cache_stats.json"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.keys = set()
+
+    def hit(self, key):
+        with self.lock:
+            if key not in self.keys:
+                self.hits += 1
+                self.keys.add(key)
+
+    def miss(self, key):
+        with self.lock:
+            if key not in self.keys:
+                self.misses += 1
+                self.keys.add(key)
+
+    @staticmethod
+    def load(cache_dir):
+        """Load the stats saved by the previous builds.
+
+        Returns:
+            dict, <build_id>: {"ts", "hits", "misses", "keys"}
+        """
+        file_path = os.path.join(cache_dir, CacheStats.FILENAME)
+
+        if not os.path.isfile(file_path):
+            return {}
+
+        try:
+            with open(file_path, "r") as f:
+                return json.load(f)
+        except:
+            logging.error(
+                "Error while reading cache stats from {}".format(file_path)
+            )
+            return {}
+
+    def save(self, cache_dir, build_id):
+        """Save the current counters in the stats file.
+
+        Counters are saved on a per-build-id basis: stats of the
+        previous builds with a different ID (for example, the builds for
+        the other address family) are preserved.
+        """
+        all_stats = self.load(cache_dir)
+
+        with self.lock:
+            all_stats[build_id] = {
+                "ts": int(time.time()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "keys": sorted(self.keys)
+            }
+
+        file_path = os.path.join(cache_dir, self.FILENAME)
+        try:
+            with open(file_path, "w") as f:
+                json.dump(all_stats, f)
+        except Exception as e:
+            raise CachedObjectsError(
+                "Error while saving cache stats: {}".format(str(e))
+            )
+
+cache_stats = CacheStats()
+
+class FetchDurations(object):
+    """Time needed to acquire cached objects from their external source
+
+    Durations are persisted in the cache directory, so that they can be
+    used by the next builds to estimate the cost of the tasks that need
+    to acquire the same objects.
+    """
+
+    FILENAME = "fetch_durations.json"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.durations = {}
+
+    def record(self, key, duration):
+        with self.lock:
+            self.durations[key] = duration
+
+    @staticmethod
+    def load(cache_dir):
+        """Load the durations saved by the previous builds.
+
+        Returns:
+            dict, <key>: <seconds>
+        """
+        file_path = os.path.join(cache_dir, FetchDurations.FILENAME)
+
+        if not os.path.isfile(file_path):
+            return {}
+
+        try:
+            with open(file_path, "r") as f:
+                return json.load(f)
+        except:
+            logging.error(
+                "Error while reading fetch durations from {}".format(
+                    file_path)
+            )
+            return {}
+
+    def save(self, cache_dir):
+        """Merge the durations recorded so far into the durations file."""
+        all_durations = self.load(cache_dir)
+
+        with self.lock:
+            if not self.durations:
+                return
+            all_durations.update(self.durations)
+
+        file_path = os.path.join(cache_dir, self.FILENAME)
+        try:
+            with open(file_path, "w") as f:
+                json.dump(all_durations, f)
+        except Exception as e:
+            raise CachedObjectsError(
+                "Error while saving fetch durations: {}".format(str(e))
+            )
+
+fetch_durations = FetchDurations()
+
+class FallbackTracker(object):
+    """Objects for which data could not be acquired from their source
+
+    They are loaded from the cache, even if expired (stale), or they are
+    not loaded at all (failed). They are tracked, so that they can be
+    reported at the end of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stale = []
+        self.failed = []
+
+    def get_reason(self):
+        raise NotImplementedError()
+
+    def add_stale(self, descr):
+        with self.lock:
+            self.stale.append(descr)
+
+    def add_failed(self, descr):
+        with self.lock:
+            self.failed.append(descr)
+
+    def log_report(self):
+        with self.lock:
+            if not self.stale and not self.failed:
+                return
+            msg = "{}.".format(self.get_reason())
+            if self.stale:
+                msg += " Expired cached data used for: {}.".format(
+                    ", ".join(sorted(set(self.stale))))
+            if self.failed:
+                msg += " Data not acquired for: {}.".format(
+                    ", ".join(sorted(set(self.failed))))
+        logging.warning(msg)
+
+class FetchDeadline(FallbackTracker):
+    """Overall time budget to acquire data from external sources
+
+    Once the deadline is exceeded, objects that are not in the cache are
+    not acquired anymore: their expired cached data are used, if any,
+    otherwise they fail immediately. Timeouts of the requests that are
+    started before the deadline are capped to the remaining time.
+
+    The objects for which the deadline has been exceeded are tracked, so
+    that they can be reported at the end of the process.
+    """
+
+    def __init__(self, budget=None):
+        FallbackTracker.__init__(self)
+        self.budget = budget
+        self.expires_at = time.time() + budget if budget else None
+
+    def get_reason(self):
+        return "Enrichment deadline of {} seconds exceeded".format(
+            self.budget)
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def get_timeout(self, timeout=None):
+        """Timeout for a request that starts now.
+
+        Returns:
+            the lowest between ``timeout`` and the time remaining before
+            the deadline; None if none of them is set.
+        """
+        if self.expires_at is None:
+            return timeout
+        remaining = max(0, self.expires_at - time.time())
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+class CircuitBreaker(FallbackTracker):
+    """Stop sending requests to a source that is down
+
+    After ``threshold`` consecutive failed requests the breaker opens:
+    requests are not sent anymore and objects are loaded from expired
+    cached data, if any, or they fail immediately. After ``reset_timeout``
+    seconds a single trial request is allowed (half-open): the breaker
+    is closed again if it succeeds, or kept open if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, source, threshold=5, reset_timeout=60):
+        FallbackTracker.__init__(self)
+        self.source = source
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def get_reason(self):
+        return "Circuit breaker open for {}".format(self.source)
+
+    def allow(self):
+        """Tell whether a request can be sent to the source."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                time.time() >= self.opened_at + self.reset_timeout:
+                logging.info("Circuit breaker for {} half-open: trying "
+                             "again".format(self.source))
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logging.info("Circuit breaker for {} closed".format(
+                    self.source))
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or \
+                (self.state == self.CLOSED and self.threshold and
+                 self.failures >= self.threshold):
+                if self.state == self.CLOSED:
+                    logging.warning(
+                        "Circuit breaker for {} open after {} consecutive "
+                        "failures".format(self.source, self.failures))
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+class CircuitBreakers(object):
+    """One CircuitBreaker for each external source"""
+
+    def __init__(self, threshold=5, reset_timeout=60):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, source):
+        if source is None:
+            return None
+        with self.lock:
+            if source not in self.breakers:
+                self.breakers[source] = CircuitBreaker(
+                    source, self.threshold, self.reset_timeout
+                )
+            return self.breakers[source]
+
+    def log_report(self):
+        for source in sorted(self.breakers):
+            self.breakers[source].log_report()
+
+def touch_cache_entry(path):
+    """Record that a file of the cache directory has been used.
+
+    Files kept in the subdirectories of the cache directory (see
+    CacheDir.register_entries_dir()) are touched every time they are
+    used, so that those which are no longer used can be evicted.
+    """
+    try:
+        os.utime(path, None)
+    except OSError as e:
+        logging.debug("Error while touching {}: {}".format(path, str(e)))
+
+class CacheDir(object):
+    """Inspection and maintenance of the cache directory
+
+    Entries of the cache are:
+
+    - the cached objects: every .json file in the root of the cache
+      directory, except those registered using register_non_entry_file();
+      their key is the file name;
+
+    - the files kept by other components in the subdirectories that have
+      been registered using register_entries_dir(); their key is the path
+      of the file, relative to the cache directory.
+
+    Cached objects are unreferenced when they have not been used by any
+    of the builds whose stats have been saved; the other entries when
+    they have not been used within the cache expiry time (they are
+    touched every time they are used, see touch_cache_entry()).
+    """
+
+    # Files in the root of the cache directory that are not entries.
+    NON_ENTRY_FILES = set()
+
+    # Subdirectories whose files are entries: <dirname>: description.
+    ENTRIES_DIRS = {}
+
+    AGE_HISTOGRAM_BUCKETS = (
+        (3600, "< 1 hour"),
+        (6 * 3600, "1-6 hours"),
+        (12 * 3600, "6-12 hours"),
+        (24 * 3600, "12-24 hours"),
+        (7 * 86400, "1-7 days"),
+        (None, "> 7 days"),
+    )
+
+    @classmethod
+    def register_non_entry_file(cls, filename):
+        cls.NON_ENTRY_FILES.add(filename)
+
+    @classmethod
+    def register_entries_dir(cls, dirname, descr):
+        cls.ENTRIES_DIRS[dirname] = descr
+
+    def __init__(self, cache_dir, cache_expiry=CachedObject.DEFAULT_EXPIRY):
+        if not cache_dir:
+            raise CachedObjectsError("Missing cache directory")
+        if not os.path.isdir(cache_dir):
+            raise CachedObjectsError(
+                "The cache directory {} does not exist".format(cache_dir)
+            )
+        self.cache_dir = cache_dir
+        self.cache_expiry = cache_expiry
+
+    @staticmethod
+    def _get_entry(key, path, dirname=None):
+        st = os.stat(path)
+        return {
+            "key": key,
+            "path": path,
+            "dir": dirname,
+            "size": st.st_size,
+            "mtime": int(st.st_mtime)
+        }
+
+    def get_entries(self):
+        """List the entries of the cache.
+
+        Returns:
+            list of dict: {"key", "path", "dir", "size", "mtime"}, sorted
+            from the oldest to the newest one; "dir" is None for the
+            cached objects.
+        """
+        res = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            if filename in self.NON_ENTRY_FILES:
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            if not os.path.isfile(path):
+                continue
+            res.append(self._get_entry(filename, path))
+
+        for dirname in sorted(self.ENTRIES_DIRS):
+            dir_path = os.path.join(self.cache_dir, dirname)
+            if not os.path.isdir(dir_path):
+                continue
+            for root, _, filenames in os.walk(dir_path):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    if not os.path.isfile(path):
+                        continue
+                    res.append(self._get_entry(
+                        os.path.relpath(path, self.cache_dir), path, dirname
+                    ))
+
+        return sorted(res, key=lambda e: (e["mtime"], e["key"]))
+
+    def _is_unreferenced(self, entry, referenced, now):
+        if entry["dir"] is None:
+            return referenced is not None and entry["key"] not in referenced
+        return now - entry["mtime"] >= self.cache_expiry
+
+    def get_entry(self, key):
+        """Load a single entry.
+
+        Returns:
+            dict: {"key", "path", "size", "ts", "age", "expired", "data"}
+        """
+        entries = [e for e in self.get_entries()
+                   if e["key"] == key and e["dir"] is None]
+        if not entries:
+            raise CachedObjectsError("Cache entry not found: {}".format(key))
+        entry = entries[0]
+
+        try:
+            with open(entry["path"], "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            raise CachedObjectsError(
+                "Error while reading cache entry {}: {}".format(key, str(e))
+            )
+
+        if not isinstance(data, dict) or "ts" not in data:
+            raise CachedObjectsError(
+                "Invalid format for cache entry {}".format(key)
+            )
+
+        age = int(time.time()) - data["ts"]
+        return {
+            "key": key,
+            "path": entry["path"],
+            "size": entry["size"],
+            "ts": data["ts"],
+            "age": age,
+            "expired": age >= self.cache_expiry,
+            "data": data.get("data", None)
+        }
+
+    def get_referenced_keys(self):
+        """Keys used by any of the builds whose stats have been saved.
+
+        Returns:
+            set of keys, or None if no stats are available.
+        """
+        all_stats = CacheStats.load(self.cache_dir)
+        if not all_stats:
+            return None
+        res = set()
+        for build_id in all_stats:
+            res.update(all_stats[build_id].get("keys", []))
+        return res
+
+    def get_stats(self):
+        entries = self.get_entries()
+        now = int(time.time())
+
+        histogram = []
+        for _, descr in self.AGE_HISTOGRAM_BUCKETS:
+            histogram.append([descr, 0])
+
+        expired = 0
+        for entry in entries:
+            age = now - entry["mtime"]
+            if age >= self.cache_expiry:
+                expired += 1
+            for bucket_idx, (max_age, _) in \
+                enumerate(self.AGE_HISTOGRAM_BUCKETS):
+                if max_age is None or age < max_age:
+                    histogram[bucket_idx][1] += 1
+                    break
+
+        referenced = self.get_referenced_keys()
+        unreferenced = None
+        if referenced is not None:
+            unreferenced = len(
+                [e for e in entries
+                 if self._is_unreferenced(e, referenced, now)]
+            )
+
+        dirs = []
+        for dirname in [None] + sorted(self.ENTRIES_DIRS):
+            dir_entries = [e for e in entries if e["dir"] == dirname]
+            dirs.append([
+                self.ENTRIES_DIRS[dirname] if dirname else "cached objects",
+                len(dir_entries),
+                sum([e["size"] for e in dir_entries])
+            ])
+
+        return {
+            "entries": len(entries),
+            "size": sum([e["size"] for e in entries]),
+            "expired": expired,
+            "unreferenced": unreferenced,
+            "dirs": dirs,
+            "age_histogram": histogram,
+            "builds": CacheStats.load(self.cache_dir)
+        }
+
+    def gc(self, max_size=None, unreferenced=False, dry_run=False):
+        """Evict entries from the cache.
+
+        Args:
+            max_size (int): if set, the oldest entries are evicted
+                until the total size of the cache is <= max_size bytes.
+
+            unreferenced (bool): evict the cached objects that have not
+                been used by any of the builds whose stats have been
+                saved, and the other entries that have not been used
+                within the cache expiry time.
+
+            dry_run (bool): do not really remove the files.
+
+        Returns:
+            list of the evicted entries.
+        """
+        entries = self.get_entries()
+        evicted = []
+
+        if unreferenced:
+            referenced = self.get_referenced_keys()
+            if referenced is None:
+                logging.warning("No stats available from previous builds: "
+                                "unreferenced cached objects can't be "
+                                "identified.")
+            now = int(time.time())
+            evicted.extend(
+                [e for e in entries
+                 if self._is_unreferenced(e, referenced, now)]
+            )
+            entries = [e for e in entries
+                       if not self._is_unreferenced(e, referenced, now)]
+
+        if max_size is not None:
+            size = sum([e["size"] for e in entries])
+            # Oldest first.
+            for entry in entries:
+                if size <= max_size:
+                    break
+                evicted.append(entry)
+                size -= entry["size"]
+
+        if not dry_run:
+            for entry in evicted:
+                try:
+                    os.remove(entry["path"])
+                except Exception as e:
+                    raise CachedObjectsError(
+                        "Error while removing cache entry {}: {}".format(
+                            entry["key"], str(e)
+                        )
+                    )
+
+        return evicted
+
+CacheDir.register_non_entry_file(CacheStats.FILENAME)
+CacheDir.register_non_entry_file(FetchDurations.FILENAME)
@@ -14,12 +14,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from tpl_rendering import HTMLCommand, DumpTemplateContextCommand, \
-                          BIRDCommand, OpenBGPDCommand, BuildCommand
+                          BIRDCommand, OpenBGPDCommand, BuildCommand, \
+                          BuildAllCommand
+from cache_warm import CacheWarmCommand
+from cache import CacheCommand
 from clients_from_peeringdb import ClientsFromPeeringDBCommand
 from clients_from_euroix import ClientsFromEuroIXCommand
 from setup import SetupCommand
 from setup_templates import SetupTemplatesCommand
 from verify_templates import VerifyTemplatesCommand
+from compile_templates import CompileTemplatesCommand
 from init_scenario import InitScenarioCommand
 
 all_commands = [
@@ -28,10 +32,14 @@ all_commands = [
     OpenBGPDCommand,
     HTMLCommand,
     DumpTemplateContextCommand,
+    BuildAllCommand,
+    CacheWarmCommand,
+    CacheCommand,
     ClientsFromPeeringDBCommand,
     ClientsFromEuroIXCommand,
     SetupCommand,
     SetupTemplatesCommand,
     VerifyTemplatesCommand,
+    CompileTemplatesCommand,
     InitScenarioCommand,
 ]
@@ -72,6 +72,34 @@ class ARouteServerCommand(object):
                 "#configuration-file-format)",
             dest="logging_config_file")
 
+    @classmethod
+    def add_rs_config_arguments(cls, parser):
+
+        group = parser.add_argument_group(
+            title="Route server configuration",
+            description="The following arguments override those provided "
+                        "in the program's configuration file."
+        )
+
+        group.add_argument(
+            "--general",
+            help="General route server configuration file.",
+            metavar="FILE",
+            dest="cfg_general")
+
+        group.add_argument(
+            "--clients",
+            help="Route server clients configuration file, or "
+                 "directory containing many configuration files.",
+            metavar="FILE",
+            dest="cfg_clients")
+
+        group.add_argument(
+            "--bogons",
+            help="Bogons configuration file.",
+            metavar="FILE",
+            dest="cfg_bogons")
+
     def _setup(self):
         logging_setted_up = False
 
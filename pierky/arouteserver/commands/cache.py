@@ -0,0 +1,195 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import time
+
+from .base import ARouteServerCommand
+from ..cached_objects import CacheDir
+from ..config.program import program_config
+# Components that keep their entries in subdirectories of the cache
+# directory: they register them in CacheDir when imported.
+from .. import build_state, templates_cache
+from ..config import base
+
+
+def size_type(s):
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    s = s.strip().upper()
+    try:
+        if s and s[-1] in multipliers:
+            return int(s[:-1]) * multipliers[s[-1]]
+        return int(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "invalid size: {}; it must be a number of bytes, "
+            "optionally followed by K, M or G".format(s)
+        )
+
+def format_size(size):
+    for unit in ("bytes", "KB", "MB"):
+        if size < 1024:
+            return "{} {}".format(size, unit) if unit == "bytes" else \
+                "{:.1f} {}".format(size, unit)
+        size /= 1024.0
+    return "{:.1f} GB".format(size)
+
+class CacheCommand(ARouteServerCommand):
+
+    COMMAND_NAME = "cache"
+    COMMAND_HELP = ("Inspect and maintain the cache directory, where "
+                    "data acquired from external sources are stored.")
+    NEEDS_CONFIG = True
+
+    SUB_COMMANDS = (
+        ("stats", "Show cache entries, size, age histogram and hit/miss "
+                  "ratio of the last builds."),
+        ("gc", "Evict unreferenced and/or oldest entries from the cache."),
+        ("show", "Show a single cache entry."),
+    )
+
+    @classmethod
+    def add_arguments(cls, parser):
+        sub_parsers = parser.add_subparsers(
+            title="cache commands",
+            dest="cache_command")
+        sub_parsers.required = True
+
+        for name, help in cls.SUB_COMMANDS:
+            sub_parser = sub_parsers.add_parser(name, help=help)
+            cls.add_program_config_arguments(sub_parser)
+            getattr(cls, "add_{}_arguments".format(name))(sub_parser)
+
+    @classmethod
+    def add_stats_arguments(cls, parser):
+        pass
+
+    @classmethod
+    def add_gc_arguments(cls, parser):
+        parser.add_argument(
+            "--max-size",
+            help="Evict the oldest entries until the total size of the "
+                 "cache is lower than or equal to this value. "
+                 "K, M and G suffixes can be used.",
+            type=size_type,
+            metavar="SIZE",
+            dest="max_size")
+
+        parser.add_argument(
+            "--unreferenced",
+            help="Evict the entries that have not been used by the "
+                 "last builds.",
+            action="store_true",
+            dest="unreferenced")
+
+        parser.add_argument(
+            "--dry-run",
+            help="Only show the entries that would be evicted.",
+            action="store_true",
+            dest="dry_run")
+
+    @classmethod
+    def add_show_arguments(cls, parser):
+        parser.add_argument(
+            "key",
+            help="Key of the entry to show, as reported by the "
+                 "'cache gc --dry-run' command (for example, "
+                 "'AS-FOO-r_set-ipv4.json').")
+
+    def _get_cache_dir(self):
+        return CacheDir(program_config.get("cache_dir"),
+                        program_config.get("cache_expiry"))
+
+    def run(self):
+        return getattr(self, "run_{}".format(self.args.cache_command))()
+
+    def run_stats(self):
+        stats = self._get_cache_dir().get_stats()
+
+        print("Entries: {}".format(stats["entries"]))
+        print("Size: {}".format(format_size(stats["size"])))
+        for descr, cnt, size in stats["dirs"]:
+            print(" - {}: {} entries, {}".format(descr, cnt,
+                                                format_size(size)))
+        print("Expired entries: {}".format(stats["expired"]))
+        if stats["unreferenced"] is not None:
+            print("Entries not used by the last builds: {}".format(
+                stats["unreferenced"]))
+        print("")
+        print("Age histogram:")
+        for descr, cnt in stats["age_histogram"]:
+            print(" - {:<12} {}".format(descr, cnt))
+
+        if not stats["builds"]:
+            return True
+
+        print("")
+        print("Last builds:")
+        now = int(time.time())
+        for build_id in sorted(stats["builds"],
+                               key=lambda k: stats["builds"][k]["ts"],
+                               reverse=True):
+            build = stats["builds"][build_id]
+            total = build["hits"] + build["misses"]
+            print(" - {}, {} seconds ago: {} hits, {} misses{}".format(
+                build_id, now - build["ts"], build["hits"], build["misses"],
+                ", hit ratio {:.1%}".format(
+                    float(build["hits"]) / total
+                ) if total else ""
+            ))
+
+        return True
+
+    def run_gc(self):
+        if self.args.max_size is None and not self.args.unreferenced:
+            print("Nothing to do: please use '--max-size' and/or "
+                  "'--unreferenced' to select the entries to evict.")
+            return False
+
+        evicted = self._get_cache_dir().gc(
+            max_size=self.args.max_size,
+            unreferenced=self.args.unreferenced,
+            dry_run=self.args.dry_run
+        )
+
+        for entry in evicted:
+            print("{}{}".format(
+                "Would evict " if self.args.dry_run else "Evicted ",
+                entry["key"]
+            ))
+        print("{} entries, {} {}".format(
+            len(evicted),
+            format_size(sum([e["size"] for e in evicted])),
+            "would be freed" if self.args.dry_run else "freed"
+        ))
+
+        return True
+
+    def run_show(self):
+        entry = self._get_cache_dir().get_entry(self.args.key)
+
+        print("Key: {}".format(entry["key"]))
+        print("Path: {}".format(entry["path"]))
+        print("Size: {}".format(format_size(entry["size"])))
+        print("Saved at: {} ({} seconds ago){}".format(
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["ts"])),
+            entry["age"],
+            ", expired" if entry["expired"] else ""
+        ))
+        print("Data:")
+        print(json.dumps(entry["data"], indent=2, sort_keys=True))
+
+        return True
@@ -0,0 +1,80 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .base import ARouteServerCommand
+from ..builder import CacheWarmer
+from .tpl_rendering import get_cfg_builder_params
+
+class CacheWarmCommand(ARouteServerCommand):
+
+    COMMAND_NAME = "cache-warm"
+    COMMAND_HELP = ("Refresh the cached data (IRRDB, PeeringDB) needed "
+                    "to build the route server configuration, so that "
+                    "subsequent builds don't need to wait for them.")
+    NEEDS_CONFIG = True
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super(CacheWarmCommand, cls).add_arguments(parser)
+
+        parser.add_argument(
+            "--refresh-margin",
+            help="Cached objects that will expire within this number of "
+                 "seconds are refreshed too. "
+                 "Default: {}".format(CacheWarmer.DEFAULT_REFRESH_MARGIN),
+            type=int,
+            default=CacheWarmer.DEFAULT_REFRESH_MARGIN,
+            metavar="SECONDS",
+            dest="refresh_margin")
+
+        parser.add_argument(
+            "--ip-ver",
+            help="Only refresh data needed to build the configuration "
+                 "for this IP version. "
+                 "Default: both IPv4 and IPv6",
+            default=None,
+            choices=[4, 6],
+            type=int,
+            dest="ip_ver")
+
+        parser.add_argument(
+            "--threads",
+            help="Number of threads used to acquire data from external "
+                 "sources. Overrides the 'threads' option of the "
+                 "program's configuration file.",
+            type=int,
+            metavar="N",
+            dest="threads")
+
+        cls.add_rs_config_arguments(parser)
+
+    def run(self):
+        params = get_cfg_builder_params()
+
+        # Only the external data are needed here: prefix lists are not
+        # processed any further, the state of the builds is left as it
+        # is and no templates are rendered.
+        params.update({
+            "prune_irrdb_prefixes": False,
+            "aggregate_prefix_lists": False,
+            "incremental_build": False,
+            "cache_compiled_templates": False,
+            "ip_ver": self.args.ip_ver,
+            "refresh_margin": self.args.refresh_margin
+        })
+
+        CacheWarmer(**params)
+
+        return True
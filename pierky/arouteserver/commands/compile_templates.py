@@ -0,0 +1,77 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+from .base import ARouteServerCommand
+from .tpl_rendering import BuildAllCommand
+from ..config.program import program_config
+from ..errors import ARouteServerError
+
+class CompileTemplatesCommand(ARouteServerCommand):
+
+    COMMAND_NAME = "compile-templates"
+    COMMAND_HELP = ("Compile the templates into bundles of Python modules "
+                    "that are stored in the cache directory and used by "
+                    "the next builds, as long as templates don't change.")
+    NEEDS_CONFIG = True
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super(CompileTemplatesCommand, cls).add_arguments(parser)
+
+        parser.add_argument(
+            "--speaker",
+            help="Compile only the templates used to build the "
+                 "configuration for these BGP speakers (or for the "
+                 "HTML representation). Default: all.",
+            nargs="+",
+            choices=sorted(BuildAllCommand.SPEAKERS),
+            dest="speakers")
+
+        parser.add_argument(
+            "--templates-dir",
+            help="Directory where Jinja2 files are stored. This is the "
+                 "directory where the \"html\" directory and other BGP "
+                 "speaker specific directories (\"bird\") can be found.",
+            metavar="DIR",
+            dest="templates_dir")
+
+    def run(self):
+        if program_config.verify_templates() != []:
+            logging.warning("One or more templates are not aligned "
+                            "with those used by the current version "
+                            "of the program. "
+                            "Run 'arouteserver verify-templates' for "
+                            "more information.")
+
+        cache_dir = program_config.get("cache_dir")
+        if not os.path.isdir(cache_dir):
+            raise ARouteServerError(
+                "The cache directory {} does not exist".format(cache_dir)
+            )
+
+        for speaker in self.args.speakers or sorted(BuildAllCommand.SPEAKERS):
+            builder_class, template_sub_dir, _ = \
+                BuildAllCommand.SPEAKERS[speaker]
+            template_dir = os.path.join(program_config.get("templates_dir"),
+                                        template_sub_dir)
+            bundle = builder_class.compile_templates(template_dir, cache_dir)
+            print("{}: templates from {} compiled into {}".format(
+                speaker, template_dir, bundle.path
+            ))
+
+        return True
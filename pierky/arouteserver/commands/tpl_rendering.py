@@ -20,9 +20,51 @@ import sys
 
 from .base import ARouteServerCommand
 from ..builder import ConfigBuilder, BIRDConfigBuilder, \
-                      OpenBGPDConfigBuilder, TemplateContextDumper
+                      OpenBGPDConfigBuilder, TemplateContextDumper, \
+                      MultiTargetBuilder
+from ..config.profiles import ConfigParserProfiles, SPEAKERS, parse_target
 from ..config.program import program_config
-from ..errors import ARouteServerError, TemplateRenderingError
+from ..errors import ARouteServerError, TemplateRenderingError, ConfigError
+
+def get_cfg_builder_params():
+    """Arguments of the ConfigBuilder taken from the program's config."""
+    return {
+        "cfg_general": program_config.get("cfg_general"),
+        "cfg_clients": program_config.get("cfg_clients"),
+        "cfg_bogons": program_config.get("cfg_bogons"),
+        "cache_dir": program_config.get("cache_dir"),
+        "cache_expiry": program_config.get("cache_expiry"),
+        "bgpq3_path": program_config.get("bgpq3_path"),
+        "bgpq3_host": program_config.get("bgpq3_host"),
+        "bgpq3_sources": program_config.get("bgpq3_sources"),
+        "threads": program_config.get("threads"),
+        "adaptive_concurrency":
+            program_config.get("adaptive_concurrency"),
+        "min_threads": program_config.get("min_threads"),
+        "max_threads": program_config.get("max_threads"),
+        "enrichers_engine": program_config.get("enrichers_engine"),
+        "irrdb_async_concurrency":
+            program_config.get("irrdb_async_concurrency"),
+        "irrdb_timeout": program_config.get("irrdb_timeout"),
+        "peeringdb_timeout": program_config.get("peeringdb_timeout"),
+        "enrichment_deadline": program_config.get("enrichment_deadline"),
+        "fetch_retries": program_config.get("fetch_retries"),
+        "circuit_breaker_threshold":
+            program_config.get("circuit_breaker_threshold"),
+        "circuit_breaker_reset":
+            program_config.get("circuit_breaker_reset"),
+        "parsing_processes": program_config.get("parsing_processes"),
+        "parsing_min_prefixes":
+            program_config.get("parsing_min_prefixes"),
+        "prune_irrdb_prefixes":
+            program_config.get("prune_irrdb_prefixes"),
+        "aggregate_prefix_lists":
+            program_config.get("aggregate_prefix_lists"),
+        "cache_parsed_cfg": program_config.get("cache_parsed_cfg"),
+        "incremental_build": program_config.get("incremental_build"),
+        "cache_compiled_templates":
+            program_config.get("cache_compiled_templates")
+    }
 
 class TemplateRenderingCommands(ARouteServerCommand):
 
@@ -55,29 +97,7 @@ class TemplateRenderingCommands(ARouteServerCommand):
             metavar="ISSUE_ID",
             dest="ignore_errors")
 
-        group = parser.add_argument_group(
-            title="Route server configuration",
-            description="The following arguments override those provided "
-                        "in the program's configuration file."
-        )
-
-        group.add_argument(
-            "--general",
-            help="General route server configuration file.",
-            metavar="FILE",
-            dest="cfg_general")
-
-        group.add_argument(
-            "--clients",
-            help="Route server clients configuration file.",
-            metavar="FILE",
-            dest="cfg_clients")
-
-        group.add_argument(
-            "--bogons",
-            help="Bogons configuration file.",
-            metavar="FILE",
-            dest="cfg_bogons")
+        cls.add_rs_config_arguments(parser)
 
         group = parser.add_argument_group(
             title="Rendering",
@@ -127,21 +147,13 @@ class TemplateRenderingCommands(ARouteServerCommand):
                             "more information.")
 
         # Config builder setup
-        self.cfg_builder_params = {
-            "cfg_general": program_config.get("cfg_general"),
-            "cfg_clients": program_config.get("cfg_clients"),
-            "cfg_bogons": program_config.get("cfg_bogons"),
-            "cache_dir": program_config.get("cache_dir"),
-            "cache_expiry": program_config.get("cache_expiry"),
-            "bgpq3_path": program_config.get("bgpq3_path"),
-            "bgpq3_host": program_config.get("bgpq3_host"),
-            "bgpq3_sources": program_config.get("bgpq3_sources"),
+        self.cfg_builder_params = get_cfg_builder_params()
+        self.cfg_builder_params.update({
             "template_dir": program_config.get("templates_dir"),
             "template_name": program_config.get("template_name"),
             "ip_ver": self.args.ip_ver,
-            "threads": program_config.get("threads"),
             "ignore_errors": self.args.ignore_errors
-        }
+        })
         self._set_cfg_builder_params()
 
         builder_class = self._get_builder_class()
@@ -251,6 +263,11 @@ class HTMLCommand(TemplateRenderingCommands):
     def _get_template_sub_dir(self):
         return "html"
 
+    def _set_cfg_builder_params(self):
+        # Prefix lists are shown as they are configured.
+        self.cfg_builder_params["prune_irrdb_prefixes"] = False
+        self.cfg_builder_params["aggregate_prefix_lists"] = False
+
 class DumpTemplateContextCommand(TemplateRenderingCommands):
 
     COMMAND_NAME = "template-context"
@@ -263,3 +280,212 @@ class DumpTemplateContextCommand(TemplateRenderingCommands):
 
     def _get_template_sub_dir(self):
         return "template-context"
+
+class BuildAllCommand(ARouteServerCommand):
+
+    COMMAND_NAME = "build-all"
+    COMMAND_HELP = ("Build many route server configurations (BIRD, "
+                    "OpenBGPD, HTML, ...) at once: configuration files "
+                    "are loaded and external data are acquired only once "
+                    "for all of them.")
+    NEEDS_CONFIG = True
+
+    # <speaker>: (builder class, templates sub dir, builder params)
+    SPEAKERS = {
+        "bird": (BIRDConfigBuilder, "bird", {}),
+        "openbgpd": (OpenBGPDConfigBuilder, "openbgpd", {}),
+        # Prefix lists are shown as they are configured.
+        "html": (ConfigBuilder, "html", {"prune_irrdb_prefixes": False,
+                                         "aggregate_prefix_lists": False}),
+        "template-context": (TemplateContextDumper, "template-context", {})
+    }
+
+    @staticmethod
+    def parse_target(s):
+        try:
+            return parse_target(s)
+        except ConfigError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super(BuildAllCommand, cls).add_arguments(parser)
+
+        parser.add_argument(
+            "--target",
+            help="Configuration to build, in the "
+                 "SPEAKER[:IP_VER]=OUTPUT_FILE format, where SPEAKER is "
+                 "one of {} and IP_VER is 4 or 6 (default: both "
+                 "IPv4 and IPv6). Example: bird:4=/etc/bird/bird4.conf. "
+                 "It can be used many times.".format(", ".join(SPEAKERS)),
+            type=cls.parse_target,
+            action="append",
+            default=[],
+            metavar="TARGET",
+            dest="targets")
+
+        parser.add_argument(
+            "--profiles",
+            help="File with a list of route server profiles, each one "
+                 "with its own general configuration (or overrides for "
+                 "some of its options), templates, IP version and "
+                 "targets. All the profiles share the same clients "
+                 "configuration and external data.",
+            metavar="FILE",
+            dest="profiles")
+
+        parser.add_argument(
+            "--processes",
+            help="Number of processes used to build the targets, once "
+                 "the external data have been acquired. Default: 1.",
+            type=int,
+            default=1,
+            metavar="N",
+            dest="processes")
+
+        parser.add_argument(
+            "--ignore-issues",
+            nargs="+",
+            help="Ignore compatibility issues identified by the IDs "
+                 "provided here.",
+            metavar="ISSUE_ID",
+            dest="ignore_errors")
+
+        cls.add_rs_config_arguments(parser)
+
+        group = parser.add_argument_group(
+            title="Rendering",
+            description="The following arguments override those provided "
+                        "in the program's configuration file."
+        )
+
+        group.add_argument(
+            "--templates-dir",
+            help="Directory where Jinja2 files are stored. This is the "
+                 "directory where the \"html\" directory and other BGP "
+                 "speaker specific directories (\"bird\") can be found.",
+            metavar="DIR",
+            dest="templates_dir")
+
+        group.add_argument(
+            "--template-file-name",
+            help="Main Jinja2 template file name.",
+            metavar="NAME",
+            dest="template_name")
+
+        group = parser.add_argument_group(
+            title="OpenBGPD",
+            description="Arguments used by the OpenBGPD targets."
+        )
+
+        group.add_argument(
+            "--local-files-dir",
+            help="The directory where .local files are located, from the "
+                 "route server's perspective.",
+            default="/etc/bgpd",
+            dest="local_files_dir"
+        )
+
+        group.add_argument(
+            "--use-local-files",
+            help="Enable the inclusion of .local files into the generated "
+                 "OpenBGPD configuration. "
+                 "The list of available .local files IDs follows: {}".format(
+                     ", ".join(OpenBGPDConfigBuilder.LOCAL_FILES_IDS)
+                 ),
+            nargs="*",
+            choices=OpenBGPDConfigBuilder.LOCAL_FILES_IDS,
+            metavar="FILE_ID",
+            dest="local_files")
+
+    def _get_target(self, speaker, ip_ver, output_file, templates_dir,
+                    name_prefix=""):
+        builder_class, template_sub_dir, params = self.SPEAKERS[speaker]
+
+        target = {
+            "name": "{}{}{} ({})".format(
+                name_prefix,
+                speaker, ":{}".format(ip_ver) if ip_ver else "",
+                output_file
+            ),
+            "builder_class": builder_class,
+            "output_file": output_file,
+            "template_dir": os.path.join(templates_dir, template_sub_dir),
+            "ip_ver": ip_ver
+        }
+        target.update(params)
+        if builder_class is OpenBGPDConfigBuilder:
+            target["local_files_dir"] = self.args.local_files_dir
+            target["local_files"] = self.args.local_files
+        return target
+
+    def _get_targets(self):
+        targets = []
+
+        for speaker, ip_ver, output_file in self.args.targets:
+            targets.append(
+                self._get_target(speaker, ip_ver, output_file,
+                                 program_config.get("templates_dir"))
+            )
+
+        if self.args.profiles:
+            profiles = ConfigParserProfiles()
+            try:
+                profiles.load(self.args.profiles)
+            except ARouteServerError as e:
+                raise ARouteServerError(
+                    "One or more errors occurred while loading "
+                    "profiles file{}".format(
+                        ": {}".format(str(e)) if str(e) else ""
+                    )
+                )
+
+            for profile in profiles.cfg["profiles"]:
+                for profile_target in profile["targets"]:
+                    target = self._get_target(
+                        profile_target["speaker"],
+                        profile_target["ip_ver"],
+                        profile_target["output_file"],
+                        profile["templates_dir"] or
+                            program_config.get("templates_dir"),
+                        name_prefix="{}: ".format(profile["name"])
+                    )
+                    if profile["general"]:
+                        target["cfg_general"] = profile["general"]
+                    if profile["general_overrides"]:
+                        target["cfg_general_overrides"] = \
+                            profile["general_overrides"]
+                    if profile["template_name"]:
+                        target["template_name"] = profile["template_name"]
+                    targets.append(target)
+
+        if not targets:
+            raise ARouteServerError(
+                "No targets to build: use --target or --profiles"
+            )
+
+        return targets
+
+    def run(self):
+        if program_config.verify_templates() != []:
+            logging.warning("One or more templates are not aligned "
+                            "with those used by the current version "
+                            "of the program. "
+                            "Run 'arouteserver verify-templates' for "
+                            "more information.")
+
+        cfg_builder_params = get_cfg_builder_params()
+        cfg_builder_params.update({
+            "template_name": program_config.get("template_name"),
+            "ignore_errors": self.args.ignore_errors
+        })
+
+        targets = self._get_targets()
+
+        MultiTargetBuilder(
+            targets,
+            processes=self.args.processes,
+            **cfg_builder_params
+        ).build()
+
+        return True
@@ -16,7 +16,7 @@
 from copy import deepcopy
 import logging
 
-from .base import ConfigParserBase
+from .base import ConfigParserBase, CompiledSchema
 from .validators import *
 from ..errors import ConfigError, ARouteServerError
 
@@ -25,6 +25,29 @@ class ConfigParserASNS(ConfigParserBase):
 
     ROOT = "asns"
 
+    FRAGMENTS_SUPPORTED = True
+
+    def merge_fragments(self, fragments):
+        self.cfg = {"asns": {}}
+
+        errors = False
+
+        asn_to_path = {}
+        for path, fragment in fragments:
+            for asn in fragment.cfg["asns"]:
+                if asn in asn_to_path:
+                    logging.error(
+                        "Duplicate ASN found in 'asns' section: {}, "
+                        "in {} and {}.".format(asn, asn_to_path[asn], path)
+                    )
+                    errors = True
+                else:
+                    asn_to_path[asn] = path
+                self.cfg["asns"][asn] = fragment.cfg["asns"][asn]
+
+        if errors:
+            raise ConfigError()
+
     def parse(self):
         if "clients" in self.cfg:
             del self.cfg["clients"]
@@ -38,7 +61,8 @@ class ConfigParserASNS(ConfigParserBase):
             "as_sets": ValidatorListOf(ValidatorASSet,
                                        mandatory=False)
         }
-       
+        compiled_schema = CompiledSchema(schema, "asns")
+
         for asn in self.cfg["asns"]:
             try:
                 if not asn.startswith("AS"):
@@ -53,7 +77,7 @@ class ConfigParserASNS(ConfigParserBase):
                 errors = True
 
             try:
-                ConfigParserBase.validate(schema, self.cfg["asns"][asn], "asns")
+                compiled_schema.validate(self.cfg["asns"][asn])
             except ARouteServerError as e:
                 err_msg = ("One or more errors occurred while processing "
                            "the 'asns' configuration for '{}'".format(asn))
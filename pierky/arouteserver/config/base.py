@@ -13,22 +13,44 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
+import hashlib
+import json
 import os
 import logging
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 
 from .validators import ConfigParserValidator
+from ..cached_objects import CacheDir, touch_cache_entry
 from ..errors import ConfigError, MissingFileError, ARouteServerError
+from ..prefix_list import PrefixListSafeDumper
+from ..version import __version__
 
 
 class ConfigParserBase(object):
 
     ROOT = None
 
+    # Can the configuration be split in many files within a directory?
+    FRAGMENTS_SUPPORTED = False
+
+    # Extensions of the files that are loaded from the directory.
+    FRAGMENTS_EXTENSIONS = (".yml", ".yaml")
+
     def __init__(self):
         self.cfg = None
 
+        # Set when the configuration is loaded using a ParsedConfigCache.
+        self.cache_key = None
+
+        # True when this is a fragment of a configuration directory.
+        self.fragment = False
+
     def __contains__(self, name):
         return name in self.cfg[self.ROOT]
 
@@ -43,7 +65,7 @@ class ConfigParserBase(object):
 
     def _load_from_yaml(self, doc):
         try:
-            self.cfg = yaml.safe_load(doc)
+            self.cfg = yaml.load(doc, Loader=SafeLoader)
         except Exception as e:
             raise ConfigError(
                 "Can't parse YAML file: {}".format(str(e))
@@ -56,9 +78,19 @@ class ConfigParserBase(object):
         with open(cfg_path, "r") as f:
             self._load_from_yaml(f.read())
 
-    def load(self, cfg_path):
+    def load(self, cfg_path, parsed_cfg_cache=None, deps=None):
+        if os.path.isdir(cfg_path):
+            self._load_from_dir(cfg_path, parsed_cfg_cache, deps)
+            return
+
+        if parsed_cfg_cache:
+            parsed_cfg_cache.load(self, cfg_path, deps)
+            return
+
         self._load_from_yaml_file(cfg_path)
+        self._parse()
 
+    def _parse(self):
         try:
             self.parse()
         except ARouteServerError as e:
@@ -66,6 +98,98 @@ class ConfigParserBase(object):
                 logging.error(str(e))
             raise ConfigError()
 
+    def _new_fragment(self):
+        """Parser for a single file of a configuration directory."""
+        res = self.__class__()
+        res.fragment = True
+        return res
+
+    def _load_from_dir(self, dir_path, parsed_cfg_cache=None, deps=None):
+        """Load the configuration from the files of a directory.
+
+        Every file is parsed and validated on its own (and, when the
+        cache is used, only the files that have changed are parsed
+        again); the fragments are then merged together by
+        merge_fragments(), which also runs the checks that involve
+        more than one file. Files are processed in alphabetical order.
+        """
+        if not self.FRAGMENTS_SUPPORTED:
+            raise ConfigError(
+                "{} is a directory, but this configuration can't be "
+                "split in many files".format(dir_path)
+            )
+
+        paths = []
+        for filename in sorted(os.listdir(dir_path)):
+            if filename.startswith("."):
+                continue
+            if not filename.endswith(self.FRAGMENTS_EXTENSIONS):
+                continue
+            path = os.path.join(dir_path, filename)
+            if os.path.isfile(path):
+                paths.append(path)
+
+        errors = False
+        fragments = []
+        for path in paths:
+            fragment = self._new_fragment()
+            try:
+                fragment.load(path, parsed_cfg_cache=parsed_cfg_cache,
+                              deps=deps)
+            except ARouteServerError as e:
+                if str(e):
+                    logging.error(str(e))
+                logging.error("One or more errors occurred while processing "
+                              "{}".format(path))
+                errors = True
+                continue
+            fragments.append((path, fragment))
+
+        if errors:
+            raise ConfigError()
+
+        try:
+            self.merge_fragments(fragments)
+        except ARouteServerError as e:
+            if str(e):
+                logging.error(str(e))
+            raise ConfigError()
+
+        keys = [fragment.cache_key for _, fragment in fragments]
+        if keys and all(keys):
+            self.cache_key = hashlib.sha256(
+                "".join(keys).encode("utf-8")
+            ).hexdigest()
+
+    def dump_cfg(self):
+        """The configuration, in a format that can be saved as JSON.
+
+        Used by ParsedConfigCache; see restore_cfg().
+        """
+        return self.cfg
+
+    def restore_cfg(self, data):
+        """Set the configuration from the output of dump_cfg()."""
+        self.cfg = data
+
+    def get_cache_variant(self):
+        """Anything, other than the file, the configuration depends on.
+
+        Returns:
+            str, or None; configurations loaded from the same file but
+            with different variants are cached separately.
+        """
+        return None
+
+    def merge_fragments(self, fragments):
+        """Build the configuration from the files of a directory.
+
+        Args:
+            fragments: list of (path, parser) tuples, one for each
+                file, already parsed and validated.
+        """
+        raise NotImplementedError()
+
     @staticmethod
     def validate(schema, cfg, path=""):
         errors = False
@@ -121,3 +245,266 @@ class ConfigParserBase(object):
         Contents of cfg dict is updated/normalized by validators.
         """
         raise NotImplementedError()
+
+class CompiledSchema(object):
+    """Validation plan of a schema, to validate many configurations
+
+    The schema is walked only once, when the plan is built: for every
+    level, the set of known statements, the validators and the nested
+    levels, with their error paths, are precomputed. Validating a
+    configuration gives the same results and error messages of
+    ConfigParserBase.validate(), which is still used for the levels
+    that are not dicts.
+    """
+
+    def __init__(self, schema, path=""):
+        self.schema = schema
+        self.path = path
+        self.props = frozenset(schema)
+
+        # (prop, validator, nested CompiledSchema), in the same order
+        # used by ConfigParserBase.validate().
+        self.items = []
+        for prop in schema:
+            if isinstance(schema[prop], ConfigParserValidator):
+                self.items.append((prop, schema[prop], None))
+            elif isinstance(schema[prop], dict):
+                self.items.append((prop, None, CompiledSchema(
+                    schema[prop],
+                    prop if path == "" else "{}.{}".format(path, prop)
+                )))
+            else:
+                raise NotImplementedError()
+
+    def validate(self, cfg):
+        if cfg is None:
+            return
+
+        if type(cfg) is not dict:
+            ConfigParserBase.validate(self.schema, cfg, self.path)
+            return
+
+        errors = False
+        props = self.props
+
+        for prop in cfg:
+            if prop not in props:
+                errors = True
+                logging.error(
+                    "Unknown statement at '{}' level: '{}'.".format(
+                        self.path, prop
+                    )
+                )
+
+        for prop, validator, nested in self.items:
+            if validator is not None:
+                try:
+                    cfg[prop] = validator.validate(cfg.get(prop))
+                except ConfigError as e:
+                    errors = True
+                    logging.error(
+                        "Error parsing '{}' at '{}' level - {}.".format(
+                            prop, self.path, str(e)
+                        )
+                    )
+            else:
+                nested_cfg = cfg.get(prop)
+                if nested_cfg is None:
+                    nested_cfg = cfg[prop] = {}
+                nested.validate(nested_cfg)
+
+        if errors:
+            raise ConfigError()
+
+class _WarningsRecorder(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self, level=logging.WARNING)
+        self.msgs = []
+
+    def emit(self, record):
+        if record.levelno == logging.WARNING:
+            self.msgs.append(record.getMessage())
+
+class ParsedConfigCache(object):
+    """Validated configurations, persisted in the cache directory
+
+    The configuration obtained by parsing and validating a file is saved
+    along with a key computed from the content of the file, the program
+    version and the keys of the configurations it depends on (the
+    clients' configuration depends on the general one, for example).
+    When the same file is loaded again and its key has not changed, YAML
+    parsing and validation are skipped; the warnings that were logged
+    while parsing it are logged again. If the modification time and the
+    size of the file are the same of when the entry was saved, the file
+    is not even read.
+
+    One entry is kept for each configuration parser, file and variant
+    (see ConfigParserBase.get_cache_variant()). Entries
+    are also kept in memory, so that builds that are run within the same
+    process (see MultiTargetBuilder) don't read them again; when the
+    cache is not persistent, entries are kept in memory only.
+
+    Entries are saved as JSON (see ConfigParserBase.dump_cfg()); the
+    order of the keys is kept when they are loaded, so that the
+    configuration is iterated in the same order of the one obtained by
+    parsing the file.
+    """
+
+    DIRNAME = "parsed_cfg"
+
+    def __init__(self, cache_dir, persistent=True):
+        self.dir = os.path.join(cache_dir, self.DIRNAME)
+        self.persistent = persistent
+        self.entries = {}
+
+    @staticmethod
+    def _get_deps_key(parser, deps=None):
+        """Part of the key that doesn't depend on the file content.
+
+        Returns:
+            None if any of the dependencies has not been loaded using
+            the cache, so that the configuration can't be cached.
+        """
+        hasher = hashlib.sha256()
+        hasher.update(__version__.encode("utf-8"))
+        hasher.update(parser.__class__.__name__.encode("utf-8"))
+        variant = parser.get_cache_variant()
+        if variant:
+            hasher.update(variant.encode("utf-8"))
+        for dep in deps or []:
+            if not dep.cache_key:
+                return None
+            hasher.update(dep.cache_key.encode("utf-8"))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _get_key(deps_key, doc):
+        hasher = hashlib.sha256()
+        hasher.update(deps_key.encode("utf-8"))
+        hasher.update(doc)
+        return hasher.hexdigest()
+
+    def _get_entry_path(self, parser, cfg_path):
+        path_hash = hashlib.sha256(
+            os.path.abspath(cfg_path).encode("utf-8")
+        ).hexdigest()[:16]
+        variant = parser.get_cache_variant()
+        if variant:
+            path_hash += "-" + hashlib.sha256(
+                variant.encode("utf-8")
+            ).hexdigest()[:16]
+        return os.path.join(
+            self.dir, "{}-{}.json".format(parser.__class__.__name__,
+                                          path_hash)
+        )
+
+    def _get(self, entry_path):
+        if entry_path in self.entries:
+            return self.entries[entry_path]
+        if not self.persistent or not os.path.isfile(entry_path):
+            return None
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+        except Exception as e:
+            logging.debug("Error while reading parsed configuration "
+                          "from {}: {}".format(entry_path, str(e)))
+            return None
+        touch_cache_entry(entry_path)
+        self.entries[entry_path] = entry
+        return entry
+
+    def _put(self, entry_path, entry):
+        self.entries[entry_path] = entry
+        if not self.persistent:
+            return
+        try:
+            if not os.path.isdir(self.dir):
+                os.makedirs(self.dir)
+            tmp_path = entry_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.rename(tmp_path, entry_path)
+        except Exception as e:
+            logging.warning("Error while saving parsed configuration "
+                            "to {}: {}".format(entry_path, str(e)))
+
+    def load(self, parser, cfg_path, deps=None):
+        """Load the configuration from the cache or from the file.
+
+        The file is parsed and validated (and the result saved in the
+        cache) only when a valid cache entry is not available.
+        """
+        if not os.path.isfile(cfg_path):
+            raise MissingFileError(cfg_path)
+
+        st = os.stat(cfg_path)
+        stat = [st.st_mtime, st.st_size]
+
+        deps_key = self._get_deps_key(parser, deps)
+        entry_path = self._get_entry_path(parser, cfg_path)
+
+        entry = self._get(entry_path) if deps_key else None
+        doc = None
+
+        if entry and entry.get("deps_key") == deps_key and \
+            entry.get("stat") == stat:
+            key = entry["key"]
+        else:
+            with open(cfg_path, "rb") as f:
+                doc = f.read()
+            key = self._get_key(deps_key, doc) if deps_key else None
+
+            if entry and entry.get("key") == key:
+                # Same content, but the file has been touched.
+                entry["stat"] = stat
+                self._put(entry_path, entry)
+            else:
+                entry = None
+
+        if entry:
+            logging.debug("Parsed configuration loaded from cache: "
+                          "{}".format(cfg_path))
+            for msg in entry["warnings"]:
+                logging.warning(msg)
+            parser.restore_cfg(_load_cfg_data(entry["cfg"]))
+            parser.cache_key = key
+            return
+
+        parser._load_from_yaml(doc)
+
+        recorder = _WarningsRecorder()
+        logging.getLogger().addHandler(recorder)
+        try:
+            parser._parse()
+        finally:
+            logging.getLogger().removeHandler(recorder)
+
+        if key:
+            data = json.dumps(parser.dump_cfg())
+
+            # The configuration used by this build is rebuilt from the
+            # same data that are saved in the cache, so that it's the
+            # same of the next builds (strings are decoded as unicode,
+            # for example).
+            parser.restore_cfg(_load_cfg_data(data))
+
+            self._put(entry_path, {
+                "key": key,
+                "deps_key": deps_key,
+                "stat": stat,
+                "cfg": data,
+                "warnings": recorder.msgs
+            })
+            parser.cache_key = key
+
+def _load_cfg_data(data):
+    return json.loads(data, object_pairs_hook=OrderedDict)
+
+PrefixListSafeDumper.add_representer(
+    OrderedDict, lambda dumper, data: dumper.represent_dict(data)
+)
+
+CacheDir.register_entries_dir(ParsedConfigCache.DIRNAME,
+                              "parsed configurations")
@@ -13,23 +13,276 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from copy import deepcopy
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
 import logging
+import threading
 
-from .base import ConfigParserBase
+from .base import ConfigParserBase, CompiledSchema
 from .validators import *
 from ..errors import ConfigError, ARouteServerError
+from ..prefix_list import PrefixListSafeDumper
+
+
+class ClientCfgView(MutableMapping):
+    """Configuration of a client, resolved when options are accessed
+
+    Options are looked up in three layers:
+
+    - changes made after the configuration has been parsed (by the
+      enrichers, for example), which are specific of the client;
+
+    - the client's own configuration, as it has been validated, with
+      only the options that are set; clients configured with more than
+      one IP address share it;
+
+    - the general configuration, from which the options of the
+      clients' schema that are not set are inherited.
+
+    Nested levels of the configuration are views too, so that the
+    defaults are shared among all the clients instead of being copied
+    into each one of them.
+
+    Views are changed by the enrichers' threads at the same time: the
+    creation of the nested views and of the client's own layers is
+    serialized, so that changes made to different options of the same
+    client are not lost.
+    """
+
+    # Shared by all the views, so that they can still be pickled.
+    _lock = threading.RLock()
+
+    __slots__ = ("_own", "_cfg", "_general", "_layout", "_parent", "_key",
+                 "_children")
+
+    def __init__(self, cfg, general, layout, parent=None, key=None,
+                 own=None):
+        self._own = own
+        self._cfg = cfg
+        self._general = general
+        self._layout = layout
+        self._parent = parent
+        self._key = key
+        self._children = {}
+
+    @staticmethod
+    def get_layout(schema):
+        """Keys of the schema: None for options, dicts for levels."""
+        res = {}
+        for k in schema:
+            if isinstance(schema[k], dict):
+                res[k] = ClientCfgView.get_layout(schema[k])
+            else:
+                res[k] = None
+        return res
+
+    @staticmethod
+    def compact(cfg):
+        """Remove the options that are not set from the client's own
+        configuration."""
+        for k in list(cfg.keys()):
+            if isinstance(cfg[k], dict):
+                ClientCfgView.compact(cfg[k])
+                if not cfg[k]:
+                    del cfg[k]
+            elif cfg[k] is None:
+                del cfg[k]
+
+    def set_general(self, general):
+        """Inherit the missing options from another general
+        configuration."""
+        self._general = general
+        self._children = {}
+
+    def _get_child(self, key):
+        child = self._children.get(key)
+        if child is not None:
+            return child
+
+        def get_level(layer):
+            if layer is None:
+                return None
+            res = layer.get(key)
+            return res if isinstance(res, Mapping) else None
+
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = ClientCfgView(get_level(self._cfg),
+                                      get_level(self._general),
+                                      self._layout[key], self, key,
+                                      get_level(self._own))
+                self._children[key] = child
+        return child
+
+    def __getitem__(self, key):
+        layout = self._layout
+        if layout.get(key) is not None:
+            return self._get_child(key)
+
+        if self._own is not None and key in self._own:
+            return self._own[key]
+
+        cfg = self._cfg
+        if cfg is not None and key in cfg:
+            if cfg[key] is not None:
+                return cfg[key]
+
+        if key in layout:
+            general = self._general
+            if general is not None and key in general:
+                return general[key]
+            return None
+
+        if cfg is not None and key in cfg:
+            return None
+
+        raise KeyError(key)
+
+    def _get_own(self):
+        if self._own is not None:
+            return self._own
+
+        with self._lock:
+            if self._own is None:
+                own = {}
+                if self._parent is not None:
+                    self._parent._get_own()[self._key] = own
+                self._own = own
+        return self._own
+
+    def __setitem__(self, key, value):
+        if self._layout.get(key) is not None:
+            # A whole level is set: its options are set one by one
+            # on top of the existing ones.
+            child = self._get_child(key)
+            for k in value:
+                child[k] = value[k]
+            return
+        self._get_own()[key] = value
+
+    def __delitem__(self, key):
+        if self._own is None or key not in self._own:
+            raise KeyError(key)
+        del self._own[key]
+
+    def __iter__(self):
+        seen = set()
+        for layer in (self._layout, self._own, self._cfg):
+            if layer is None:
+                continue
+            for k in layer:
+                if k not in seen:
+                    seen.add(k)
+                    yield k
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def to_dict(self):
+        res = {}
+        for k in self:
+            v = self[k]
+            if isinstance(v, ClientCfgView):
+                v = v.to_dict()
+            res[k] = v
+        return res
+
+    def __repr__(self):
+        return "ClientCfgView({!r})".format(self.to_dict())
+
+def client_cfg_view_representer(dumper, view):
+    return dumper.represent_dict(view.to_dict())
+
+PrefixListSafeDumper.add_representer(ClientCfgView,
+                                     client_cfg_view_representer)
 
 
 class ConfigParserClients(ConfigParserBase):
 
     ROOT = "clients"
 
+    FRAGMENTS_SUPPORTED = True
+
     def __init__(self, general_cfg=None):
         ConfigParserBase.__init__(self)
         self.general_cfg = general_cfg
 
+    def _new_fragment(self):
+        res = self.__class__(general_cfg=self.general_cfg)
+        res.fragment = True
+        return res
+
+    def load(self, cfg_path, parsed_cfg_cache=None, deps=None):
+        ConfigParserBase.load(self, cfg_path,
+                              parsed_cfg_cache=parsed_cfg_cache, deps=deps)
+
+        # The configuration may have been parsed using another general
+        # configuration: it only determines the options that clients
+        # inherit, so the same parsed configuration can be used by
+        # route servers with different general configurations.
+        general = self.general_cfg.cfg["cfg"] if self.general_cfg else None
+        for client in self.cfg["clients"]:
+            client["cfg"].set_general(general)
+
+    def dump_cfg(self):
+        # Only the clients' own configuration is saved, once for the
+        # clients that share it (those with more than one IP address);
+        # options are inherited from the general configuration the
+        # clients are loaded with.
+        res = dict(self.cfg)
+        res["clients"] = []
+        own_cfgs = []
+        own_cfgs_idx = {}
+        layout = None
+        for client in self.cfg["clients"]:
+            view = client["cfg"]
+            layout = view._layout
+            if id(view._cfg) not in own_cfgs_idx:
+                own_cfgs_idx[id(view._cfg)] = len(own_cfgs)
+                own_cfgs.append(view._cfg)
+            client = dict(client)
+            client["cfg"] = own_cfgs_idx[id(view._cfg)]
+            res["clients"].append(client)
+        return {"cfg": res, "own_cfgs": own_cfgs, "layout": layout}
+
+    def restore_cfg(self, data):
+        self.cfg = data["cfg"]
+        general = self.general_cfg.cfg["cfg"] if self.general_cfg else None
+        for client in self.cfg["clients"]:
+            client["cfg"] = ClientCfgView(data["own_cfgs"][client["cfg"]],
+                                          general, data["layout"])
+
+    def merge_fragments(self, fragments):
+        self.cfg = {"clients": []}
+
+        errors = False
+
+        # Duplicate IP addresses among different files.
+        ip_to_path = {}
+        for path, fragment in fragments:
+            for client in fragment.cfg["clients"]:
+                ip = client["ip"]
+                if ip in ip_to_path:
+                    logging.error(
+                        "Duplicate IP address found: {}, "
+                        "in {} and {}.".format(ip, ip_to_path[ip], path)
+                    )
+                    errors = True
+                else:
+                    ip_to_path[ip] = path
+                self.cfg["clients"].append(client)
+
+        if errors:
+            raise ConfigError()
+
     def parse(self):
+        if self.fragment and "clients" not in self.cfg:
+            # Files of a configuration directory may contain only
+            # the 'asns' section.
+            self.cfg["clients"] = []
         if "clients" not in self.cfg:
             raise ConfigError("Missing top 'clients' statement.")
         if "asns" in self.cfg:
@@ -86,18 +339,26 @@ class ConfigParserClients(ConfigParserBase):
         }
 
         # Split configurations with more than one IP address into
-        # multiple clients
+        # multiple clients; their 'cfg' is shared.
         for client in self.cfg["clients"]:
             if "ip" in client:
                 if isinstance(client["ip"], list):
                     for ip in client["ip"]:
-                        client_clone = deepcopy(client)
+                        client_clone = dict(client)
                         client_clone["ip"] = ip
                         self.cfg["clients"].append(client_clone)
                     client["to_be_removed"] = True
         self.cfg["clients"] = [c for c in self.cfg["clients"] if "to_be_removed" not in c]
 
         # Clients' config validation
+        compiled_schema = CompiledSchema(schema, "clients")
+
+        # Used for clients whose 'cfg' has already been validated.
+        top_level_schema = CompiledSchema(
+            dict((k, schema[k]) for k in schema if k != "cfg"), "clients"
+        )
+        validated_cfg_ids = set()
+
         for client in self.cfg["clients"]:
             client_descr = ""
             if "asn" in client:
@@ -108,7 +369,15 @@ class ConfigParserClients(ConfigParserBase):
                 client_descr = "unknown client"
 
             try:
-                ConfigParserBase.validate(schema, client, "clients")
+                if id(client.get("cfg")) in validated_cfg_ids:
+                    cfg = client.pop("cfg")
+                    try:
+                        top_level_schema.validate(client)
+                    finally:
+                        client["cfg"] = cfg
+                else:
+                    compiled_schema.validate(client)
+                    validated_cfg_ids.add(id(client["cfg"]))
             except ARouteServerError as e:
                 err_msg = ("One or more errors occurred while processing "
                            "the client configuration for "
@@ -118,23 +387,23 @@ class ConfigParserClients(ConfigParserBase):
                 logging.error(err_msg)
                 raise ConfigError()
 
-        def inherit_from_general_cfg(dest, src, schema):
-            for k in schema:
-                if isinstance(schema[k], dict):
-                    if k in src:
-                        inherit_from_general_cfg(dest[k], src[k], schema[k])
-                else:
-                    if k not in dest or dest[k] is None:
-                        if k in src:
-                            dest[k] = src[k]
-
-        # Inherit missing options from the general configuration.
-        if self.general_cfg:
-            for client in self.cfg["clients"]:
-                inherit_from_general_cfg(client["cfg"], self.general_cfg, schema["cfg"])
+        # Missing options are inherited from the general configuration
+        # when they are accessed.
+        layout = ClientCfgView.get_layout(schema["cfg"])
+        general = self.general_cfg.cfg["cfg"] if self.general_cfg else None
+        compacted_cfg_ids = set()
+        for client in self.cfg["clients"]:
+            cfg = client["cfg"]
+            if isinstance(cfg, ClientCfgView):
+                # Already parsed.
+                continue
+            if id(cfg) not in compacted_cfg_ids:
+                ClientCfgView.compact(cfg)
+                compacted_cfg_ids.add(id(cfg))
+            client["cfg"] = ClientCfgView(cfg, general, layout)
 
         # Duplicate IP addresses?
-        unique_ip = []
+        unique_ip = set()
         for client in self.cfg["clients"]:
             ip = client["ip"]
             if ip in unique_ip:
@@ -143,7 +412,7 @@ class ConfigParserClients(ConfigParserBase):
                 )
                 errors = True
             else:
-                unique_ip.append(ip)
+                unique_ip.add(ip)
 
         if errors:
             raise ConfigError()
@@ -13,6 +13,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from copy import deepcopy
+import json
 import logging
 
 from .base import ConfigParserBase
@@ -56,6 +58,37 @@ class ConfigParserGeneral(ConfigParserBase):
         "add_noadvertise_to_peer": { "type": "inbound", "peer_as": True },
     }
 
+    def __init__(self, overrides=None):
+        ConfigParserBase.__init__(self)
+
+        # Options that override those of the 'cfg' section of the
+        # file; nested levels are merged.
+        self.overrides = overrides
+
+    @staticmethod
+    def _merge(dst, src):
+        for k in src:
+            if isinstance(src[k], dict) and isinstance(dst.get(k), dict):
+                ConfigParserGeneral._merge(dst[k], src[k])
+            else:
+                dst[k] = deepcopy(src[k])
+
+    def _load_from_yaml(self, doc):
+        ConfigParserBase._load_from_yaml(self, doc)
+
+        if not self.overrides:
+            return
+        if not isinstance(self.cfg, dict) or \
+            not isinstance(self.cfg.get("cfg"), dict):
+            # Missing 'cfg' section: reported by parse().
+            return
+        self._merge(self.cfg["cfg"], self.overrides)
+
+    def get_cache_variant(self):
+        if not self.overrides:
+            return None
+        return json.dumps(self.overrides, sort_keys=True)
+
     def parse(self):
         """
         Contents of cfg dict is updated/normalized by validators.
@@ -0,0 +1,59 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class ConfigIndex(object):
+    """Lookup tables for clients and AS-SETs
+
+    Built once, after the clients configuration has been parsed and
+    clients' IDs have been set, so that the builder, the enrichers and
+    the templates can look up clients and AS-SETs without scanning the
+    whole lists.
+
+    Attributes:
+        clients_by_ip: dict, <ip>: client.
+
+        clients_by_id: dict, <id>: client.
+
+        clients_by_asn: dict, <asn> (int): list of clients, in the
+            same order of the clients configuration.
+
+        as_sets_by_name: dict, <name>: AS-SET; populated by the IRRDB
+            enrichers, using add_as_set().
+    """
+
+    def __init__(self, clients):
+        self.clients_by_ip = {}
+        self.clients_by_id = {}
+        self.clients_by_asn = {}
+
+        for client in clients:
+            self.clients_by_ip[client["ip"]] = client
+            self.clients_by_id[client["id"]] = client
+            self.clients_by_asn.setdefault(client["asn"], []).append(client)
+
+        self.as_sets_by_name = {}
+
+    def get_clients_by_asn(self, asn):
+        return self.clients_by_asn.get(asn, [])
+
+    def add_as_set(self, as_set):
+        self.as_sets_by_name[as_set["name"]] = as_set
+
+    def remove_as_set(self, as_set):
+        del self.as_sets_by_name[as_set["name"]]
+
+    def get_as_set_by_name(self, name):
+        return self.as_sets_by_name.get(name)
@@ -0,0 +1,156 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+from .base import ConfigParserBase
+from .validators import ValidatorText, ValidatorOption, ValidatorListOf
+from ..errors import ConfigError, ARouteServerError
+
+
+# Configurations that can be built by the 'build-all' command.
+SPEAKERS = ("bird", "openbgpd", "html", "template-context")
+
+def parse_target(s):
+    """Parse a target in the SPEAKER[:IP_VER]=OUTPUT_FILE format.
+
+    Returns:
+        tuple, (speaker, ip_ver, output_file); ip_ver is None when
+        it's not given.
+    """
+    if "=" not in s:
+        raise ConfigError(
+            "Invalid target '{}': it must be in the "
+            "SPEAKER[:IP_VER]=OUTPUT_FILE format".format(s)
+        )
+    speaker, output_file = s.split("=", 1)
+    ip_ver = None
+    if ":" in speaker:
+        speaker, ip_ver = speaker.split(":", 1)
+        if ip_ver not in ("4", "6"):
+            raise ConfigError(
+                "Invalid IP version for target '{}': it must be "
+                "4 or 6".format(s)
+            )
+        ip_ver = int(ip_ver)
+    if speaker not in SPEAKERS:
+        raise ConfigError(
+            "Invalid speaker for target '{}': it must be one "
+            "of {}".format(s, ", ".join(SPEAKERS))
+        )
+    if not output_file:
+        raise ConfigError(
+            "Missing output file for target '{}'".format(s)
+        )
+    return (speaker, ip_ver, output_file)
+
+class ConfigParserProfiles(ConfigParserBase):
+    """Route server profiles built by the 'build-all' command
+
+    Each profile is a route server (or a BGP speaker of it) built from
+    the same clients configuration: it has its own general
+    configuration, or overrides for some of its options, templates
+    and IP version, and a list of targets. Relative paths are rooted
+    at the directory of the profiles file.
+    """
+
+    ROOT = "profiles"
+
+    def __init__(self):
+        ConfigParserBase.__init__(self)
+        self.base_dir = None
+
+    def load(self, cfg_path, parsed_cfg_cache=None, deps=None):
+        self.base_dir = os.path.dirname(os.path.abspath(cfg_path))
+        ConfigParserBase.load(self, cfg_path, deps=deps)
+
+    def _get_path(self, path):
+        if path is None or os.path.isabs(path) or not self.base_dir:
+            return path
+        return os.path.join(self.base_dir, path)
+
+    def parse(self):
+        """
+        Contents of cfg dict is updated/normalized by validators.
+        """
+
+        if not isinstance(self.cfg, dict) or "profiles" not in self.cfg:
+            raise ConfigError("Missing 'profiles' top element.")
+
+        if not isinstance(self.cfg["profiles"], list) or \
+            not self.cfg["profiles"]:
+            raise ConfigError("The 'profiles' element must be a "
+                              "non-empty list.")
+
+        schema = {
+            "name": ValidatorText(),
+            "general": ValidatorText(mandatory=False),
+            "templates_dir": ValidatorText(mandatory=False),
+            "template_name": ValidatorText(mandatory=False),
+            "ip_ver": ValidatorOption("ip_ver", (4, 6), mandatory=False),
+            "targets": ValidatorListOf(ValidatorText),
+        }
+
+        errors = False
+        names = set()
+
+        for profile in self.cfg["profiles"]:
+            try:
+                if not isinstance(profile, dict):
+                    raise ConfigError("Invalid format: must be a dict")
+
+                # Validated by the general configuration parser, once
+                # merged into the general configuration.
+                overrides = profile.pop("general_overrides", None)
+                if overrides is not None and \
+                    not isinstance(overrides, dict):
+                    raise ConfigError("Invalid format for "
+                                      "'general_overrides': must be a dict")
+
+                self.validate(schema, profile)
+                profile["general_overrides"] = overrides
+
+                if profile["name"] in names:
+                    raise ConfigError("Duplicate profile name: "
+                                      "{}".format(profile["name"]))
+                names.add(profile["name"])
+
+                profile["general"] = self._get_path(profile["general"])
+                profile["templates_dir"] = self._get_path(
+                    profile["templates_dir"])
+
+                targets = []
+                for target in profile["targets"]:
+                    speaker, ip_ver, output_file = parse_target(target)
+                    targets.append({
+                        "speaker": speaker,
+                        "ip_ver": ip_ver or profile["ip_ver"],
+                        "output_file": self._get_path(output_file)
+                    })
+                profile["targets"] = targets
+            except ARouteServerError as e:
+                err_msg = ("One or more errors occurred while processing "
+                           "the profile '{}'".format(
+                               profile.get("name", "unknown")
+                               if isinstance(profile, dict) else profile
+                           ))
+                if str(e):
+                    err_msg += ": " + str(e)
+                logging.error(err_msg)
+                errors = True
+
+        if errors:
+            raise ConfigError()
@@ -55,6 +55,28 @@ class ConfigParserProgram(object):
         "bgpq3_sources": IRRDBTools.BGPQ3_DEFAULT_SOURCES,
 
         "threads": 4,
+        "adaptive_concurrency": True,
+        "min_threads": 1,
+        "max_threads": 16,
+
+        "enrichers_engine": "threads",
+        "irrdb_async_concurrency": 32,
+
+        "irrdb_timeout": 600,
+        "peeringdb_timeout": 30,
+        "enrichment_deadline": None,
+
+        "fetch_retries": 2,
+        "circuit_breaker_threshold": 5,
+        "circuit_breaker_reset": 60,
+
+        "parsing_processes": None,
+        "parsing_min_prefixes": 1000,
+        "prune_irrdb_prefixes": False,
+        "aggregate_prefix_lists": False,
+        "cache_parsed_cfg": False,
+        "incremental_build": False,
+        "cache_compiled_templates": False,
     }
 
     PATH_KEYS = ("logging_config_file", "cfg_general", "cfg_clients",
@@ -278,6 +300,13 @@ class ConfigParserProgram(object):
 
         return True
 
+    @staticmethod
+    def get_fingerprint(buf):
+        """Fingerprint of the content of a template file."""
+        hasher = hashlib.sha512()
+        hasher.update(buf)
+        return hasher.hexdigest()
+
     @staticmethod
     def calculate_fingerprints(d):
 
@@ -291,10 +320,8 @@ class ConfigParserProgram(object):
                     iterate_dir(path, dic[filename])
                 else:
                     with open(path, "rb") as f:
-                        hasher = hashlib.sha512()
-                        buf = f.read()
-                        hasher.update(buf)
-                        dic[filename] = hasher.hexdigest()
+                        dic[filename] = \
+                            ConfigParserProgram.get_fingerprint(f.read())
 
         res = {}
         iterate_dir(d, res)
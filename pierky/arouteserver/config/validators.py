@@ -14,6 +14,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import ipaddr
+import socket
+import struct
 import yaml
 
 
@@ -193,9 +195,9 @@ class ValidatorListOf(ConfigParserValidator):
         if not isinstance(l, list):
             raise ConfigError("Invalid format: must be a list")
 
+        validator = self.cls()
         for v in l:
-            validator = self.cls()
-            v = validator.validate(v)
+            validator.validate(v)
 
         return l
 
@@ -301,6 +303,148 @@ class ValidatorPrefixListEntry(ConfigParserValidator):
         return v
 
 
+class ValidatorPrefixListEntries(ConfigParserValidator):
+    """Bulk validation of a list of prefix list entries
+
+    Entries are validated in place and the output is the same of
+    ValidatorPrefixListEntry; it is meant to be used for large lists,
+    like IRRDB expansions.
+
+    Entries in the common format (addresses in their usual textual
+    notation, integer lengths, boolean 'exact', integer 'ge' and 'le')
+    are validated by packing their addresses with inet_pton and using
+    only integer comparisons. Any other entry, included the invalid
+    ones, is handed to ValidatorPrefixListEntry, so that results and
+    error messages are the same.
+    """
+
+    PROPS = frozenset(("prefix", "length", "comment", "exact", "ge", "le",
+                       "max_length"))
+
+    @staticmethod
+    def _compress_hextets(hextets):
+        # Same as ipaddr.IPv6Address: the longest run of two or more
+        # zeros (the first one, if many) is replaced by '::'.
+        best_start = -1
+        best_len = 0
+        start = -1
+        run_len = 0
+        for idx, hextet in enumerate(hextets):
+            if hextet == 0:
+                if start == -1:
+                    start = idx
+                run_len += 1
+                if run_len > best_len:
+                    best_len = run_len
+                    best_start = start
+            else:
+                start = -1
+                run_len = 0
+
+        hextets = ["%x" % hextet for hextet in hextets]
+        if best_len > 1:
+            end = best_start + best_len
+            if end == 8:
+                hextets.append("")
+            hextets[best_start:end] = [""]
+            if best_start == 0:
+                hextets.insert(0, "")
+        return ":".join(hextets)
+
+    def _validate_entries(self, l):
+        # Fast path: returns the entries that must be handed to
+        # ValidatorPrefixListEntry.
+        props = self.PROPS
+        inet_pton = socket.inet_pton
+        inet_ntop = socket.inet_ntop
+        AF_INET = socket.AF_INET
+        AF_INET6 = socket.AF_INET6
+        unpack = struct.unpack
+        compress_hextets = self._compress_hextets
+
+        others = []
+        for v in l:
+            if type(v) is not dict or not props.issuperset(v):
+                others.append(v)
+                continue
+
+            # inet_pton only accepts the plain textual notations, that
+            # are also accepted by ipaddr.IPAddress.
+            try:
+                ip = str(v["prefix"])
+                if ":" in ip:
+                    packed = inet_pton(AF_INET6, ip)
+                    # inet_ntop uses the same compression of ipaddr,
+                    # but IPv4-mapped addresses are in dotted notation.
+                    prefix = inet_ntop(AF_INET6, packed)
+                    if "." in prefix:
+                        prefix = compress_hextets(unpack("!8H", packed))
+                    max_length = 128
+                else:
+                    inet_pton(AF_INET, ip)
+                    prefix = ip
+                    max_length = 32
+            except Exception:
+                others.append(v)
+                continue
+
+            pref_len = v.get("length")
+            if type(pref_len) is not int or not 0 <= pref_len <= max_length:
+                others.append(v)
+                continue
+
+            exact = v.get("exact", False)
+            if type(exact) is not bool:
+                others.append(v)
+                continue
+
+            ge = v.get("ge") or None
+            le = v.get("le") or None
+            if ge is not None:
+                if type(ge) is not int or not pref_len <= ge <= max_length:
+                    others.append(v)
+                    continue
+            if le is not None:
+                if type(le) is not int or not pref_len <= le <= max_length:
+                    others.append(v)
+                    continue
+                if ge is not None and ge > le:
+                    others.append(v)
+                    continue
+            if exact and (ge or le):
+                others.append(v)
+                continue
+
+            comment = v.get("comment", None)
+            if comment is not None or "comment" in v:
+                try:
+                    comment = str(comment)
+                except Exception:
+                    others.append(v)
+                    continue
+
+            v["prefix"] = prefix
+            v["length"] = pref_len
+            v["comment"] = comment
+            v["max_length"] = max_length
+            v["exact"] = exact
+            v["ge"] = ge
+            v["le"] = le
+
+        return others
+
+    def _validate(self, l):
+        if not isinstance(l, list):
+            raise ConfigError("Invalid format: must be a list")
+
+        others = self._validate_entries(l)
+        if others:
+            validator = ValidatorPrefixListEntry()
+            for v in others:
+                validator.validate(v)
+
+        return l
+
 class ValidatorBool(ConfigParserValidator):
 
     def _validate(self, v):
@@ -17,25 +17,72 @@ import logging
 from Queue import Queue, Empty, Full
 import threading
 
+from ..cached_objects import CachedObject
 from ..errors import BuilderError, ARouteServerError
 
 class BaseConfigEnricherThread(threading.Thread):
 
     DESCR = None
 
-    def __init__(self, tasks_q, errors_q, lock):
+    def __init__(self, tasks_q, errors_q, lock, slots=None):
         threading.Thread.__init__(self)
 
         self.tasks_q = tasks_q
         self.errors_q = errors_q
         self.lock = lock
 
+        # ConcurrencyLimiter shared among all the threads that use the
+        # same external source: it limits the number of concurrent
+        # requests.
+        self.slots = slots
+
+        # EnrichmentResults shared with the other builds.
+        self.enrichment_results = None
+
     def do_task(self, task):
         raise NotImplementedError()
 
     def save_data(self, task, data):
         raise NotImplementedError()
 
+    def get_object_data(self, key, fp, get_object, attr):
+        """Data of a CachedObject, or those already acquired by another
+        build.
+
+        Args:
+            key, fp: the task and the fingerprint of its input; see
+                EnrichmentResults.get().
+
+            get_object: function that returns the CachedObject.
+
+            attr (str): the object's attribute which holds the data.
+        """
+        if not self.enrichment_results:
+            return getattr(get_object(), attr)
+
+        entry = self.enrichment_results.get(key, fp)
+        if entry:
+            return entry["data"]
+
+        obj = get_object()
+        data = getattr(obj, attr)
+        self.enrichment_results.set(key, fp, data, [obj])
+        return data
+
+    def _do_task_with_slot(self, task):
+        fetches = CachedObject.get_thread_fetches()
+        started = self.slots.acquire()
+        succeeded = False
+        try:
+            data = self.do_task(task)
+            succeeded = True
+            return data
+        finally:
+            self.slots.release(
+                started, succeeded,
+                external=CachedObject.get_thread_fetches() > fetches
+            )
+
     def run(self):
         logging.debug("{} thread {} started".format(self.DESCR, self.name))
 
@@ -46,7 +93,10 @@ class BaseConfigEnricherThread(threading.Thread):
                 break
 
             try:
-                data = self.do_task(task)
+                if self.slots:
+                    data = self._do_task_with_slot(task)
+                else:
+                    data = self.do_task(task)
                 if data:
                     with self.lock:
                         self.save_data(task, data)
@@ -68,30 +118,53 @@ class BaseConfigEnricher(object):
 
     WORKER_THREAD_CLASS = None
 
-    def __init__(self, builder, threads):
+    # Data needed by the enricher and data produced by it: they are used
+    # by ConfigEnrichersScheduler to decide which enrichers can run
+    # concurrently.
+    REQUIRES = ()
+    PROVIDES = ()
+
+    # External source used by the enricher: enrichers that share the
+    # same source also share the limit of concurrent requests.
+    SOURCE = None
+
+    def __init__(self, builder, threads, slots=None):
         self.builder = builder
         self.threads = threads
+        self.slots = slots
         self.tasks_q = Queue()
         self.errors_q = Queue(maxsize=1)
 
     def prepare(self):
         pass
 
-    def _config_thread(self, thread):
+    def prefetch(self):
+        """Acquire external data before worker threads are started.
+
+        Enrichers may use this to acquire the data needed by their tasks
+        in a more efficient way (for example, concurrently on a single
+        thread) and to save them into the cache, so that do_task() only
+        has to load them from there.
+        """
         pass
 
+    def _config_thread(self, thread):
+        thread.enrichment_results = self.builder.enrichment_results
+
     def add_tasks(self):
         raise NotImplementedError()
 
     def enrich(self):
         self.prepare()
 
+        self.prefetch()
+
         lock = threading.Lock()
 
         threads = []
         for i in range(self.threads):
             t = self.WORKER_THREAD_CLASS(
-                self.tasks_q, self.errors_q, lock
+                self.tasks_q, self.errors_q, lock, self.slots
             )
             self._config_thread(t)
             threads.append(t)
@@ -0,0 +1,184 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+
+
+class ConcurrencyLimiter(object):
+    """Limit the number of concurrent requests to an external source
+
+    The limit is tuned AIMD-style on the basis of the outcome of the
+    requests:
+
+    - every request that succeeds without a latency degradation increases
+      the limit additively, by one unit every ``limit`` requests;
+
+    - a failure, or a latency higher than ``LATENCY_TOLERANCE`` times the
+      best one observed so far, halves the limit.
+
+    The limit is always kept within ``min_limit`` and ``max_limit``; when
+    ``adaptive`` is False it never changes from the initial value.
+
+    Requests that are served from the cache don't tell anything about the
+    external source, so their latency is not taken into account.
+    """
+
+    LATENCY_TOLERANCE = 2.0
+    DECREASE_FACTOR = 0.5
+
+    # Weight of the last sample in the moving average of latency.
+    EWMA_ALPHA = 0.3
+
+    # How fast the best latency follows a permanent degradation.
+    BASELINE_DRIFT = 0.01
+
+    def __init__(self, name, initial, min_limit=1, max_limit=None,
+                 adaptive=True):
+        self.name = name
+        self.adaptive = adaptive
+
+        if not adaptive or max_limit is None:
+            max_limit = initial
+        if not adaptive:
+            min_limit = initial
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.max_limit = max(self.min_limit, max_limit)
+
+        self.limit = float(
+            max(self.min_limit, min(initial, self.max_limit))
+        )
+
+        self.cond = threading.Condition()
+        self.in_flight = 0
+
+        self.latency = None
+        self.baseline = None
+        self.last_decrease = 0
+
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.limit_samples = []
+
+    def get_limit(self):
+        return int(self.limit)
+
+    def acquire(self):
+        """Wait for a free slot.
+
+        Returns:
+            the time the request started at, to be passed to release().
+        """
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            return time.time()
+
+    def _set_limit(self, limit, reason):
+        limit = max(self.min_limit, min(limit, self.max_limit))
+        if int(limit) != int(self.limit):
+            logging.debug("Concurrency for {}: {} -> {} ({})".format(
+                self.name, int(self.limit), int(limit), reason))
+        self.limit = limit
+
+    def release(self, started, succeeded=True, external=True):
+        """Free the slot and update the limit.
+
+        Args:
+            started: value returned by acquire().
+
+            succeeded (bool): the request completed without errors.
+
+            external (bool): the external source has been contacted
+                (that is, data have not been served from the cache).
+        """
+        now = time.time()
+        elapsed = now - started
+
+        with self.cond:
+            self.in_flight -= 1
+            self.requests += 1
+            if not succeeded:
+                self.errors += 1
+
+            # Requests started before the last decrease were already
+            # running with the old limit: they must not decrease it again.
+            can_decrease = started >= self.last_decrease
+
+            if not self.adaptive:
+                pass
+            elif not succeeded:
+                if can_decrease:
+                    self._set_limit(self.limit * self.DECREASE_FACTOR,
+                                    "errors")
+                    self.last_decrease = now
+            elif external:
+                if self.latency is None:
+                    self.latency = elapsed
+                else:
+                    self.latency += self.EWMA_ALPHA * \
+                        (elapsed - self.latency)
+
+                if self.baseline is None or self.latency < self.baseline:
+                    self.baseline = self.latency
+                else:
+                    self.baseline += self.BASELINE_DRIFT * \
+                        (self.latency - self.baseline)
+
+                if self.latency > self.baseline * self.LATENCY_TOLERANCE:
+                    if can_decrease:
+                        self._set_limit(self.limit * self.DECREASE_FACTOR,
+                                        "latency {:.2f}s".format(
+                                            self.latency))
+                        self.last_decrease = now
+                else:
+                    self._set_limit(self.limit + 1.0 / int(self.limit),
+                                    "latency {:.2f}s".format(self.latency))
+
+            self.limit_samples.append(int(self.limit))
+
+            self.cond.notify_all()
+
+    def get_stats(self):
+        with self.cond:
+            elapsed = time.time() - self.start_time
+            samples = self.limit_samples
+            return {
+                "limit": int(self.limit),
+                "avg_limit": float(sum(samples)) / len(samples)
+                             if samples else float(int(self.limit)),
+                "requests": self.requests,
+                "errors": self.errors,
+                "latency": self.latency,
+                "throughput": self.requests / elapsed if elapsed else 0,
+            }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        msg = ("Concurrency for {}: {} (min {}, max {}, average {:.1f}); "
+               "{} requests, {} errors, {:.1f} requests/s{}").format(
+            self.name, stats["limit"], self.min_limit, self.max_limit,
+            stats["avg_limit"], stats["requests"], stats["errors"],
+            stats["throughput"],
+            ", latency {:.2f}s".format(stats["latency"])
+            if stats["latency"] is not None else ""
+        )
+        if self.adaptive:
+            logging.info(msg)
+        else:
+            logging.debug(msg)
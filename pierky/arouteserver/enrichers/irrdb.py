@@ -16,8 +16,11 @@
 import ipaddr
 import logging
 import re
+import threading
 
 from .base import BaseConfigEnricher, BaseConfigEnricherThread
+from ..build_state import get_fingerprint
+from ..cached_objects import FetchDurations
 from ..errors import BuilderError, ARouteServerError
 from ..irrdb import ASSet, RSet, IRRDBTools
 
@@ -32,6 +35,13 @@ class IRRDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
         self.ip_ver = None
         self.irrdbtools_cfg = None
 
+    def _get_result_fingerprint(self):
+        # Input of the tasks, other than the AS-SET name.
+        return get_fingerprint([
+            self.irrdbtools_cfg["bgpq3_host"],
+            self.irrdbtools_cfg["bgpq3_sources"]
+        ])
+
     def do_task(self, task):
         _, dest_descr, as_set_name = task
         data = self._get_external_data(dest_descr, as_set_name)
@@ -39,8 +49,9 @@ class IRRDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
 
     def save_data(self, task, data):
         as_set, _, _ = task
+        known = set(as_set[self.TARGET_FIELD])
         as_set[self.TARGET_FIELD].extend(
-            [_ for _ in data if _ not in as_set[self.TARGET_FIELD]]
+            [_ for _ in data if _ not in known]
         )
 
 class IRRDBConfigEnricher_WorkerThread_Prefixes(IRRDBConfigEnricher_WorkerThread):
@@ -54,8 +65,13 @@ class IRRDBConfigEnricher_WorkerThread_Prefixes(IRRDBConfigEnricher_WorkerThread
         res = []
         for ip_ver in ip_versions:
             try:
-                prefixes = RSet(as_set_name, ip_ver,
-                                **self.irrdbtools_cfg).prefixes
+                prefixes = self.get_object_data(
+                    ("r_set", as_set_name, ip_ver),
+                    self._get_result_fingerprint(),
+                    lambda: RSet(as_set_name, ip_ver,
+                                 **self.irrdbtools_cfg),
+                    "prefixes"
+                )
                 if not prefixes:
                     logging.warning("No IPv{} prefixes found in "
                                     "{} for {}".format(
@@ -83,7 +99,12 @@ class IRRDBConfigEnricher_WorkerThread_OriginASNs(IRRDBConfigEnricher_WorkerThre
     def _get_external_data(self, dest_descr, as_set_name):
         errors = False
         try:
-            asns = ASSet(as_set_name, **self.irrdbtools_cfg).asns
+            asns = self.get_object_data(
+                ("as_set", as_set_name),
+                self._get_result_fingerprint(),
+                lambda: ASSet(as_set_name, **self.irrdbtools_cfg),
+                "asns"
+            )
             if not asns:
                 logging.warning("No origin ASNs found in "
                                 "{} for {}".format(
@@ -104,40 +125,47 @@ class IRRDBConfigEnricher(BaseConfigEnricher):
 
     WORKER_THREAD_CLASS = None
 
+    REQUIRES = ("cfg_general", "cfg_clients", "cfg_asns")
+    SOURCE = "irrdb"
+
+    # builder.as_sets is shared among IRRDB enrichers that may run
+    # concurrently: only the first one populates it.
+    PREPARE_LOCK = threading.Lock()
+
     def prepare(self):
+        with self.PREPARE_LOCK:
+            self._prepare()
+
+    def _prepare(self):
         if self.builder.as_sets is not None:
             return
 
         as_sets = []
         errors = False
 
+        index = self.builder.index
+
         def normalize_as_set_id(s):
             return re.sub("[^a-zA-Z0-9_]", "_", s)
 
-        def get_as_set_by_name(name, used_by_client=None):
-            for as_set in as_sets:
-                if as_set["name"] == name:
-                    if used_by_client:
-                        as_set["used_by"].append(used_by_client)
-                    return as_set
-            return None
-
         def use_as_set(as_set_name, used_by_client=None):
             # Returns: id of the added/existing as_set
-            existing = get_as_set_by_name(as_set_name)
+            existing = index.get_as_set_by_name(as_set_name)
             if existing:
                 if used_by_client:
                     existing["used_by"].append(used_by_client)
                 return existing["id"]
 
             new_as_set_id = normalize_as_set_id(as_set_name)
-            as_sets.append({
+            as_set = {
                 "id": new_as_set_id,
                 "name": as_set_name,
                 "asns": [],
                 "prefixes": [],
                 "used_by": [used_by_client] if used_by_client else []
-            })
+            }
+            as_sets.append(as_set)
+            index.add_as_set(as_set)
             return new_as_set_id
 
         # Add to as_sets all the AS-SETs reported in the 'asns' section.
@@ -208,25 +236,97 @@ class IRRDBConfigEnricher(BaseConfigEnricher):
             if not as_set["used_by"]:
                 logging.debug("Removing unreferenced AS-SET: "
                               "{}".format(as_set["name"]))
+                index.remove_as_set(as_set)
         as_sets = [as_set for as_set in as_sets if as_set["used_by"]]
 
         self.builder.as_sets = {}
         for as_set in as_sets:
             self.builder.as_sets[as_set["id"]] = as_set
 
-    def _config_thread(self, thread):
-        thread.ip_ver = self.builder.ip_ver
-        thread.irrdbtools_cfg = {
+    def _get_irrdbtools_cfg(self):
+        return {
             "bgpq3_path": self.builder.bgpq3_path,
             "bgpq3_host": self.builder.bgpq3_host,
             "bgpq3_sources": self.builder.bgpq3_sources,
             "cache_dir": self.builder.cache_dir,
             "cache_expiry": self.builder.cache_expiry,
+            "fetch_timeout": self.builder.irrdb_timeout,
+            "deadline": self.builder.fetch_deadline,
+            "retries": self.builder.fetch_retries,
+            "circuit_breaker": self.builder.circuit_breakers.get(self.SOURCE),
+            "parsing_pool": self.builder.parsing_pool,
         }
 
+    def _config_thread(self, thread):
+        BaseConfigEnricher._config_thread(self, thread)
+        thread.ip_ver = self.builder.ip_ver
+        thread.irrdbtools_cfg = self._get_irrdbtools_cfg()
+
+    def _get_as_set_objects(self, as_set_name, irrdbtools_cfg):
+        # IRRDBTools objects needed to expand the AS-SET.
+        raise NotImplementedError()
+
+    def _get_deferred_irrdbtools_cfg(self):
+        irrdbtools_cfg = self._get_irrdbtools_cfg()
+        irrdbtools_cfg["defer_load"] = True
+        return irrdbtools_cfg
+
+    def prefetch(self):
+        if self.builder.enrichers_engine != "async":
+            return
+
+        irrdbtools_cfg = self._get_deferred_irrdbtools_cfg()
+
+        # Same order of the tasks, so that the most expensive objects
+        # are acquired first.
+        objects = []
+        for as_set in self._get_as_sets_by_cost(irrdbtools_cfg):
+            objects.extend(
+                self._get_as_set_objects(as_set["name"], irrdbtools_cfg)
+            )
+
+        IRRDBTools.prefetch(objects, self.builder.irrdb_async_concurrency,
+                            timeout=self.builder.irrdb_timeout,
+                            deadline=self.builder.fetch_deadline)
+
+    def _get_task_cost(self, as_set_name, irrdbtools_cfg, durations):
+        # Tasks that need to acquire data from the IRRDBs are more
+        # expensive than those whose data are in the cache: among the
+        # former, the cost is the time needed the last time the same
+        # objects were acquired (unknown = most expensive); among the
+        # latter, it's the size of the cached expansion.
+        fetch_cost = 0
+        cached_size = 0
+        for obj in self._get_as_set_objects(as_set_name, irrdbtools_cfg):
+            size = obj.get_cached_size()
+            if size is not None:
+                cached_size += size
+                continue
+            fetch_cost += durations.get(obj._get_object_filename(),
+                                        float("inf"))
+        if fetch_cost:
+            return (1, fetch_cost)
+        return (0, cached_size)
+
+    def _get_as_sets_by_cost(self, irrdbtools_cfg):
+        # Longest job first: the most expensive AS-SETs come first,
+        # so that they don't end up at the tail of the process.
+        durations = FetchDurations.load(self.builder.cache_dir)
+
+        tasks = []
+        for as_set_id, as_set in self.builder.as_sets.items():
+            cost = self._get_task_cost(as_set["name"], irrdbtools_cfg,
+                                       durations)
+            tasks.append((cost, as_set_id, as_set))
+        tasks.sort(key=lambda task: (task[0], task[1]), reverse=True)
+
+        return [as_set for _, _, as_set in tasks]
+
     def add_tasks(self):
+        irrdbtools_cfg = self._get_deferred_irrdbtools_cfg()
+
         # Enqueuing tasks.
-        for as_set_id, as_set in self.builder.as_sets.items():
+        for as_set in self._get_as_sets_by_cost(irrdbtools_cfg):
             used_by = ", ".join(as_set["used_by"])
             self.tasks_q.put((as_set, used_by, as_set["name"]))
 
@@ -234,6 +334,18 @@ class IRRDBConfigEnricher_OriginASNs(IRRDBConfigEnricher):
 
     WORKER_THREAD_CLASS = IRRDBConfigEnricher_WorkerThread_OriginASNs
 
+    PROVIDES = ("as_sets", "as_sets.asns")
+
+    def _get_as_set_objects(self, as_set_name, irrdbtools_cfg):
+        return [ASSet(as_set_name, **irrdbtools_cfg)]
+
 class IRRDBConfigEnricher_Prefixes(IRRDBConfigEnricher):
 
     WORKER_THREAD_CLASS = IRRDBConfigEnricher_WorkerThread_Prefixes
+
+    PROVIDES = ("as_sets", "as_sets.prefixes")
+
+    def _get_as_set_objects(self, as_set_name, irrdbtools_cfg):
+        ip_versions = [self.builder.ip_ver] if self.builder.ip_ver else [4, 6]
+        return [RSet(as_set_name, ip_ver, **irrdbtools_cfg)
+                for ip_ver in ip_versions]
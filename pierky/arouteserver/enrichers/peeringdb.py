@@ -17,7 +17,7 @@ import logging
 
 from .base import BaseConfigEnricher, BaseConfigEnricherThread
 from ..errors import BuilderError, ARouteServerError, \
-                    PeeringDBError, PeeringDBNoInfoError
+                    PeeringDBError, PeeringDBNoInfoError, CachedObjectsError
 from ..peering_db import PeeringDBNet
 
 class PeeringDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
@@ -31,6 +31,10 @@ class PeeringDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
         self.cfg_general = None
         self.cache_dir = None
         self.cache_expiry = None
+        self.fetch_timeout = None
+        self.deadline = None
+        self.retries = 0
+        self.circuit_breaker = None
 
     def do_task(self, task):
         client = task
@@ -65,14 +69,17 @@ class PeeringDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
                 continue
 
             try:
-                peeringdb_limit = None
-                net = PeeringDBNet(client["asn"],
-                                   cache_dir=self.cache_dir,
-                                   cache_expiry=self.cache_expiry)
-                if ip_ver == 4:
-                    peeringdb_limit = net.info_prefixes4
-                else:
-                    peeringdb_limit = net.info_prefixes6
+                peeringdb_limit = self.get_object_data(
+                    ("peeringdb_net", client["asn"], ip_ver), None,
+                    lambda: PeeringDBNet(client["asn"],
+                                         cache_dir=self.cache_dir,
+                                         cache_expiry=self.cache_expiry,
+                                         fetch_timeout=self.fetch_timeout,
+                                         deadline=self.deadline,
+                                         retries=self.retries,
+                                         circuit_breaker=self.circuit_breaker),
+                    "info_prefixes{}".format(ip_ver)
+                )
 
                 res["limit{}".format(ip_ver)] = peeringdb_limit or general_limit
 
@@ -82,7 +89,7 @@ class PeeringDBConfigEnricher_WorkerThread(BaseConfigEnricherThread):
                               "for AS{} while looking for "
                               "max-prefix limit.".format(client["asn"]))
                 pass
-            except PeeringDBError as e:
+            except (PeeringDBError, CachedObjectsError) as e:
                 raise BuilderError(
                     "An error occurred while retrieving info from PeeringDB "
                     "for ASN {}: {}".format(
@@ -104,11 +111,21 @@ class PeeringDBConfigEnricher(BaseConfigEnricher):
 
     WORKER_THREAD_CLASS = PeeringDBConfigEnricher_WorkerThread
 
+    REQUIRES = ("cfg_general", "cfg_clients")
+    PROVIDES = ("clients.max_prefix",)
+    SOURCE = "peeringdb"
+
     def _config_thread(self, thread):
+        BaseConfigEnricher._config_thread(self, thread)
         thread.ip_ver = self.builder.ip_ver
         thread.cfg_general = self.builder.cfg_general
         thread.cache_dir = self.builder.cache_dir
         thread.cache_expiry = self.builder.cache_expiry
+        thread.fetch_timeout = self.builder.peeringdb_timeout
+        thread.deadline = self.builder.fetch_deadline
+        thread.retries = self.builder.fetch_retries
+        thread.circuit_breaker = \
+            self.builder.circuit_breakers.get(self.SOURCE)
 
     def add_tasks(self):
         # Enqueuing tasks.
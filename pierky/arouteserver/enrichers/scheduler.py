@@ -0,0 +1,163 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+
+from .concurrency import ConcurrencyLimiter
+from ..errors import BuilderError, ARouteServerError
+
+
+class ConfigEnrichersScheduler(object):
+    """Run config enrichers concurrently, honouring their dependencies
+
+    Every enricher declares the data it needs (REQUIRES) and the data it
+    produces (PROVIDES). An enricher is started as soon as all the data
+    it needs are available, so enrichers that don't depend on each other
+    run at the same time.
+
+    Enrichers that use the same external source (SOURCE) share the same
+    limit of concurrent requests: it starts from ``threads`` and, when
+    ``adaptive_concurrency`` is set, it's tuned between ``min_threads``
+    and ``max_threads`` on the basis of the outcome of the requests.
+    """
+
+    def __init__(self, builder, enricher_classes, available, threads,
+                 adaptive_concurrency=False, min_threads=1,
+                 max_threads=None):
+        self.builder = builder
+        self.enricher_classes = list(enricher_classes)
+        self.available = set(available)
+        self.threads = threads
+        self.adaptive_concurrency = adaptive_concurrency
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+
+        self.lock = threading.Condition()
+        self.errors = False
+        self.unexpected_error = None
+
+        # Limiters are created before any enricher is started, so that
+        # enrichers that run at the same time and use the same source
+        # get the same one.
+        self.sources_slots = {}
+        for enricher_class in self.enricher_classes:
+            source = enricher_class.SOURCE
+            if source is None or source in self.sources_slots:
+                continue
+            self.sources_slots[source] = ConcurrencyLimiter(
+                source, self.threads,
+                min_limit=self.min_threads, max_limit=self.max_threads,
+                adaptive=self.adaptive_concurrency
+            )
+
+    def _get_source_slots(self, source):
+        if source is None:
+            return None
+        return self.sources_slots[source]
+
+    def _is_ready(self, enricher_class):
+        return all([data in self.available
+                    for data in enricher_class.REQUIRES])
+
+    def _run_enricher(self, enricher_class, running):
+        name = enricher_class.__name__
+        logging.debug("Enricher {} started".format(name))
+        start_time = time.time()
+        succeeded = False
+
+        try:
+            slots = self._get_source_slots(enricher_class.SOURCE)
+            # One worker thread for each request that the limiter
+            # could allow.
+            enricher = enricher_class(
+                self.builder,
+                threads=slots.max_limit if slots else self.threads,
+                slots=slots
+            )
+            enricher.enrich()
+            succeeded = True
+        except ARouteServerError as e:
+            with self.lock:
+                self.errors = True
+            if str(e):
+                logging.error(str(e))
+        except Exception as e:
+            logging.error("Unexpected error in enricher {}: {}".format(
+                name, str(e)), exc_info=True)
+            with self.lock:
+                self.unexpected_error = e
+        finally:
+            logging.debug("Enricher {} completed after {:.1f} "
+                          "seconds".format(name, time.time() - start_time))
+            with self.lock:
+                running.remove(enricher_class)
+                if succeeded:
+                    self.available.update(enricher_class.PROVIDES)
+                self.lock.notify_all()
+
+    def run(self):
+        """Run all the enrichers.
+
+        Returns:
+            True if all the enrichers completed without errors.
+        """
+        pending = list(self.enricher_classes)
+        running = []
+        threads = []
+
+        with self.lock:
+            while pending or running:
+                ready = [enricher_class for enricher_class in pending
+                         if self._is_ready(enricher_class)]
+
+                if not ready and not running:
+                    if self.errors or self.unexpected_error:
+                        # Enrichers that depend on the failed ones
+                        # can't run.
+                        break
+                    raise BuilderError(
+                        "Can't satisfy the dependencies of the following "
+                        "enrichers: {}".format(
+                            ", ".join([enricher_class.__name__
+                                       for enricher_class in pending])
+                        )
+                    )
+
+                for enricher_class in ready:
+                    pending.remove(enricher_class)
+                    running.append(enricher_class)
+                    t = threading.Thread(
+                        target=self._run_enricher,
+                        args=(enricher_class, running),
+                        name=enricher_class.__name__
+                    )
+                    t.start()
+                    threads.append(t)
+
+                if running:
+                    self.lock.wait()
+
+        for t in threads:
+            t.join()
+
+        for source in sorted(self.sources_slots):
+            self.sources_slots[source].log_stats()
+
+        if self.unexpected_error:
+            raise self.unexpected_error
+
+        return not self.errors
@@ -13,20 +13,277 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import errno
 import ipaddr
 import json
 import os
 import logging
+import multiprocessing
+import select
 import subprocess
+import threading
 import time
 
-from .cached_objects import CachedObject
-from .config.validators import ValidatorPrefixListEntry
-from .errors import IRRDBToolsError
+from .cached_objects import CachedObject, cache_stats, fetch_durations
+from .config.validators import ValidatorPrefixListEntries
+from .errors import IRRDBToolsError, ARouteServerError
+from .prefix_list import PrefixListEntry
 
 
+def bgpq3_prefix_to_entry(raw, comment):
+    """Turn a prefix from bgpq3 JSON output into a prefix list entry.
+
+    Returns:
+        dict, to be validated by ValidatorPrefixListEntries.
+    """
+    ip, _, pref_len = raw["prefix"].partition("/")
+    if pref_len.isdigit():
+        pref_len = int(pref_len)
+    else:
+        prefix = ipaddr.IPNetwork(raw["prefix"])
+        ip, pref_len = str(prefix.ip), prefix.prefixlen
+    res = {
+        "prefix": ip,
+        "length": pref_len,
+        "exact": raw["exact"] if "exact" in raw else False,
+        "comment": comment
+    }
+    if res["exact"]:
+        res["ge"] = None
+        res["le"] = None
+    else:
+        if "greater-equal" in raw:
+            res["ge"] = raw["greater-equal"]
+        else:
+            res["ge"] = None
+
+        if "less-equal" in raw:
+            res["le"] = raw["less-equal"]
+        else:
+            res["le"] = None
+
+    return res
+
+def validate_bgpq3_prefix_list(raw_prefixes, comment):
+    """Parse and validate prefixes from bgpq3 JSON output.
+
+    Returns:
+        list of dict, as returned by ValidatorPrefixListEntry.
+    """
+    return ValidatorPrefixListEntries().validate(
+        [bgpq3_prefix_to_entry(raw, comment) for raw in raw_prefixes]
+    )
+
+def parse_bgpq3_prefix_list(raw_prefixes, comment):
+    """Parse and validate prefixes from bgpq3 JSON output.
+
+    Returns:
+        list of PrefixListEntry.
+    """
+    return [
+        PrefixListEntry.from_dict(entry)
+        for entry in validate_bgpq3_prefix_list(raw_prefixes, comment)
+    ]
+
+# Fields of the prefix list entries exchanged with the parsing pool;
+# the comment is the same for all the entries, so it's left out.
+# They are in the same order of PrefixListEntry's arguments.
+COMPACT_PREFIX_FIELDS = ("prefix", "length", "max_length", "exact",
+                         "ge", "le")
+
+def parse_bgpq3_prefix_list_compact(raw_prefixes):
+    """Parse and validate prefixes; executed by the ParsingPool.
+
+    Returns:
+        (error, entries) tuple: error is None if all the prefixes are
+        valid, and entries is a list of tuples, one for each entry,
+        whose items are the COMPACT_PREFIX_FIELDS values.
+    """
+    try:
+        entries = [
+            tuple([entry[field] for field in COMPACT_PREFIX_FIELDS])
+            for entry in validate_bgpq3_prefix_list(raw_prefixes, "")
+        ]
+        return None, entries
+    except Exception as e:
+        return str(e) or "invalid prefix", None
+
+class ParsingPool(object):
+    """Process pool used to parse large IRRDB expansions
+
+    Parsing and validating prefixes is CPU bound, so when done by the
+    enrichers' worker threads it's serialized by the GIL. Expansions with
+    at least ``min_size`` prefixes are parsed by a pool of ``processes``
+    processes (default: one per CPU) instead.
+
+    The pool must be started before any other thread, since forking a
+    multi-threaded process can leave the children deadlocked.
+    """
+
+    def __init__(self, processes=None, min_size=1000):
+        self.processes = processes
+        self.min_size = min_size
+        self.pool = None
+
+    def start(self):
+        self.pool = multiprocessing.Pool(self.processes)
+
+    def is_worth(self, size):
+        return self.pool is not None and size >= self.min_size
+
+    def apply(self, func, args):
+        return self.pool.apply(func, args)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+def run_command(cmd, timeout=None):
+    """Run a command and return its output.
+
+    Like subprocess.check_output(), but the command is killed if it
+    doesn't complete within ``timeout`` seconds.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+    timer = None
+    killed = []
+    if timeout is not None:
+        def kill():
+            killed.append(True)
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+
+    try:
+        out, _ = proc.communicate()
+    finally:
+        if timer:
+            timer.cancel()
+
+    if killed:
+        raise IRRDBToolsError(
+            "the command '{}' has been killed after {:.0f} seconds".format(
+                " ".join(cmd), timeout
+            )
+        )
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+    return out
+
+class AsyncCommandsRunner(object):
+    """Run many external commands concurrently on a single thread
+
+    Commands are started up to ``max_in_flight`` at the same time; their
+    output is collected using select(), and a callback is invoked for
+    each one of them when it terminates.
+
+    Commands that take longer than ``timeout`` seconds are killed; once
+    the ``deadline`` (a FetchDeadline) is exceeded, commands not yet
+    started are not executed at all.
+    """
+
+    READ_SIZE = 65536
+
+    def __init__(self, max_in_flight, timeout=None, deadline=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.deadline = deadline
+
+    def _get_timeout(self):
+        if self.deadline:
+            return self.deadline.get_timeout(self.timeout)
+        return self.timeout
+
+    def run(self, jobs):
+        """Run the jobs.
+
+        Args:
+            jobs (list): (cmd, callback) tuples; callback is called with
+                the exit code and the stdout of the command and with the
+                number of seconds it took, or with (None, None, None) if
+                the command can't be executed.
+        """
+        pending = list(jobs)
+        pending.reverse()
+
+        # fd -> [proc, buffer, callback, kill_at, started_at]
+        in_flight = {}
+
+        while pending or in_flight:
+            if pending and self.deadline and self.deadline.expired():
+                while pending:
+                    _, callback = pending.pop()
+                    callback(None, None, None)
+
+            while pending and len(in_flight) < self.max_in_flight:
+                cmd, callback = pending.pop()
+                try:
+                    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+                except OSError as e:
+                    logging.debug("Can't run {}: {}".format(
+                        " ".join(cmd), str(e)))
+                    callback(None, None, None)
+                    continue
+                started_at = time.time()
+                timeout = self._get_timeout()
+                kill_at = started_at + timeout if timeout is not None \
+                    else None
+                in_flight[proc.stdout.fileno()] = [proc, [], callback,
+                                                   kill_at, started_at]
+
+            if not in_flight:
+                continue
+
+            kill_times = [job[3] for job in in_flight.values()
+                          if job[3] is not None]
+            select_timeout = max(0, min(kill_times) - time.time()) \
+                if kill_times else None
+
+            try:
+                readable, _, _ = select.select(list(in_flight), [], [],
+                                               select_timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            now = time.time()
+            for job in in_flight.values():
+                if job[3] is not None and job[3] <= now:
+                    logging.debug("Killing process {}: timeout".format(
+                        job[0].pid))
+                    job[3] = None
+                    try:
+                        job[0].kill()
+                    except OSError:
+                        pass
+
+            for fd in readable:
+                proc, buf, callback, _, started_at = in_flight[fd]
+                chunk = os.read(fd, self.READ_SIZE)
+                if chunk:
+                    buf.append(chunk)
+                    continue
+
+                # EOF: the command is terminated.
+                del in_flight[fd]
+                proc.stdout.close()
+                returncode = proc.wait()
+                callback(returncode, b"".join(buf).decode("utf-8"),
+                         time.time() - started_at)
+
 class IRRDBTools(CachedObject):
 
+    SOURCE = "irrdb"
+
     BGPQ3_DEFAULT_HOST = "rr.ntt.net"
     BGPQ3_DEFAULT_SOURCES = ("RIPE,APNIC,AFRINIC,ARIN,NTTCOM,ALTDB,"
                              "BBOI,BELL,GT,JPIRR,LEVEL3,RADB,RGNET,"
@@ -39,12 +296,123 @@ class IRRDBTools(CachedObject):
         self.bgpq3_sources = kwargs.get("bgpq3_sources",
                                         self.BGPQ3_DEFAULT_SOURCES)
 
+        # When True, data are not loaded when the object is created:
+        # see IRRDBTools.prefetch().
+        self.defer_load = kwargs.get("defer_load", False)
+
+        # ParsingPool used to parse large expansions.
+        self.parsing_pool = kwargs.get("parsing_pool", None)
+
+    def _get_descr(self):
+        raise NotImplementedError()
+
+    def _get_bgpq3_cmd(self):
+        raise NotImplementedError()
+
+    def _parse_bgpq3_data(self, data):
+        raise NotImplementedError()
+
+    def _parse_bgpq3_output(self, cmd, out):
+        try:
+            data = json.loads(out)
+        except Exception as e:
+            raise IRRDBToolsError(
+                "Error while parsing bgpq3 output "
+                "for the following command: '{}': {}".format(
+                    " ".join(cmd), str(e)
+                )
+            )
+
+        return self._parse_bgpq3_data(data)
+
+    def _get_data(self):
+        cmd = self._get_bgpq3_cmd()
+
+        try:
+            out = run_command(cmd, self.get_fetch_timeout())
+        except Exception as e:
+            raise IRRDBToolsError(
+                "Can't get {}: {}".format(self._get_descr(), str(e))
+            )
+
+        return self._parse_bgpq3_output(cmd, out)
+
+    @staticmethod
+    def prefetch(objects, max_in_flight, timeout=None, deadline=None):
+        """Fetch data for many objects concurrently, on a single thread.
+
+        The bgpq3 processes needed to acquire data for the objects that are
+        not already in the cache are executed concurrently, up to
+        ``max_in_flight`` at the same time, and their results are saved
+        into the cache.
+
+        Objects whose data can't be acquired are simply left out of the
+        cache: errors will be reported when the objects are loaded again
+        in the regular way.
+
+        Objects that are not in the cache are counted as misses in the
+        cache stats, and the time needed to acquire their data is
+        recorded (see FetchDurations), like it's done when they are
+        loaded in the regular way.
+
+        Args:
+            objects (list): IRRDBTools objects created with
+                ``defer_load=True``.
+
+            max_in_flight (int): max number of concurrent bgpq3 processes.
+
+            timeout (int): max number of seconds each bgpq3 process can
+                run for.
+
+            deadline (FetchDeadline): overall time budget.
+
+        Returns:
+            number of objects whose data have been fetched.
+        """
+        jobs = []
+
+        def save(obj, cmd):
+            def callback(returncode, out, duration):
+                cache_stats.miss(obj._get_object_filename())
+                if returncode is None:
+                    return
+                if returncode != 0:
+                    logging.debug("Prefetch failed for {}: exit code "
+                                  "{}".format(obj._get_descr(), returncode))
+                    return
+                try:
+                    obj.raw_data = obj._parse_bgpq3_output(cmd, out)
+                    fetch_durations.record(obj._get_object_filename(),
+                                           duration)
+                    obj.save_data_to_cache()
+                except ARouteServerError as e:
+                    logging.debug("Prefetch failed for {}: {}".format(
+                        obj._get_descr(), str(e)))
+            return callback
+
+        for obj in objects:
+            if obj.load_data_from_cache():
+                continue
+            cmd = obj._get_bgpq3_cmd()
+            jobs.append((cmd, save(obj, cmd)))
+
+        if jobs:
+            logging.debug("Prefetching {} IRRDB objects, up to {} "
+                          "concurrent requests".format(
+                              len(jobs), max_in_flight))
+            AsyncCommandsRunner(max_in_flight, timeout, deadline).run(jobs)
+
+        return len(jobs)
+
 class ASSet(IRRDBTools):
 
     def __init__(self, object_name, **kwargs):
         IRRDBTools.__init__(self, **kwargs)
         self.object_name = object_name
 
+        if self.defer_load:
+            return
+
         logging.debug("Getting origin ASNs for "
                       "{} from IRRdb".format(self.object_name))
 
@@ -56,7 +424,10 @@ class ASSet(IRRDBTools):
     def _get_object_filename(self):
         return "{}-as_set.json".format(self.object_name)
 
-    def _get_data(self):
+    def _get_descr(self):
+        return "list of authorized ASNs for {}".format(self.object_name)
+
+    def _get_bgpq3_cmd(self):
         cmd = [self.bgpq3_path]
         cmd += ["-h", self.bgpq3_host]
         cmd += ["-S", self.bgpq3_sources]
@@ -65,26 +436,9 @@ class ASSet(IRRDBTools):
         cmd += ["-f", "1"]
         cmd += ["-l", "asn_list"]
         cmd += [self.object_name]
+        return cmd
 
-        try:
-            out = subprocess.check_output(cmd)
-        except Exception as e:
-            raise IRRDBToolsError(
-                "Can't get list of authorized ASNs for {}: {}".format(
-                    self.object_name, str(e)
-                )
-            )
-
-        try:
-            data = json.loads(out)
-        except Exception as e:
-            raise IRRDBToolsError(
-                "Error while parsing bgpq3 output "
-                "for the following command: '{}': {}".format(
-                    " ".join(cmd), str(e)
-                )
-            )
-
+    def _parse_bgpq3_data(self, data):
         return data["asn_list"]
 
 class RSet(IRRDBTools):
@@ -95,18 +449,32 @@ class RSet(IRRDBTools):
         assert ip_ver in (4, 6)
         self.ip_ver = ip_ver
 
+        if self.defer_load:
+            return
+
         logging.debug("Getting prefixes for {} IPv{} "
                       "from IRRdb".format(self.object_name, self.ip_ver))
 
         self.load_data()
 
-        # list of dict as returned by ValidatorPrefixListEntry
+        # list of PrefixListEntry
         self.prefixes = self.raw_data
 
     def _get_object_filename(self):
         return "{}-r_set-ipv{}.json".format(self.object_name, self.ip_ver)
 
-    def _get_data(self):
+    def _decode_cached_data(self, data):
+        return [PrefixListEntry.from_dict(entry) for entry in data]
+
+    def _encode_cached_data(self, raw_data):
+        return [entry.to_dict() for entry in raw_data]
+
+    def _get_descr(self):
+        return "authorized prefix list for {} IPv{}".format(
+            self.object_name, self.ip_ver
+        )
+
+    def _get_bgpq3_cmd(self):
         cmd = [self.bgpq3_path]
         cmd += ["-h", self.bgpq3_host]
         cmd += ["-S", self.bgpq3_sources]
@@ -116,48 +484,20 @@ class RSet(IRRDBTools):
         cmd += ["-j"]
         cmd += ["-l", "prefix_list"]
         cmd += [self.object_name]
+        return cmd
 
-        try:
-            out = subprocess.check_output(cmd)
-        except Exception as e:
-            raise IRRDBToolsError(
-                "Can't get authorized prefix list for {} IPv{}: {}".format(
-                    self.object_name, self.ip_ver, str(e)
-                )
-            )
+    def _parse_bgpq3_data(self, data):
+        raw_prefixes = data["prefix_list"]
 
-        try:
-            data = json.loads(out)
-        except Exception as e:
-            raise IRRDBToolsError(
-                "Error while parsing bgpq3 output "
-                "for the following command: '{}': {}".format(
-                    " ".join(cmd), str(e)
-                )
+        if self.parsing_pool and self.parsing_pool.is_worth(len(raw_prefixes)):
+            error, entries = self.parsing_pool.apply(
+                parse_bgpq3_prefix_list_compact, (raw_prefixes,)
             )
+            if error:
+                raise IRRDBToolsError(error)
 
-        return [self._parse_prefix(prefix) for prefix in data["prefix_list"]]
-
-    def _parse_prefix(self, raw):
-        prefix = ipaddr.IPNetwork(raw["prefix"])
-        res = {
-            "prefix": str(prefix.ip),
-            "length": prefix.prefixlen,
-            "exact": raw["exact"] if "exact" in raw else False,
-            "comment": self.object_name
-        }
-        if res["exact"]:
-            res["ge"] = None
-            res["le"] = None
-        else:
-            if "greater-equal" in raw:
-                res["ge"] = raw["greater-equal"]
-            else:
-                res["ge"] = None
-
-            if "less-equal" in raw:
-                res["le"] = raw["less-equal"]
-            else:
-                res["le"] = None
+            comment = str(self.object_name)
+            return [PrefixListEntry(*entry, comment=comment)
+                    for entry in entries]
 
-        return ValidatorPrefixListEntry().validate(res)
+        return parse_bgpq3_prefix_list(raw_prefixes, self.object_name)
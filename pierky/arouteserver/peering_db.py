@@ -30,13 +30,20 @@ from .errors import PeeringDBError, PeeringDBNoInfoError
 
 class PeeringDBInfo(CachedObject):
 
+    SOURCE = "peeringdb"
+
+    PERMANENT_ERRORS = (PeeringDBNoInfoError,)
+
     def _get_peeringdb_url(self):
         raise NotImplementedError()
 
     @staticmethod
-    def _read_from_url(url):
+    def _read_from_url(url, timeout=None):
         try:
-            response = urlopen(url)
+            if timeout is None:
+                response = urlopen(url)
+            else:
+                response = urlopen(url, timeout=timeout)
         except Exception as e:
             raise PeeringDBError(
                 "Error while retrieving info from PeeringDB: {}".format(
@@ -47,7 +54,8 @@ class PeeringDBInfo(CachedObject):
         return response.read().decode("utf-8")
 
     def _get_data_from_peeringdb(self):
-        plain_text = self._read_from_url(self._get_peeringdb_url())
+        plain_text = self._read_from_url(self._get_peeringdb_url(),
+                                         self.get_fetch_timeout())
         try:
             data = json.loads(plain_text)
             return data
@@ -88,6 +96,9 @@ class PeeringDBNet(PeeringDBInfo):
     def _get_object_filename(self):
         return "peeringdb_net_{}.json".format(self.asn)
 
+    def _get_descr(self):
+        return "PeeringDB info for AS{}".format(self.asn)
+
     def _get_peeringdb_url(self):
         return self.PEERINGDB_URL.format(asn=self.asn)
 
@@ -0,0 +1,108 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import yaml
+
+
+# The same few comments (the AS-SET names) are shared by thousands of
+# entries: only one copy of each one is kept.
+_comments = {}
+
+def intern_comment(comment):
+    if comment is None:
+        return None
+    return _comments.setdefault(comment, comment)
+
+class PrefixListEntry(object):
+    """A validated prefix list entry
+
+    Compact replacement for the dict returned by
+    ValidatorPrefixListEntry, used for the (possibly huge) lists of
+    prefixes acquired from IRRDBs. Fields are accessed using the
+    attribute syntax, in both the code and the templates; the dict
+    syntax is supported too, for read-only access.
+    """
+
+    __slots__ = ("prefix", "length", "max_length", "exact", "ge", "le",
+                 "comment")
+
+    FIELDS = __slots__
+
+    def __init__(self, prefix, length, max_length, exact=False, ge=None,
+                 le=None, comment=None):
+        self.prefix = prefix
+        self.length = length
+        self.max_length = max_length
+        self.exact = exact
+        self.ge = ge
+        self.le = le
+        self.comment = intern_comment(comment)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["prefix"], d["length"], d["max_length"],
+                   d.get("exact", False), d.get("ge", None),
+                   d.get("le", None), d.get("comment", None))
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    def _key(self):
+        return (self.prefix, self.length, self.max_length, self.exact,
+                self.ge, self.le, self.comment)
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if isinstance(other, PrefixListEntry):
+            return self._key() == other._key()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        if res is NotImplemented:
+            return res
+        return not res
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "PrefixListEntry({})".format(
+            ", ".join("{}={!r}".format(field, getattr(self, field))
+                      for field in self.FIELDS)
+        )
+
+def prefix_list_entry_representer(dumper, entry):
+    return dumper.represent_dict(entry.to_dict())
+
+class PrefixListSafeDumper(yaml.SafeDumper):
+    """SafeDumper that represents PrefixListEntry objects as dicts."""
+
+PrefixListSafeDumper.add_representer(PrefixListEntry,
+                                     prefix_list_entry_representer)
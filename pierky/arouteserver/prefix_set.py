@@ -0,0 +1,511 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import binascii
+import socket
+import struct
+
+from .config.validators import ValidatorPrefixListEntries
+from .prefix_list import PrefixListEntry
+
+
+def merge_ranges(ranges):
+    """Sorted list of non-overlapping, non-adjacent (ge, le) ranges."""
+    res = []
+    for ge, le in sorted(ranges):
+        if res and ge <= res[-1][1] + 1:
+            if le > res[-1][1]:
+                res[-1] = (res[-1][0], le)
+        else:
+            res.append((ge, le))
+    return res
+
+def _get_range(length, ge, le, exact, max_length):
+    # (ge, le) range of lengths matched by a prefix list entry.
+    if exact:
+        return length, length
+    return ge or length, le or max_length
+
+def _range_covered(rng, ranges):
+    # ranges must be merged.
+    ge, le = rng
+    for cov_ge, cov_le in ranges:
+        if cov_ge <= ge and le <= cov_le:
+            return True
+    return False
+
+def subtract_ranges(ranges, minus):
+    """(ge, le) ranges minus the ones in minus, that must be merged."""
+    res = []
+    for ge, le in ranges:
+        for minus_ge, minus_le in minus:
+            if minus_le < ge or minus_ge > le:
+                continue
+            if minus_ge > ge:
+                res.append((ge, minus_ge - 1))
+            ge = minus_le + 1
+            if ge > le:
+                break
+        if ge <= le:
+            res.append((ge, le))
+    return res
+
+def _range_to_entry(prefix, length, max_length, ge, le, comment):
+    if ge == le == length:
+        return PrefixListEntry(prefix, length, max_length, True, None, None,
+                               comment)
+    return PrefixListEntry(prefix, length, max_length, False,
+                           ge if ge != length else None,
+                           le if le != max_length else None,
+                           comment)
+
+class _Node(object):
+
+    __slots__ = ("addr", "length", "children", "ranges")
+
+    def __init__(self, addr, length):
+        self.addr = addr
+        self.length = length
+        self.children = [None, None]
+
+        # Ranges of prefix lengths, (ge, le) tuples; nodes without
+        # ranges are only used to join their children.
+        self.ranges = []
+
+class _RadixTree(object):
+    """Patricia tree of the prefixes of one address family"""
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.root = None
+
+    def _bit(self, addr, idx):
+        return (addr >> (self.max_length - 1 - idx)) & 1
+
+    def _mask(self, addr, length):
+        return addr & ~((1 << (self.max_length - length)) - 1)
+
+    def _common_length(self, addr1, len1, addr2, len2):
+        diff = addr1 ^ addr2
+        common = self.max_length - diff.bit_length() if diff \
+            else self.max_length
+        return min(common, len1, len2)
+
+    def _covers(self, node, addr, length):
+        return node.length <= length and \
+            self._mask(addr, node.length) == node.addr
+
+    def get_node(self, addr, length):
+        """Return the node for addr/length, creating it if needed."""
+        addr = self._mask(addr, length)
+
+        if self.root is None:
+            self.root = _Node(addr, length)
+            return self.root
+
+        parent = None
+        node = self.root
+        while True:
+            common = self._common_length(node.addr, node.length,
+                                         addr, length)
+
+            if common == node.length == length:
+                return node
+
+            if common == node.length:
+                # The node covers the new prefix: go down.
+                bit = self._bit(addr, node.length)
+                if node.children[bit] is None:
+                    node.children[bit] = _Node(addr, length)
+                    return node.children[bit]
+                parent = node
+                node = node.children[bit]
+                continue
+
+            new = _Node(addr, length)
+            if common == length:
+                # The new prefix covers the node.
+                new.children[self._bit(node.addr, length)] = node
+                top = new
+            else:
+                # They diverge: a join node is needed.
+                top = _Node(self._mask(addr, common), common)
+                top.children[self._bit(node.addr, common)] = node
+                top.children[self._bit(addr, common)] = new
+
+            if parent is None:
+                self.root = top
+            else:
+                parent.children[self._bit(addr, parent.length)] = top
+            return new
+
+    def insert(self, addr, length, ge, le):
+        node = self.get_node(addr, length)
+        node.ranges = merge_ranges(node.ranges + [(ge, le)])
+
+    def get_covering(self, addr, length):
+        """Nodes with ranges whose prefix covers addr/length.
+
+        From the shortest to the longest prefix.
+        """
+        node = self.root
+        while node is not None and self._covers(node, addr, length):
+            if node.ranges:
+                yield node
+            if node.length == length:
+                break
+            node = node.children[self._bit(addr, node.length)]
+
+    def get_covered(self, addr, length):
+        """Nodes with ranges whose prefix is covered by addr/length."""
+        addr = self._mask(addr, length)
+        node = self.root
+        while node is not None and node.length < length:
+            if not self._covers(node, addr, length):
+                # Disjoint subtree.
+                return
+            node = node.children[self._bit(addr, node.length)]
+        if node is None or self._mask(node.addr, length) != addr:
+            return
+        for covered in self.walk(node):
+            yield covered
+
+    def walk(self, node=None):
+        """Nodes with ranges, in canonical order.
+
+        Prefixes are ordered by address, then by length; it's the
+        pre-order visit of the tree, lower half first.
+        """
+        if node is None:
+            node = self.root
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            if node.ranges:
+                yield node
+            for child in reversed(node.children):
+                if child is not None:
+                    stack.append(child)
+
+    def _lift(self, node):
+        # Post-order: the two halves of a prefix that have the same
+        # ranges are replaced by the prefix itself, with those ranges.
+        for child in node.children:
+            if child is not None:
+                self._lift(child)
+
+        left, right = node.children
+        if left is None or right is None:
+            return
+        if left.length != node.length + 1 or \
+            right.length != node.length + 1:
+            return
+        if not left.ranges or left.ranges != right.ranges:
+            return
+
+        node.ranges = merge_ranges(node.ranges + left.ranges)
+        left.ranges = []
+        right.ranges = []
+
+    def _prune(self, node, covered):
+        # Pre-order: ranges already matched by a covering prefix are
+        # removed.
+        if covered:
+            node.ranges = [rng for rng in node.ranges
+                           if not _range_covered(rng, covered)]
+        if node.ranges:
+            covered = merge_ranges(covered + node.ranges)
+        for child in node.children:
+            if child is not None:
+                self._prune(child, covered)
+
+    def aggregate(self):
+        """Aggregate the ranges in place."""
+        if self.root is None:
+            return
+        while True:
+            cnt = sum(len(node.ranges) for node in self.walk())
+            self._prune(self.root, [])
+            self._lift(self.root)
+            self._prune(self.root, [])
+            if sum(len(node.ranges) for node in self.walk()) == cnt:
+                break
+
+class PrefixSet(object):
+    """Set of IPv4 and IPv6 prefix list entries
+
+    Entries have the same meaning they have in prefix lists: the
+    ``prefix/length`` entry, with its ``ge`` and ``le`` range, matches
+    all the routes that are covered by it and whose length is within
+    the range.
+
+    Entries are stored in a patricia tree for each address family, so
+    that lookups need a number of steps that depends on the length of
+    the prefix, not on the number of entries.
+    """
+
+    def __init__(self, entries=None):
+        self.trees = {4: _RadixTree(32), 6: _RadixTree(128)}
+        if entries:
+            self.add_entries(entries)
+
+    @staticmethod
+    def _parse_prefix(prefix):
+        if ":" in prefix:
+            return 6, int(binascii.hexlify(
+                socket.inet_pton(socket.AF_INET6, prefix)), 16)
+        return 4, struct.unpack(
+            "!I", socket.inet_pton(socket.AF_INET, prefix))[0]
+
+    @staticmethod
+    def _format_prefix(ip_ver, addr):
+        if ip_ver == 4:
+            return socket.inet_ntop(socket.AF_INET, struct.pack("!I", addr))
+
+        packed = binascii.unhexlify("{:032x}".format(addr))
+        prefix = socket.inet_ntop(socket.AF_INET6, packed)
+        # Same notation used by ipaddr and by the validators.
+        if "." in prefix:
+            prefix = ValidatorPrefixListEntries._compress_hextets(
+                struct.unpack("!8H", packed))
+        return prefix
+
+    def insert(self, prefix, length, ge=None, le=None, exact=False):
+        """Add an entry; arguments have the same meaning they have in
+        PrefixListEntry."""
+        ip_ver, addr = self._parse_prefix(prefix)
+        tree = self.trees[ip_ver]
+        ge, le = _get_range(length, ge, le, exact, tree.max_length)
+        tree.insert(addr, length, ge, le)
+
+    def insert_range(self, prefix, length, ge, le):
+        """Add an entry that matches the routes covered by prefix/length
+        whose length is between ge and le, included."""
+        ip_ver, addr = self._parse_prefix(prefix)
+        self.trees[ip_ver].insert(addr, length, ge, le)
+
+    def add_entry(self, entry):
+        """Add a PrefixListEntry (or a dict with the same keys)."""
+        self.insert(entry["prefix"], entry["length"],
+                    entry.get("ge", None), entry.get("le", None),
+                    entry.get("exact", False))
+
+    def add_entries(self, entries):
+        for entry in entries:
+            self.add_entry(entry)
+
+    def _iter_nodes(self, ip_ver=None):
+        for tree_ip_ver in (4, 6):
+            if ip_ver and ip_ver != tree_ip_ver:
+                continue
+            for node in self.trees[tree_ip_ver].walk():
+                yield tree_ip_ver, node
+
+    def _node_to_entries(self, ip_ver, node, comment=None):
+        tree = self.trees[ip_ver]
+        prefix = self._format_prefix(ip_ver, node.addr)
+        for ge, le in node.ranges:
+            yield _range_to_entry(prefix, node.length, tree.max_length,
+                                  ge, le, comment)
+
+    def iter_entries(self, ip_ver=None, comment=None):
+        """Entries, as PrefixListEntry objects, in canonical order.
+
+        IPv4 entries first, then ordered by address, length and range.
+        """
+        for node_ip_ver, node in self._iter_nodes(ip_ver):
+            for entry in self._node_to_entries(node_ip_ver, node, comment):
+                yield entry
+
+    def __iter__(self):
+        return self.iter_entries()
+
+    def __len__(self):
+        return sum(len(node.ranges) for _, node in self._iter_nodes())
+
+    def __bool__(self):
+        return any(tree.root is not None for tree in self.trees.values())
+
+    __nonzero__ = __bool__
+
+    def get_covering(self, prefix, length):
+        """Entries whose prefix covers prefix/length, whatever their
+        range is; from the shortest to the longest prefix."""
+        ip_ver, addr = self._parse_prefix(prefix)
+        res = []
+        for node in self.trees[ip_ver].get_covering(addr, length):
+            res.extend(self._node_to_entries(ip_ver, node))
+        return res
+
+    def match(self, prefix, length):
+        """True if the route prefix/length is matched by any entry."""
+        ip_ver, addr = self._parse_prefix(prefix)
+        for node in self.trees[ip_ver].get_covering(addr, length):
+            for ge, le in node.ranges:
+                if ge <= length <= le:
+                    return True
+        return False
+
+    def union(self, other):
+        """New PrefixSet with the entries of both the sets."""
+        res = PrefixSet()
+        for src in (self, other):
+            for ip_ver, node in src._iter_nodes():
+                tree = res.trees[ip_ver]
+                for ge, le in node.ranges:
+                    tree.insert(node.addr, node.length, ge, le)
+        return res
+
+    def intersection(self, other):
+        """New PrefixSet matching the routes matched by both the sets."""
+        res = PrefixSet()
+        for ip_ver, node in self._iter_nodes():
+            tree = res.trees[ip_ver]
+            other_tree = other.trees[ip_ver]
+
+            # Entries of the other set that overlap this one: the ones
+            # that cover it and the ones that are covered by it.
+            overlapping = list(other_tree.get_covering(node.addr,
+                                                       node.length))
+            overlapping += [
+                _ for _ in other_tree.get_covered(node.addr, node.length)
+                if _.length > node.length
+            ]
+
+            for other_node in overlapping:
+                longest = node if node.length >= other_node.length \
+                    else other_node
+                for ge1, le1 in node.ranges:
+                    for ge2, le2 in other_node.ranges:
+                        ge = max(ge1, ge2, longest.length)
+                        le = min(le1, le2)
+                        if ge <= le:
+                            tree.insert(longest.addr, longest.length,
+                                        ge, le)
+        return res
+
+    def aggregate(self):
+        """New PrefixSet matching the same routes, with fewer entries.
+
+        Entries whose routes are already matched by a covering entry
+        are dropped, and adjacent prefixes with the same ranges are
+        merged into their covering prefix.
+        """
+        res = self.union(PrefixSet())
+        for ip_ver in (4, 6):
+            res.trees[ip_ver].aggregate()
+        # Rebuilt, to get rid of the nodes left without ranges.
+        return res.union(PrefixSet())
+
+def aggregate_prefix_list(entries):
+    """Aggregate a list of prefix list entries.
+
+    Args:
+        entries: list of PrefixListEntry objects or of dicts, as
+            returned by ValidatorPrefixListEntry.
+
+    Returns:
+        list of PrefixListEntry, in canonical order, matching the same
+        routes. Every entry's comment is made of the comments of the
+        original entries it replaces.
+    """
+    comments = []
+    for entry in entries:
+        comment = entry.get("comment", None)
+        if comment and comment not in comments:
+            comments.append(comment)
+
+    aggregated = PrefixSet(entries).aggregate()
+
+    if len(comments) <= 1:
+        return list(aggregated.iter_entries(
+            comment=comments[0] if comments else None))
+
+    res = list(aggregated.iter_entries())
+
+    # For every original entry, the aggregated ones that cover it.
+    index = {}
+    for idx, entry in enumerate(res):
+        index.setdefault((entry.prefix, entry.length), idx)
+    res_comments = [[] for _ in res]
+    for entry in entries:
+        comment = entry.get("comment", None)
+        if not comment:
+            continue
+        ip_ver, addr = PrefixSet._parse_prefix(entry["prefix"])
+        tree = aggregated.trees[ip_ver]
+        length = entry["length"]
+        ge, le = _get_range(length, entry.get("ge", None),
+                            entry.get("le", None), entry.get("exact", False),
+                            tree.max_length)
+        for node in tree.get_covering(addr, length):
+            prefix = PrefixSet._format_prefix(ip_ver, node.addr)
+            idx = index[(prefix, node.length)]
+            for node_idx, (node_ge, node_le) in enumerate(node.ranges):
+                if node_ge > le or ge > node_le:
+                    continue
+                if comment not in res_comments[idx + node_idx]:
+                    res_comments[idx + node_idx].append(comment)
+
+    return [
+        PrefixListEntry(entry.prefix, entry.length, entry.max_length,
+                        entry.exact, entry.ge, entry.le,
+                        ", ".join(entry_comments) or None)
+        for entry, entry_comments in zip(res, res_comments)
+    ]
+
+def prune_prefix_list(entries, rejected):
+    """Remove from a prefix list the routes matched by another set.
+
+    Args:
+        entries: list of PrefixListEntry objects or of dicts, as
+            returned by ValidatorPrefixListEntry.
+
+        rejected (PrefixSet): routes to be removed.
+
+    Only the ranges of the entries of ``rejected`` that cover an entry
+    are taken into account: the routes matched by more specific
+    entries are not removed, since this would need the entry to be
+    split.
+
+    Returns:
+        list of entries, in the same order. Entries that are not
+        affected are returned as they are, the others are replaced by
+        the PrefixListEntry objects needed to match the remaining
+        ranges, if any.
+    """
+    res = []
+    for entry in entries:
+        ip_ver, addr = PrefixSet._parse_prefix(entry["prefix"])
+        tree = rejected.trees[ip_ver]
+        length = entry["length"]
+        ranges = [_get_range(length, entry.get("ge", None),
+                             entry.get("le", None), entry.get("exact", False),
+                             tree.max_length)]
+        orig_ranges = ranges
+        for node in tree.get_covering(addr, length):
+            ranges = subtract_ranges(ranges, node.ranges)
+            if not ranges:
+                break
+
+        if ranges == orig_ranges:
+            res.append(entry)
+            continue
+
+        for ge, le in ranges:
+            res.append(_range_to_entry(entry["prefix"], length,
+                                       tree.max_length, ge, le,
+                                       entry.get("comment", None)))
+    return res
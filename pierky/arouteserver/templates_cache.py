@@ -0,0 +1,167 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import logging
+import os
+import yaml
+
+from jinja2 import FileSystemBytecodeCache, ModuleLoader
+
+from .cached_objects import CacheDir, touch_cache_entry
+from .config.program import ConfigParserProgram
+
+
+class TemplatesBytecodeCache(FileSystemBytecodeCache):
+    """Compiled templates, persisted in the cache directory
+
+    Templates are compiled only when their fingerprint (the same used
+    by the 'verify-templates' command) is not the same of the one they
+    had when they were compiled the last time.
+
+    Compiled templates are Python code that is run by the builds: the
+    cache directory must be writable only by the user that runs them.
+    The directory of the compiled templates is created with mode 0700.
+    """
+
+    DIRNAME = "templates_bytecode"
+
+    def __init__(self, cache_dir):
+        directory = os.path.join(cache_dir, self.DIRNAME)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory, 0o700)
+            except OSError as e:
+                logging.debug("Error while creating the templates bytecode "
+                              "cache directory {}: {}".format(directory,
+                                                              str(e)))
+        FileSystemBytecodeCache.__init__(self, directory)
+
+    def get_source_checksum(self, source):
+        return ConfigParserProgram.get_fingerprint(source.encode("utf-8"))
+
+    def load_bytecode(self, bucket):
+        try:
+            FileSystemBytecodeCache.load_bytecode(self, bucket)
+        except Exception as e:
+            logging.debug("Error while loading the compiled template "
+                          "{}: {}".format(bucket.key, str(e)))
+            bucket.reset()
+            return
+        if bucket.code is not None:
+            touch_cache_entry(self._get_cache_filename(bucket))
+
+    def dump_bytecode(self, bucket):
+        # The cache is shared with the other builds that may be running:
+        # files are replaced atomically. A failure is not fatal, the
+        # template will be compiled again the next time.
+        path = self._get_cache_filename(bucket)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                bucket.write_bytecode(f)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            logging.debug("Error while saving the compiled template "
+                          "{}: {}".format(bucket.key, str(e)))
+
+class TemplatesBundle(object):
+    """Templates of a directory, compiled into a bundle of Python modules
+
+    The bundle is a zip file of Python modules, one for each template
+    (see jinja2.ModuleLoader), which is stored in the cache directory
+    along with the fingerprints of the templates it has been built
+    from: it's used only as long as the templates have not changed
+    since then.
+
+    Like the compiled templates of TemplatesBytecodeCache, bundles are
+    Python code that is run by the builds; their directory is created
+    with mode 0700.
+    """
+
+    DIRNAME = "templates_bundles"
+
+    def __init__(self, cache_dir, template_dir):
+        self.template_dir = template_dir
+
+        name = hashlib.sha256(
+            os.path.abspath(template_dir).encode("utf-8")
+        ).hexdigest()[:16]
+        self.dir = os.path.join(cache_dir, self.DIRNAME)
+        self.path = os.path.join(self.dir, "{}.zip".format(name))
+        self.fingerprints_path = os.path.join(
+            self.dir, "{}.{}".format(name,
+                                     ConfigParserProgram.FINGERPRINTS_FILENAME)
+        )
+
+    def _get_fingerprints(self):
+        return ConfigParserProgram.calculate_fingerprints(self.template_dir)
+
+    def is_valid(self):
+        if not os.path.isfile(self.path) or \
+            not os.path.isfile(self.fingerprints_path):
+            return False
+        try:
+            fps = ConfigParserProgram.load_fingerprints_from_file(
+                self.fingerprints_path)
+        except Exception as e:
+            logging.debug("Error while reading the fingerprints of "
+                          "the templates bundle {}: {}".format(
+                              self.fingerprints_path, str(e)))
+            return False
+        return fps == self._get_fingerprints()
+
+    def get_loader(self):
+        """Loader for the compiled templates, or None if the bundle is
+        not available or if templates have changed since it has been
+        built."""
+        if not os.path.isfile(self.path):
+            return None
+        if not self.is_valid():
+            logging.warning("The compiled templates bundle for {} is out "
+                            "of date: templates are compiled from source. "
+                            "Run 'arouteserver compile-templates' to "
+                            "build it again.".format(self.template_dir))
+            return None
+        touch_cache_entry(self.path)
+        touch_cache_entry(self.fingerprints_path)
+        return ModuleLoader(self.path)
+
+    def build(self, env):
+        """Compile the templates of the directory.
+
+        Args:
+            env: the jinja2.Environment used to render them, with a
+                FileSystemLoader for the template directory.
+        """
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir, 0o700)
+
+        # Fingerprints are taken before compiling the templates, so
+        # that those changed in the meantime are not trusted.
+        fps = self._get_fingerprints()
+
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        env.compile_templates(tmp_path, zip="stored", ignore_errors=False,
+                              py_compile=True)
+        os.rename(tmp_path, self.path)
+
+        with open(self.fingerprints_path, "w") as f:
+            yaml.safe_dump(fps, f, default_flow_style=False)
+
+CacheDir.register_entries_dir(TemplatesBytecodeCache.DIRNAME,
+                              "compiled templates")
+CacheDir.register_entries_dir(TemplatesBundle.DIRNAME,
+                              "compiled templates bundles")
@@ -0,0 +1,111 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Serialization of the (possibly huge) lists of prefixes and ASNs into
+# the syntax of the BGP speakers, used by the templates in place of
+# Jinja2 loops: the output is the same that the loops would produce.
+#
+# Prefix list entries can be both dicts, as returned by
+# ValidatorPrefixListEntry, and PrefixListEntry objects.
+
+
+def _filter_ip_ver(prefix_list, ip_ver):
+    # Prefixes have already been validated: the address family can
+    # be told without parsing them again.
+    if not ip_ver:
+        return prefix_list
+    is_ipv6 = ip_ver == 6
+    return [entry for entry in prefix_list
+            if (":" in entry["prefix"]) == is_ipv6]
+
+def _format_bird_prefix(entry):
+    if entry["exact"]:
+        return "{}/{}".format(entry["prefix"], entry["length"])
+    return "{}/{}{{{},{}}}".format(
+        entry["prefix"], entry["length"],
+        entry["ge"] or entry["length"],
+        entry["le"] or entry["max_length"]
+    )
+
+def bird_prefix_list(prefix_list, ip_ver=None, group=False):
+    """BIRD prefix set, entries only.
+
+    Args:
+        prefix_list (list): prefix list entries.
+
+        ip_ver (int): when set, only entries of this IP version are
+            used.
+
+        group (bool): when True, entries are grouped 4 per line;
+            otherwise, each entry is on its own line, preceded by its
+            comment.
+    """
+    if not prefix_list:
+        return ""
+
+    entries = _filter_ip_ver(prefix_list, ip_ver)
+
+    if not group:
+        return ",\n\n".join(
+            "\t\t# {}\n\t\t{}".format(entry["comment"],
+                                      _format_bird_prefix(entry))
+            for entry in entries
+        )
+
+    lines = []
+    for i in range(0, len(entries), 4):
+        lines.append(", ".join(
+            "\t" + _format_bird_prefix(entry)
+            for entry in entries[i:i + 4]
+        ))
+    return ",\n".join(lines)
+
+def bird_asn_list(asns):
+    """BIRD set of ASNs, entries only, 5 per line."""
+    asns = [str(asn) for asn in asns]
+    lines = []
+    for i in range(0, len(asns), 5):
+        lines.append(", ".join(asns[i:i + 5]))
+    res = "\t" + ", \n\t".join(lines)
+    if asns and len(asns) % 5 == 0:
+        res += "\n\t"
+    return res
+
+def _format_openbgpd_prefix(entry):
+    if entry["exact"]:
+        return "{}/{}".format(entry["prefix"], entry["length"])
+    return "{}/{} prefixlen {} - {}".format(
+        entry["prefix"], entry["length"],
+        entry["ge"] or entry["length"],
+        entry["le"] or entry["max_length"]
+    )
+
+def openbgpd_prefix_list(prefix_list, ip_ver=None):
+    """OpenBGPD list of prefixes, entries only.
+
+    Args:
+        prefix_list (list): prefix list entries.
+
+        ip_ver (int): when set, only entries of this IP version are
+            used.
+    """
+    return ", ".join(
+        _format_openbgpd_prefix(entry)
+        for entry in _filter_ip_ver(prefix_list, ip_ver)
+    )
+
+def openbgpd_asn_list(asns):
+    """OpenBGPD list of ASNs, entries only."""
+    return ", ".join(str(asn) for asn in asns)
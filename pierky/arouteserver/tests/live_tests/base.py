@@ -24,6 +24,7 @@ from docker import InstanceError
 from pierky.arouteserver.config.validators import ValidatorPrefixListEntry
 from pierky.arouteserver.enrichers.irrdb import IRRDBConfigEnricher_OriginASNs, \
                                                 IRRDBConfigEnricher_Prefixes
+from pierky.arouteserver.prefix_list import PrefixListEntry
 from pierky.arouteserver.tests.base import ARouteServerTestCase
 from pierky.arouteserver.tests.mock_peeringdb import mock_peering_db
 from pierky.arouteserver.tests.live_tests.instances import BGPSpeakerInstance
@@ -280,11 +281,13 @@ class LiveScenario(ARouteServerTestCase):
         def add_prefix_to_list(prefix_name, lst):
             obj = ipaddr.IPNetwork(cls.DATA[prefix_name])
             lst.append(
-                ValidatorPrefixListEntry().validate({
-                    "prefix": str(obj.ip),
-                    "length": obj.prefixlen,
-                    "comment": prefix_name
-                })
+                PrefixListEntry.from_dict(
+                    ValidatorPrefixListEntry().validate({
+                        "prefix": str(obj.ip),
+                        "length": obj.prefixlen,
+                        "comment": prefix_name
+                    })
+                )
             )
 
         def _mock_ASSet(self):
@@ -0,0 +1,144 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pierky.arouteserver.builder import OpenBGPDConfigBuilder, BIRDConfigBuilder
+from pierky.arouteserver.tests.live_tests.base import LiveScenario
+
+class PruneIRRDBScenario(LiveScenario):
+    __test__ = False
+
+    MODULE_PATH = __file__
+    RS_INSTANCE_CLASS = None
+    CLIENT_INSTANCE_CLASS = None
+    CONFIG_BUILDER_CLASS = None
+
+    PRUNE_IRRDB_PREFIXES = None
+    TOO_LONG_REJECT_REASON = None
+
+    AS_SET = {
+        "AS-AS2": [2],
+    }
+    R_SET = {
+        "AS-AS2": [
+            "AS2_allowed_prefixes",
+            "AS2_bogons",
+            "AS2_blacklisted",
+        ]
+    }
+
+    @classmethod
+    def _setup_instances(cls):
+        cls.INSTANCES = [
+            cls._setup_rs_instance(),
+
+            cls.CLIENT_INSTANCE_CLASS(
+                "AS2",
+                cls.DATA["AS2_1_IPAddress"],
+                [
+                    (
+                        cls.build_other_cfg("AS2.j2"),
+                        "/etc/bird/bird.conf"
+                    )
+                ],
+            ),
+        ]
+
+    def set_instance_variables(self):
+        self.rs = self._get_instance_by_name("rs")
+        self.AS2 = self._get_instance_by_name("AS2")
+
+    def test_010_setup(self):
+        """{}: instances setup"""
+        pass
+
+    def test_020_sessions_up(self):
+        """{}: sessions are up"""
+        self.session_is_up(self.rs, self.AS2)
+
+    def test_030_good_prefix(self):
+        """{}: good prefix"""
+        self.receive_route(self.rs, self.DATA["AS2_good1"], self.AS2,
+                           as_path="2", next_hop=self.AS2)
+
+    def test_030_too_long_prefix(self):
+        """{}: prefix too long"""
+        # Without pruning, the route is authorized by the AS-SET and
+        # then it is rejected by the prefix length check; with pruning,
+        # the lengths that are not accepted are removed from the
+        # AS-SET prefix list, so the IRRDB check rejects the route.
+        self.receive_route(self.rs, self.DATA["AS2_too_long1"], self.AS2,
+                           as_path="2", next_hop=self.AS2,
+                           filtered=True,
+                           reject_reason=self.TOO_LONG_REJECT_REASON)
+
+    def test_030_bogon(self):
+        """{}: bogon prefix"""
+        self.receive_route(self.rs, self.DATA["AS2_bogon1"], self.AS2,
+                           as_path="2", next_hop=self.AS2,
+                           filtered=True, reject_reason=2)
+
+    def test_030_global_blacklist(self):
+        """{}: prefix in global blacklist"""
+        self.receive_route(self.rs, self.DATA["AS2_blacklist1"], self.AS2,
+                           as_path="2", next_hop=self.AS2,
+                           filtered=True, reject_reason=3)
+
+class PruneIRRDBScenario_NotPruned(object):
+
+    PRUNE_IRRDB_PREFIXES = False
+    TOO_LONG_REJECT_REASON = 13
+
+class PruneIRRDBScenario_Pruned(object):
+
+    PRUNE_IRRDB_PREFIXES = True
+    TOO_LONG_REJECT_REASON = 12
+
+class PruneIRRDBScenarioBIRD(PruneIRRDBScenario):
+    __test__ = False
+
+    CONFIG_BUILDER_CLASS = BIRDConfigBuilder
+
+    @classmethod
+    def _setup_rs_instance(cls):
+        return cls.RS_INSTANCE_CLASS(
+            "rs",
+            cls.DATA["rs_IPAddress"],
+            [
+                (
+                    cls.build_rs_cfg("bird", "main.j2", "rs.conf", cls.IP_VER,
+                                     prune_irrdb_prefixes=cls.PRUNE_IRRDB_PREFIXES),
+                    "/etc/bird/bird.conf"
+                )
+            ]
+        )
+
+class PruneIRRDBScenarioOpenBGPD(PruneIRRDBScenario):
+    __test__ = False
+
+    CONFIG_BUILDER_CLASS = OpenBGPDConfigBuilder
+
+    @classmethod
+    def _setup_rs_instance(cls):
+        return cls.RS_INSTANCE_CLASS(
+            "rs",
+            cls.DATA["rs_IPAddress"],
+            [
+                (
+                    cls.build_rs_cfg("openbgpd", "main.j2", "rs.conf", None,
+                                     prune_irrdb_prefixes=cls.PRUNE_IRRDB_PREFIXES),
+                    "/etc/bgpd.conf"
+                )
+            ]
+        )
@@ -0,0 +1,31 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+class PruneIRRDBScenario_Data4(object):
+
+    DATA = {
+        "rs_IPAddress":                     "192.0.2.2",
+        "AS2_1_IPAddress":                  "192.0.2.21",
+
+        "AS2_allowed_prefixes":             "2.0.0.0/16",
+        "AS2_good1":                        "2.0.1.0/24",
+        "AS2_too_long1":                    "2.0.2.0/25",
+
+        "AS2_bogons":                       "10.0.0.0/16",
+        "AS2_bogon1":                       "10.0.1.0/24",
+
+        "AS2_blacklisted":                  "2.0.128.0/20",
+        "AS2_blacklist1":                   "2.0.128.0/24",
+    }
@@ -0,0 +1,31 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+class PruneIRRDBScenario_Data6(object):
+
+    DATA = {
+        "rs_IPAddress":                     "2001:db8:1:1::2",
+        "AS2_1_IPAddress":                  "2001:db8:1:1::21",
+
+        "AS2_allowed_prefixes":             "2a02:0::/32",
+        "AS2_good1":                        "2a02:0:1::/48",
+        "AS2_too_long1":                    "2a02:0:2::/49",
+
+        "AS2_bogons":                       "2001:db8:ff00::/40",
+        "AS2_bogon1":                       "2001:db8:ff00::/48",
+
+        "AS2_blacklisted":                  "2a02:0:8000::/36",
+        "AS2_blacklist1":                   "2a02:0:8000::/48",
+    }
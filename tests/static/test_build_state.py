@@ -0,0 +1,180 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from .test_cached_objects import DummyCachedObject
+from pierky.arouteserver.build_state import BuildState, EnrichmentResults
+from pierky.arouteserver.cached_objects import memory_cache
+from pierky.arouteserver.prefix_list import PrefixListEntry
+
+
+def get_client(ip, asn, limit=None):
+    return {
+        "ip": ip,
+        "asn": asn,
+        "id": "AS{}_1".format(asn),
+        "cfg": {"filtering": {"max_prefix": {"limit_ipv4": limit}}}
+    }
+
+class TestBuildState(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        memory_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        memory_cache.clear()
+
+    def _get_state(self, clients, as_sets=None):
+        state = BuildState(self.cache_dir, "test")
+        for client in clients:
+            state.add_client(client)
+        for client in clients:
+            state.set_client_as_sets(client["ip"],
+                                     (as_sets or {}).get(client["ip"], []))
+        return state
+
+    def test_clients_diff(self):
+        """Build state: clients added, removed and changed"""
+        clients = [get_client("192.0.2.1", 1),
+                   get_client("192.0.2.2", 2),
+                   get_client("192.0.2.3", 3)]
+        state = self._get_state(clients)
+        self.assertIsNone(state.get_clients_diff())
+        state.save()
+
+        state = self._get_state(clients)
+        self.assertEqual(state.get_clients_diff(),
+                         {"added": [], "removed": [], "changed": []})
+        state.save()
+
+        clients = [get_client("192.0.2.1", 1),
+                   get_client("192.0.2.2", 2, limit=10),
+                   get_client("192.0.2.4", 4)]
+        state = self._get_state(clients,
+                                as_sets={"192.0.2.1": ["AS-ONE"]})
+        self.assertEqual(state.get_clients_diff(),
+                         {"added": ["192.0.2.4"],
+                          "removed": ["192.0.2.3"],
+                          "changed": ["192.0.2.1", "192.0.2.2"]})
+
+    def _get_result(self, results, key, fp):
+        entry = results.get(key, fp)
+        return entry["data"] if entry else None
+
+    def test_results(self):
+        """Build state: enrichment results reused"""
+        results = EnrichmentResults(self.cache_dir, 3600)
+        obj = DummyCachedObject("a", [1, 2], cache_dir=self.cache_dir)
+        results.set("a", "fp", obj.raw_data, [obj])
+        # Not in the cache: not saved.
+        obj = DummyCachedObject("b", [], cache_dir=self.cache_dir)
+        results.set("b", "fp", obj.raw_data, [obj])
+        self.assertEqual(results.computed, 2)
+        results.save()
+
+        results = EnrichmentResults(self.cache_dir, 3600)
+        self.assertEqual(self._get_result(results, "a", "fp"), [1, 2])
+        self.assertIsNone(self._get_result(results, "a", "other_fp"))
+        self.assertIsNone(self._get_result(results, "b", "fp"))
+        self.assertEqual(results.reused, 1)
+        results.save()
+
+        # Still there, even if it has been reused only.
+        results = EnrichmentResults(self.cache_dir, 3600)
+        self.assertEqual(self._get_result(results, "a", "fp"), [1, 2])
+
+        # Kept, even if not used by the previous build.
+        results = EnrichmentResults(self.cache_dir, 3600)
+        obj = DummyCachedObject("c", [3], cache_dir=self.cache_dir)
+        results.set("c", "fp", obj.raw_data, [obj])
+        results.save()
+        results = EnrichmentResults(self.cache_dir, 3600)
+        self.assertEqual(self._get_result(results, "a", "fp"), [1, 2])
+        self.assertEqual(self._get_result(results, "c", "fp"), [3])
+
+        # Expired.
+        results = EnrichmentResults(self.cache_dir, 0)
+        self.assertIsNone(self._get_result(results, "a", "fp"))
+
+        # Cached data changed.
+        obj = DummyCachedObject("a", [3, 4, 5], cache_dir=self.cache_dir,
+                                cache_expiry=0)
+        results = EnrichmentResults(self.cache_dir, 3600)
+        self.assertIsNone(self._get_result(results, "a", "fp"))
+
+        # Cached data removed.
+        results = EnrichmentResults(self.cache_dir, 3600)
+        os.remove(os.path.join(self.cache_dir, "c.json"))
+        self.assertIsNone(self._get_result(results, "c", "fp"))
+
+    def test_results_json(self):
+        """Build state: enrichment results saved as JSON"""
+        prefixes = [
+            PrefixListEntry("10.0.0.0", 8, 32, False, 8, 24, "AS-A"),
+            PrefixListEntry("192.168.0.0", 16, 32, True, None, None, "AS-A")
+        ]
+        results = EnrichmentResults(self.cache_dir, 3600)
+        obj = DummyCachedObject("a", [1], cache_dir=self.cache_dir)
+        results.set(("r_set", "AS-A", 4), "fp", prefixes, [obj])
+        results.set(("as_set", "AS-A"), "fp", [1, 2], [obj])
+        results.set(("peeringdb_net", 1, 4), "fp", None, [obj])
+        results.save()
+
+        with open(os.path.join(self.cache_dir, BuildState.DIRNAME,
+                               EnrichmentResults.FILENAME), "r") as f:
+            self.assertIn("results", json.load(f))
+
+        results = EnrichmentResults(self.cache_dir, 3600)
+        data = self._get_result(results, ("r_set", "AS-A", 4), "fp")
+        self.assertEqual(data, prefixes)
+        self.assertTrue(all(isinstance(entry, PrefixListEntry)
+                            for entry in data))
+        self.assertEqual(self._get_result(results, ("as_set", "AS-A"), "fp"),
+                         [1, 2])
+        self.assertIsNone(
+            self._get_result(results, ("peeringdb_net", 1, 4), "fp")
+        )
+        self.assertEqual(results.reused, 3)
+
+    def test_results_in_memory(self):
+        """Build state: enrichment results shared in memory"""
+        results = EnrichmentResults()
+        obj = DummyCachedObject("b", [], cache_dir=self.cache_dir)
+        results.set("b", "fp", [1], [obj])
+        self.assertEqual(self._get_result(results, "b", "fp"), [1])
+        self.assertIsNone(self._get_result(results, "b", "other_fp"))
+        results.save()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.cache_dir, BuildState.DIRNAME)
+        ))
+
+    def test_results_pickle(self):
+        """Build state: enrichment results copied to other processes"""
+        # MultiTargetBuilder's workers get a pickled copy of the
+        # results when the spawn start method is used.
+        results = EnrichmentResults()
+        obj = DummyCachedObject("b", [], cache_dir=self.cache_dir)
+        results.set("b", "fp", [1], [obj])
+        results = pickle.loads(pickle.dumps(results))
+        self.assertEqual(self._get_result(results, "b", "fp"), [1])
+        self.assertEqual(results.reused, 1)
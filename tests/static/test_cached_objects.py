@@ -0,0 +1,346 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pierky.arouteserver.cached_objects import CachedObject, CacheDir, \
+                                              CacheStats, CircuitBreaker, \
+                                              FetchDeadline, MemoryCache, \
+                                              memory_cache, touch_cache_entry
+# Components that keep their entries in the cache directory.
+from pierky.arouteserver import build_state, templates_cache
+from pierky.arouteserver.config import base
+from pierky.arouteserver.errors import CachedObjectsError, \
+                                      ARouteServerError
+
+
+class DummyCachedObject(CachedObject):
+
+    def __init__(self, name, data=None, **kwargs):
+        CachedObject.__init__(self, **kwargs)
+        self.name = name
+        self.data = data
+        self.fetched = False
+        self.load_data()
+
+    def _get_object_filename(self):
+        return "{}.json".format(self.name)
+
+    def _get_data(self):
+        self.fetched = True
+        return self.data
+
+
+class FailingCachedObject(DummyCachedObject):
+
+    RETRY_BACKOFF_BASE = 0.01
+
+    def __init__(self, name, data=None, failures=1, **kwargs):
+        self.failures = failures
+        self.attempts = 0
+        DummyCachedObject.__init__(self, name, data, **kwargs)
+
+    def _get_data(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ARouteServerError("transient error")
+        return DummyCachedObject._get_data(self)
+
+
+class TestCacheDir(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def add_entry(self, key, age, size=100):
+        path = os.path.join(self.cache_dir, key)
+        ts = int(time.time()) - age
+        with open(path, "w") as f:
+            f.write(json.dumps({"ts": ts, "data": "x" * size}))
+        os.utime(path, (ts, ts))
+
+    def test_entries(self):
+        """Cache dir: entries and stats"""
+        self.add_entry("a.json", 10)
+        self.add_entry("b.json", 50000)
+        with open(os.path.join(self.cache_dir, "write_test"), "w") as f:
+            f.write("OK")
+
+        cache_dir = CacheDir(self.cache_dir, 43200)
+        self.assertEqual([e["key"] for e in cache_dir.get_entries()],
+                         ["b.json", "a.json"])
+
+        stats = cache_dir.get_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["unreferenced"], None)
+
+        entry = cache_dir.get_entry("b.json")
+        self.assertTrue(entry["expired"])
+        self.assertEqual(entry["data"], "x" * 100)
+
+    def test_gc_unreferenced(self):
+        """Cache dir: gc, unreferenced entries"""
+        self.add_entry("a.json", 10)
+        self.add_entry("b.json", 20)
+        self.add_entry("c.json", 30)
+
+        stats = CacheStats()
+        stats.hit("a.json")
+        stats.save(self.cache_dir, "build-ipv4")
+        stats.reset()
+        stats.miss("c.json")
+        stats.save(self.cache_dir, "build-ipv6")
+
+        cache_dir = CacheDir(self.cache_dir)
+        self.assertEqual(cache_dir.get_stats()["unreferenced"], 1)
+
+        evicted = cache_dir.gc(unreferenced=True, dry_run=True)
+        self.assertEqual([e["key"] for e in evicted], ["b.json"])
+        self.assertEqual(len(cache_dir.get_entries()), 3)
+
+        cache_dir.gc(unreferenced=True)
+        self.assertEqual([e["key"] for e in cache_dir.get_entries()],
+                         ["c.json", "a.json"])
+
+    def test_gc_max_size(self):
+        """Cache dir: gc, oldest entries first"""
+        self.add_entry("a.json", 10)
+        self.add_entry("b.json", 20)
+        self.add_entry("c.json", 30)
+
+        cache_dir = CacheDir(self.cache_dir)
+        entry_size = cache_dir.get_entries()[0]["size"]
+
+        evicted = cache_dir.gc(max_size=entry_size * 2)
+        self.assertEqual([e["key"] for e in evicted], ["c.json"])
+        self.assertEqual([e["key"] for e in cache_dir.get_entries()],
+                         ["b.json", "a.json"])
+
+    def add_dir_entry(self, dirname, filename, age, size=100):
+        dir_path = os.path.join(self.cache_dir, dirname)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        path = os.path.join(dir_path, filename)
+        ts = int(time.time()) - age
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (ts, ts))
+
+    def test_entries_dirs(self):
+        """Cache dir: entries in the subdirectories"""
+        self.add_entry("a.json", 10)
+        self.add_dir_entry("parsed_cfg", "general.json", 20)
+        self.add_dir_entry("templates_bundles", "x.zip", 50000, size=300)
+        self.add_dir_entry("unknown", "y", 30)
+
+        cache_dir = CacheDir(self.cache_dir, 43200)
+        self.assertEqual(
+            [(e["key"], e["dir"]) for e in cache_dir.get_entries()],
+            [(os.path.join("templates_bundles", "x.zip"),
+              "templates_bundles"),
+             (os.path.join("parsed_cfg", "general.json"), "parsed_cfg"),
+             ("a.json", None)]
+        )
+
+        stats = cache_dir.get_stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["expired"], 1)
+        dirs = dict((descr, (cnt, size))
+                    for descr, cnt, size in stats["dirs"])
+        self.assertEqual(dirs["parsed configurations"], (1, 100))
+        self.assertEqual(dirs["compiled templates bundles"], (1, 300))
+
+        # Only cached objects can be shown.
+        with self.assertRaisesRegexp(CachedObjectsError, "not found"):
+            cache_dir.get_entry(os.path.join("parsed_cfg", "general.json"))
+
+    def test_gc_dirs(self):
+        """Cache dir: gc, entries in the subdirectories"""
+        self.add_entry("a.json", 10)
+        self.add_dir_entry("parsed_cfg", "old.json", 50000)
+        self.add_dir_entry("parsed_cfg", "new.json", 20)
+        self.add_dir_entry("build_state", "state.json", 45000)
+
+        # Entries in the subdirectories are unreferenced when they
+        # have not been used within the cache expiry time, even when
+        # no stats are available for the cached objects.
+        cache_dir = CacheDir(self.cache_dir, 43200)
+        evicted = cache_dir.gc(unreferenced=True)
+        self.assertEqual(
+            sorted([e["key"] for e in evicted]),
+            [os.path.join("build_state", "state.json"),
+             os.path.join("parsed_cfg", "old.json")]
+        )
+        self.assertEqual([e["key"] for e in cache_dir.get_entries()],
+                         [os.path.join("parsed_cfg", "new.json"), "a.json"])
+
+        # Oldest entries first, whatever their kind.
+        self.add_dir_entry("templates_bytecode", "t.cache", 30000)
+        size = sum([e["size"] for e in cache_dir.get_entries()])
+        evicted = cache_dir.gc(max_size=size - 100)
+        self.assertEqual([e["key"] for e in evicted],
+                         [os.path.join("templates_bytecode", "t.cache")])
+
+    def test_touch(self):
+        """Cache dir: entries in the subdirectories are touched when used"""
+        self.add_dir_entry("parsed_cfg", "a.json", 50000)
+        touch_cache_entry(os.path.join(self.cache_dir, "parsed_cfg",
+                                       "a.json"))
+
+        cache_dir = CacheDir(self.cache_dir, 43200)
+        self.assertEqual(cache_dir.gc(unreferenced=True), [])
+
+class TestMemoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        memory_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        memory_cache.clear()
+
+    def test_lru(self):
+        """Memory cache: LRU eviction"""
+        cache = MemoryCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_in_front_of_disk_cache(self):
+        """Memory cache: objects are decoded only once"""
+        obj = DummyCachedObject("a", [1, 2], cache_dir=self.cache_dir)
+        self.assertTrue(obj.fetched)
+
+        # The file is not read anymore.
+        os.remove(os.path.join(self.cache_dir, "a.json"))
+
+        obj = DummyCachedObject("a", [3, 4], cache_dir=self.cache_dir)
+        self.assertFalse(obj.fetched)
+        self.assertEqual(obj.raw_data, [1, 2])
+
+        # Expired for this object: data are fetched again.
+        obj = DummyCachedObject("a", [3, 4], cache_dir=self.cache_dir,
+                                cache_expiry=0)
+        self.assertTrue(obj.fetched)
+        self.assertEqual(obj.raw_data, [3, 4])
+
+class TestFetchDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        memory_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        memory_cache.clear()
+
+    def test_timeout(self):
+        """Fetch deadline: timeouts capped to the remaining time"""
+        self.assertEqual(FetchDeadline().get_timeout(10), 10)
+        self.assertEqual(FetchDeadline().get_timeout(), None)
+        self.assertTrue(FetchDeadline(5).get_timeout(10) <= 5)
+        self.assertEqual(FetchDeadline(5).get_timeout(1), 1)
+
+    def test_expired(self):
+        """Fetch deadline: expired data or fail fast"""
+        DummyCachedObject("a", [1, 2], cache_dir=self.cache_dir)
+        memory_cache.clear()
+
+        deadline = FetchDeadline(1)
+        deadline.expires_at = time.time() - 1
+
+        obj = DummyCachedObject("a", [3, 4], cache_dir=self.cache_dir,
+                                cache_expiry=0, deadline=deadline)
+        self.assertFalse(obj.fetched)
+        self.assertEqual(obj.raw_data, [1, 2])
+
+        with self.assertRaises(CachedObjectsError):
+            DummyCachedObject("b", [3, 4], cache_dir=self.cache_dir,
+                              deadline=deadline)
+
+        self.assertEqual(deadline.stale, ["a.json"])
+        self.assertEqual(deadline.failed, ["b.json"])
+
+class TestRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        memory_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        memory_cache.clear()
+
+    def test_retries(self):
+        """Retries: transient errors"""
+        obj = FailingCachedObject("a", [1], failures=2, retries=2,
+                                  cache_dir=self.cache_dir)
+        self.assertEqual(obj.attempts, 3)
+        self.assertEqual(obj.raw_data, [1])
+
+        with self.assertRaises(ARouteServerError):
+            FailingCachedObject("b", [1], failures=3, retries=2,
+                                cache_dir=self.cache_dir)
+
+    def test_circuit_breaker(self):
+        """Retries: circuit breaker"""
+        DummyCachedObject("a", [1], cache_dir=self.cache_dir)
+        memory_cache.clear()
+
+        breaker = CircuitBreaker("test", threshold=2, reset_timeout=60)
+
+        for name in ("b", "c"):
+            with self.assertRaises(ARouteServerError):
+                FailingCachedObject(name, [1], failures=1,
+                                    circuit_breaker=breaker,
+                                    cache_dir=self.cache_dir)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # Breaker open: expired data are used, if any, without
+        # contacting the source.
+        obj = FailingCachedObject("a", [2], failures=0, cache_expiry=0,
+                                  circuit_breaker=breaker,
+                                  cache_dir=self.cache_dir)
+        self.assertEqual(obj.attempts, 0)
+        self.assertEqual(obj.raw_data, [1])
+
+        with self.assertRaises(CachedObjectsError):
+            FailingCachedObject("d", [2], failures=0,
+                                circuit_breaker=breaker,
+                                cache_dir=self.cache_dir)
+        self.assertEqual(breaker.stale, ["a.json"])
+        self.assertEqual(breaker.failed, ["d.json"])
+
+        # Half-open: a successful request closes it.
+        breaker.opened_at -= 60
+        obj = FailingCachedObject("e", [3], failures=0,
+                                  circuit_breaker=breaker,
+                                  cache_dir=self.cache_dir)
+        self.assertEqual(obj.raw_data, [3])
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
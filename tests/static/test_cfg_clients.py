@@ -13,12 +13,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import pickle
+import threading
+import time
 import unittest
 
 import yaml
 
 from .cfg_base import TestConfigParserBase 
-from pierky.arouteserver.config.clients import ConfigParserClients
+from pierky.arouteserver.config.clients import ConfigParserClients, \
+                                               ClientCfgView
 from pierky.arouteserver.config.general import ConfigParserGeneral
 
 
@@ -248,3 +256,118 @@ class TestConfigParserClients(TestConfigParserBase):
         self.assertIs(client["cfg"]["blackhole_filtering"]["announce_to_client"], True)
         client = self.cfg[2]
         self.assertIs(client["cfg"]["blackhole_filtering"]["announce_to_client"], False)
+
+    def test_cfg_views(self):
+        """{}: layered client configuration"""
+        general = ConfigParserGeneral()
+        general._load_from_yaml("\n".join([
+            "cfg:",
+            "  rs_as: 999",
+            "  router_id: 192.0.2.2",
+            "  filtering:",
+            "    max_prefix:",
+            "      action: restart"
+        ]))
+        general.parse()
+
+        self.cfg = ConfigParserClients(general_cfg=general)
+        self.cfg._load_from_yaml("\n".join([
+            "clients:",
+            "  - asn: 111",
+            "    ip:",
+            "      - '192.0.2.11'",
+            "      - '2001:db8:1:1::11'",
+            "    cfg:",
+            "      filtering:",
+            "        max_prefix:",
+            "          limit_ipv4: 10",
+        ]))
+        self.cfg.parse()
+
+        client4 = self.cfg[0]
+        client6 = self.cfg[1]
+
+        # Options set by the client and inherited from general cfg.
+        for client in (client4, client6):
+            max_prefix = client["cfg"]["filtering"]["max_prefix"]
+            self.assertEqual(max_prefix["limit_ipv4"], 10)
+            self.assertEqual(max_prefix["action"], "restart")
+            self.assertIsNone(max_prefix["limit_ipv6"])
+            self.assertEqual(
+                dict(max_prefix),
+                {"action": "restart", "peering_db": True,
+                 "limit_ipv4": 10, "limit_ipv6": None}
+            )
+            self.assertNotIn("test", client["cfg"])
+            with self.assertRaises(KeyError):
+                client["cfg"]["test"]
+
+        # Parsing the config again doesn't change it.
+        exp = [client["cfg"].to_dict() for client in self.cfg.cfg["clients"]]
+        self._contains_err()
+        self.assertEqual(
+            [client["cfg"].to_dict() for client in self.cfg.cfg["clients"]],
+            exp
+        )
+
+        # Changes are specific of each client.
+        client6["cfg"]["filtering"]["max_prefix"]["limit_ipv4"] = None
+        client6["cfg"]["filtering"]["irrdb"]["as_set_ids"] = ["AS_SET"]
+        self.assertIsNone(client6["cfg"]["filtering"]["max_prefix"]["limit_ipv4"])
+        self.assertEqual(client4["cfg"]["filtering"]["max_prefix"]["limit_ipv4"], 10)
+        self.assertEqual(client6["cfg"]["filtering"]["irrdb"]["as_set_ids"], ["AS_SET"])
+        self.assertNotIn("as_set_ids", client4["cfg"]["filtering"]["irrdb"])
+
+        # Same config after a pickle round trip.
+        cfg = pickle.loads(pickle.dumps(self.cfg.cfg, pickle.HIGHEST_PROTOCOL))
+        for idx in (0, 1):
+            self.assertEqual(cfg["clients"][idx]["cfg"],
+                             self.cfg[idx]["cfg"].to_dict())
+
+    def test_cfg_views_threads(self):
+        """{}: views changed by concurrent threads"""
+
+        class SlowMapping(Mapping):
+            # Threads that look up the general config switch while
+            # the nested views are being created.
+
+            def __init__(self, d):
+                self.d = d
+
+            def __getitem__(self, key):
+                time.sleep(0.05)
+                res = self.d[key]
+                return SlowMapping(res) if isinstance(res, dict) else res
+
+            def __iter__(self):
+                return iter(self.d)
+
+            def __len__(self):
+                return len(self.d)
+
+        layout = {"filtering": {"irrdb": {"as_set_ids": None},
+                                "max_prefix": {"limit_ipv4": None}}}
+        general = SlowMapping({"filtering": {"irrdb": {},
+                                             "max_prefix": {}}})
+        view = ClientCfgView({}, general, layout)
+
+        def set_as_set_ids():
+            view["filtering"]["irrdb"]["as_set_ids"] = ["AS_SET"]
+
+        def set_limit_ipv4():
+            view["filtering"]["max_prefix"]["limit_ipv4"] = 10
+
+        threads = [threading.Thread(target=set_as_set_ids),
+                   threading.Thread(target=set_limit_ipv4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(view["filtering"]["irrdb"]["as_set_ids"],
+                         ["AS_SET"])
+        self.assertEqual(view["filtering"]["max_prefix"]["limit_ipv4"], 10)
+        self.assertEqual(view._own, {"filtering": {
+            "irrdb": {"as_set_ids": ["AS_SET"]},
+            "max_prefix": {"limit_ipv4": 10}
+        }})
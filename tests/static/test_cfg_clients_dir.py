@@ -0,0 +1,223 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pierky.arouteserver.config.asns import ConfigParserASNS
+from pierky.arouteserver.config.base import ParsedConfigCache
+from pierky.arouteserver.config.clients import ConfigParserClients
+from pierky.arouteserver.config.general import ConfigParserGeneral
+from pierky.arouteserver.errors import ConfigError
+from pierky.arouteserver.tests.base import ARouteServerTestCase
+
+
+class CountingConfigParserClients(ConfigParserClients):
+
+    parsed = []
+
+    def parse(self):
+        if "clients" in self.cfg:
+            CountingConfigParserClients.parsed.append(
+                self.cfg["clients"][0]["asn"]
+            )
+        ConfigParserClients.parse(self)
+
+class TestClientsDir(ARouteServerTestCase):
+
+    NEED_TO_CAPTURE_LOG = True
+    SHORT_DESCR = "Clients config directory"
+
+    SINGLE_FILE = "\n".join([
+        "asns:",
+        "  AS65534:",
+        "    as_sets:",
+        "    - AS-ONE",
+        "  AS65535:",
+        "    as_sets:",
+        "    - AS-TWO",
+        "clients:",
+        "  - asn: 65534",
+        "    ip: 192.0.2.11",
+        "  - asn: 65533",
+        "    ip: 192.0.2.33",
+        "  - asn: 65535",
+        "    ip:",
+        "    - 192.0.2.22",
+        "    - 2001:db8::22",
+        "    cfg:",
+        "      passive: False",
+    ])
+
+    FRAGMENTS = {
+        "a.yml": "\n".join([
+            "asns:",
+            "  AS65534:",
+            "    as_sets:",
+            "    - AS-ONE",
+            "clients:",
+            "  - asn: 65534",
+            "    ip: 192.0.2.11",
+        ]),
+        "c.yaml": "\n".join([
+            "clients:",
+            "  - asn: 65535",
+            "    ip:",
+            "    - 192.0.2.22",
+            "    - 2001:db8::22",
+            "    cfg:",
+            "      passive: False",
+        ]),
+        "b.yml": "\n".join([
+            "asns:",
+            "  AS65535:",
+            "    as_sets:",
+            "    - AS-TWO",
+        ]),
+        "a2.yml": "\n".join([
+            "clients:",
+            "  - asn: 65533",
+            "    ip: 192.0.2.33"
+        ]),
+        "readme.txt": "not loaded",
+    }
+
+    def _setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(suffix="arouteserver_unittest")
+        self.cache = ParsedConfigCache(self.tmp_dir)
+
+        self.general = ConfigParserGeneral()
+        self.general.load("config.d/general.yml",
+                          parsed_cfg_cache=self.cache)
+
+        self.single_file_path = os.path.join(self.tmp_dir, "clients.yml")
+        with open(self.single_file_path, "w") as f:
+            f.write(self.SINGLE_FILE)
+
+        self.dir_path = os.path.join(self.tmp_dir, "clients")
+        os.mkdir(self.dir_path)
+        for filename in self.FRAGMENTS:
+            self._write(filename, self.FRAGMENTS[filename])
+
+        CountingConfigParserClients.parsed = []
+
+    def tearDown(self):
+        ARouteServerTestCase.tearDown(self)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, filename, doc):
+        with open(os.path.join(self.dir_path, filename), "w") as f:
+            f.write(doc)
+
+    def _load_clients(self, path, cache=False,
+                      cls=ConfigParserClients):
+        obj = cls(general_cfg=self.general)
+        obj.load(path, parsed_cfg_cache=self.cache if cache else None,
+                 deps=[self.general])
+        return obj
+
+    def test_010_same_cfg(self):
+        """{}: same config of single file"""
+        for cache in (False, True):
+            exp = self._load_clients(self.single_file_path)
+            res = self._load_clients(self.dir_path, cache=cache)
+            self.assertEqual(res.cfg, exp.cfg)
+
+            exp = ConfigParserASNS()
+            exp.load(self.single_file_path)
+            res = ConfigParserASNS()
+            res.load(self.dir_path,
+                     parsed_cfg_cache=self.cache if cache else None)
+            self.assertEqual(res.cfg, exp.cfg)
+
+    def test_020_dup_ip(self):
+        """{}: duplicate IP addresses in different files"""
+        self._write("e.yml", "\n".join([
+            "clients:",
+            "  - asn: 65532",
+            "    ip: 2001:db8::22",
+        ]))
+        with self.assertRaises(ConfigError):
+            self._load_clients(self.dir_path)
+        self.assertEqual(
+            self.logger_handler.msgs,
+            ["Duplicate IP address found: 2001:db8::22, in {} and {}.".format(
+                os.path.join(self.dir_path, "c.yaml"),
+                os.path.join(self.dir_path, "e.yml")
+            )]
+        )
+
+    def test_020_dup_asn(self):
+        """{}: duplicate ASNs in different files"""
+        self._write("e.yml", "\n".join([
+            "asns:",
+            "  AS65534:",
+            "    as_sets:",
+            "    - AS-THREE",
+        ]))
+        with self.assertRaises(ConfigError):
+            ConfigParserASNS().load(self.dir_path)
+        self.assertIn(
+            "Duplicate ASN found in 'asns' section: AS65534",
+            self.logger_handler.msgs[0]
+        )
+
+    def test_030_invalid_file(self):
+        """{}: error in one file"""
+        self._write("e.yml", "\n".join([
+            "clients:",
+            "  - asn: 65532",
+            "    ip: 192.0.2.444",
+        ]))
+        with self.assertRaises(ConfigError):
+            self._load_clients(self.dir_path)
+        self.assertEqual(
+            self.logger_handler.msgs[-1],
+            "One or more errors occurred while processing {}".format(
+                os.path.join(self.dir_path, "e.yml")
+            )
+        )
+
+    def test_040_incremental(self):
+        """{}: only changed files are parsed again"""
+        exp = self._load_clients(self.dir_path, cache=True,
+                                 cls=CountingConfigParserClients)
+        self.assertEqual(CountingConfigParserClients.parsed,
+                         [65534, 65533, 65535])
+
+        CountingConfigParserClients.parsed = []
+        res = self._load_clients(self.dir_path, cache=True,
+                                 cls=CountingConfigParserClients)
+        self.assertEqual(CountingConfigParserClients.parsed, [])
+        self.assertEqual(res.cfg, exp.cfg)
+        self.assertEqual(res.cache_key, exp.cache_key)
+
+        self._write("a2.yml", "\n".join([
+            "clients:",
+            "  - asn: 65533",
+            "    ip: 192.0.2.34"
+        ]))
+        res = self._load_clients(self.dir_path, cache=True,
+                                 cls=CountingConfigParserClients)
+        self.assertEqual(CountingConfigParserClients.parsed, [65533])
+        self.assertEqual(res.cfg["clients"][1]["ip"], "192.0.2.34")
+        self.assertNotEqual(res.cache_key, exp.cache_key)
+
+    def test_050_not_a_dir_cfg(self):
+        """{}: other configurations can't be split"""
+        with self.assertRaises(ConfigError):
+            ConfigParserGeneral().load(self.dir_path)
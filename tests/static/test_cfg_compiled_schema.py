@@ -0,0 +1,126 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from copy import deepcopy
+import unittest
+
+from pierky.arouteserver.config.base import ConfigParserBase, CompiledSchema
+from pierky.arouteserver.config.validators import *
+from pierky.arouteserver.errors import ConfigError
+from pierky.arouteserver.tests.base import ARouteServerTestCase
+
+
+class TestCompiledSchema(ARouteServerTestCase):
+
+    NEED_TO_CAPTURE_LOG = True
+    SHORT_DESCR = "Compiled schema"
+
+    SCHEMA = {
+        "asn": ValidatorASN(),
+        "ip": ValidatorIPAddr(),
+        "password": ValidatorText(mandatory=False),
+        "cfg": {
+            "passive": ValidatorBool(default=True),
+            "filtering": {
+                "max_prefix": {
+                    "action": ValidatorOption("action",
+                                              ("shutdown", "restart"),
+                                              mandatory=False),
+                },
+                "black_list_pref": ValidatorListOf(
+                    ValidatorPrefixListEntry, mandatory=False,
+                ),
+            },
+        },
+    }
+
+    def _validate(self, validate, cfg):
+        self.clear_log()
+        exception_raised = False
+        try:
+            validate(cfg)
+        except ConfigError:
+            exception_raised = True
+        return cfg, exception_raised, self.logger_handler.msgs[:]
+
+    def _compare(self, cfg):
+        compiled_schema = CompiledSchema(self.SCHEMA, "clients")
+
+        exp = self._validate(
+            lambda c: ConfigParserBase.validate(self.SCHEMA, c, "clients"),
+            deepcopy(cfg)
+        )
+        res = self._validate(compiled_schema.validate, deepcopy(cfg))
+
+        self.assertEqual(res, exp)
+        return res
+
+    def test_valid(self):
+        """{}: valid config"""
+        cfg, exception_raised, msgs = self._compare({
+            "asn": 65534, "ip": "192.0.2.11",
+            "cfg": {
+                "filtering": {
+                    "max_prefix": None,
+                    "black_list_pref": [{"prefix": "10.0.0.0",
+                                         "length": 8}],
+                },
+            },
+        })
+        self.assertFalse(exception_raised)
+        self.assertEqual(msgs, [])
+        self.assertEqual(cfg["cfg"]["passive"], True)
+        self.assertEqual(cfg["cfg"]["filtering"]["max_prefix"],
+                         {"action": None})
+
+    def test_empty(self):
+        """{}: empty config"""
+        self._compare(None)
+        cfg, exception_raised, msgs = self._compare({})
+        self.assertTrue(exception_raised)
+        self.assertEqual(len(msgs), 2)
+
+    def test_errors(self):
+        """{}: unknown statements and invalid values"""
+        cfg, exception_raised, msgs = self._compare({
+            "asn": "a", "ip": "192.0.2.11", "test": 1,
+            "cfg": {
+                "passive": "x",
+                "filtering": {
+                    "max_prefix": {"action": "test", "test": 2},
+                },
+            },
+        })
+        self.assertTrue(exception_raised)
+        self.assertIn("Unknown statement at 'clients' level: 'test'.", msgs)
+        self.assertIn("Error parsing 'asn' at 'clients' level - "
+                      "Invalid ASN: a.", msgs)
+
+    def test_nested_errors(self):
+        """{}: errors at nested levels"""
+        cfg, exception_raised, msgs = self._compare({
+            "asn": 65534, "ip": "192.0.2.11",
+            "cfg": {
+                "filtering": {
+                    "max_prefix": {"test": 1},
+                },
+            },
+        })
+        self.assertTrue(exception_raised)
+        self.assertEqual(
+            msgs,
+            ["Unknown statement at 'clients.cfg.filtering.max_prefix' "
+             "level: 'test'."]
+        )
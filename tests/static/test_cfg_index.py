@@ -0,0 +1,58 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from pierky.arouteserver.config.index import ConfigIndex
+
+
+class TestConfigIndex(unittest.TestCase):
+
+    CLIENTS = [
+        {"asn": 65534, "ip": "192.0.2.11", "id": "AS65534_1"},
+        {"asn": 65535, "ip": "192.0.2.22", "id": "AS65535_1"},
+        {"asn": 65534, "ip": "2001:db8::11", "id": "AS65534_2"},
+    ]
+
+    def test_clients(self):
+        """Config index: clients"""
+        index = ConfigIndex(self.CLIENTS)
+
+        self.assertIs(index.clients_by_ip["2001:db8::11"], self.CLIENTS[2])
+        self.assertIs(index.clients_by_id["AS65535_1"], self.CLIENTS[1])
+        self.assertEqual(index.get_clients_by_asn(65534),
+                         [self.CLIENTS[0], self.CLIENTS[2]])
+        self.assertEqual(index.get_clients_by_asn(65533), [])
+
+    def test_clients_by_asn_groupby(self):
+        """Config index: clients by ASN, same as groupby"""
+        index = ConfigIndex(self.CLIENTS)
+
+        by_asn = {}
+        for client in sorted(self.CLIENTS, key=lambda c: c["asn"]):
+            by_asn.setdefault(client["asn"], []).append(client)
+        self.assertEqual(index.clients_by_asn, by_asn)
+
+    def test_as_sets(self):
+        """Config index: AS-SETs"""
+        index = ConfigIndex(self.CLIENTS)
+
+        as_set = {"id": "AS_ONE", "name": "AS-ONE"}
+        index.add_as_set(as_set)
+        self.assertIs(index.get_as_set_by_name("AS-ONE"), as_set)
+        self.assertIsNone(index.get_as_set_by_name("AS-TWO"))
+
+        index.remove_as_set(as_set)
+        self.assertIsNone(index.get_as_set_by_name("AS-ONE"))
@@ -0,0 +1,262 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import yaml
+
+from pierky.arouteserver.builder import BIRDConfigBuilder, \
+                                       OpenBGPDConfigBuilder
+from pierky.arouteserver.config.base import ParsedConfigCache
+from pierky.arouteserver.config.clients import ConfigParserClients
+from pierky.arouteserver.config.general import ConfigParserGeneral
+from pierky.arouteserver.errors import ConfigError
+from pierky.arouteserver.prefix_list import PrefixListSafeDumper
+from pierky.arouteserver.tests.base import ARouteServerTestCase
+
+
+def not_parsed(*args, **kwargs):
+    raise AssertionError("Configuration parsed instead of loaded from cache")
+
+class CaptureWarnings(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self, level=logging.WARNING)
+        self.msgs = []
+
+    def emit(self, record):
+        if record.levelno == logging.WARNING:
+            self.msgs.append(record.getMessage())
+
+class TestParsedConfigCache(ARouteServerTestCase):
+
+    NEED_TO_CAPTURE_LOG = True
+    SHORT_DESCR = "Parsed config cache"
+
+    def _setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(suffix="arouteserver_unittest")
+        self.cache = ParsedConfigCache(self.tmp_dir)
+
+        self.general_path = os.path.join(self.tmp_dir, "general.yml")
+        shutil.copy("config.d/general.yml", self.general_path)
+        self.clients_path = os.path.join(self.tmp_dir, "clients.yml")
+        shutil.copy("config.d/clients.yml", self.clients_path)
+
+    def tearDown(self):
+        ARouteServerTestCase.tearDown(self)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _load(self, cls, path, cache=True, deps=None, hit=False, **kwargs):
+        obj = cls(**kwargs)
+        if hit:
+            obj._load_from_yaml = not_parsed
+            obj.parse = not_parsed
+        obj.load(path, parsed_cfg_cache=self.cache if cache else None,
+                 deps=deps)
+        return obj
+
+    def test_010_hit(self):
+        """{}: cache hit"""
+        exp = self._load(ConfigParserGeneral, self.general_path, cache=False)
+
+        res = self._load(ConfigParserGeneral, self.general_path)
+        self.assertEqual(res.cfg, exp.cfg)
+        self.assertIsNotNone(res.cache_key)
+
+        res = self._load(ConfigParserGeneral, self.general_path, hit=True)
+        self.assertEqual(res.cfg, exp.cfg)
+
+    def test_020_file_changed(self):
+        """{}: file changed"""
+        self._load(ConfigParserGeneral, self.general_path)
+
+        with open(self.general_path, "a") as f:
+            f.write("\n  rs_as: 65534\n")
+
+        res = self._load(ConfigParserGeneral, self.general_path)
+        self.assertEqual(res["rs_as"], 65534)
+
+        res = self._load(ConfigParserGeneral, self.general_path, hit=True)
+        self.assertEqual(res["rs_as"], 65534)
+
+    def test_030_invalid_cfg(self):
+        """{}: invalid configuration is not cached"""
+        with open(self.general_path, "a") as f:
+            f.write("\n  rs_as: 0\n")
+
+        for _ in range(2):
+            with self.assertRaises(ConfigError):
+                self._load(ConfigParserGeneral, self.general_path)
+
+    def test_040_warnings(self):
+        """{}: warnings are logged again"""
+        handler = CaptureWarnings()
+        logging.getLogger().addHandler(handler)
+        try:
+            self._load(ConfigParserGeneral, self.general_path)
+            exp = handler.msgs
+            handler.msgs = []
+            self._load(ConfigParserGeneral, self.general_path, hit=True)
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+        self.assertTrue(exp)
+        self.assertEqual(handler.msgs, exp)
+
+    def test_050_dependencies(self):
+        """{}: configuration that depends on another one"""
+        general = self._load(ConfigParserGeneral, self.general_path)
+        exp = self._load(ConfigParserClients, self.clients_path, cache=False,
+                         general_cfg=general)
+        self._load(ConfigParserClients, self.clients_path,
+                   deps=[general], general_cfg=general)
+        res = self._load(ConfigParserClients, self.clients_path,
+                         deps=[general], general_cfg=general, hit=True)
+        self.assertEqual(res.cfg, exp.cfg)
+        key = res.cache_key
+
+        # Key changes when the general configuration changes.
+        with open(self.general_path, "a") as f:
+            f.write("\n  rs_as: 65534\n")
+        general = self._load(ConfigParserGeneral, self.general_path)
+        res = self._load(ConfigParserClients, self.clients_path,
+                         deps=[general], general_cfg=general)
+        self.assertNotEqual(res.cache_key, key)
+
+        # Not cached when the general configuration has not been
+        # loaded using the cache.
+        general = self._load(ConfigParserGeneral, self.general_path,
+                             cache=False)
+        res = self._load(ConfigParserClients, self.clients_path,
+                         deps=[general], general_cfg=general)
+        self.assertIsNone(res.cache_key)
+
+    def test_060_general_overrides(self):
+        """{}: general configuration with overrides"""
+        overrides = {"rs_as": 65534, "filtering": {"max_as_path_len": 16}}
+        exp = self._load(ConfigParserGeneral, self.general_path)
+        res = self._load(ConfigParserGeneral, self.general_path,
+                         overrides=overrides)
+        self.assertEqual(res["rs_as"], 65534)
+        self.assertEqual(res["filtering"]["max_as_path_len"], 16)
+        self.assertEqual(res["filtering"]["next_hop_policy"],
+                         exp["filtering"]["next_hop_policy"])
+        self.assertNotEqual(res.cache_key, exp.cache_key)
+
+        # Both the variants are cached.
+        res = self._load(ConfigParserGeneral, self.general_path, hit=True)
+        self.assertEqual(res.cfg, exp.cfg)
+        res = self._load(ConfigParserGeneral, self.general_path, hit=True,
+                         overrides=overrides)
+        self.assertEqual(res["rs_as"], 65534)
+
+    def test_070_clients_other_general(self):
+        """{}: clients configuration shared by general configurations"""
+        general = self._load(ConfigParserGeneral, self.general_path)
+        res = self._load(ConfigParserClients, self.clients_path,
+                         general_cfg=general)
+        self.assertFalse(res.cfg["clients"][0]["cfg"]["prepend_rs_as"])
+
+        general = self._load(ConfigParserGeneral, self.general_path,
+                             overrides={"prepend_rs_as": True})
+        res = self._load(ConfigParserClients, self.clients_path, hit=True,
+                         general_cfg=general)
+        self.assertTrue(res.cfg["clients"][0]["cfg"]["prepend_rs_as"])
+
+    def _write_cached_object(self, filename, data):
+        with open(os.path.join(self.tmp_dir, filename), "w") as f:
+            json.dump({"ts": int(time.time()), "data": data}, f)
+
+    def test_080_same_output(self):
+        """{}: same output with and without the cache"""
+        # Clients' external data are taken from the cache.
+        with open(self.clients_path, "w") as f:
+            f.write(
+                "clients:\n"
+                "  - asn: 3333\n"
+                "    ip: [\"192.0.2.11\", \"2001:db8:1:1::11\"]\n"
+                "    cfg:\n"
+                "      filtering:\n"
+                "        max_prefix:\n"
+                "          peering_db: False\n"
+            )
+        self._write_cached_object("AS3333-as_set.json", [3333])
+        for ip_ver, prefix in ((4, "193.0.0.0"), (6, "2001:67c:2e8::")):
+            self._write_cached_object(
+                "AS3333-r_set-ipv{}.json".format(ip_ver),
+                [{"prefix": prefix, "length": 21 if ip_ver == 4 else 48,
+                  "max_length": 32 if ip_ver == 4 else 128, "exact": False,
+                  "ge": None, "le": None, "comment": "AS3333"}]
+            )
+
+        # The general configuration of the 'rich' example sets all the
+        # BGP communities, that are iterated by the templates.
+        for builder_class, tpl_dir, ip_ver in (
+            (BIRDConfigBuilder, "bird", 4),
+            (BIRDConfigBuilder, "bird", 6),
+            (OpenBGPDConfigBuilder, "openbgpd", None)
+        ):
+            res = []
+            # Without the cache, then saving and loading the entries.
+            for cache_parsed_cfg in (False, True, True):
+                builder = builder_class(
+                    template_dir="templates/{}".format(tpl_dir),
+                    template_name="main.j2",
+                    cache_dir=self.tmp_dir,
+                    cache_parsed_cfg=cache_parsed_cfg,
+                    ip_ver=ip_ver,
+                    ignore_errors=["*"],
+                    cfg_general="examples/rich/general.yml",
+                    cfg_clients=self.clients_path,
+                    cfg_bogons="config.d/bogons.yml"
+                )
+                res.append(builder.render_template())
+            self.assertEqual(res[1], res[0])
+            self.assertEqual(res[2], res[0])
+
+    def test_090_json(self):
+        """{}: entries saved as JSON"""
+        general = self._load(ConfigParserGeneral, self.general_path)
+        exp = self._load(ConfigParserClients, self.clients_path,
+                         general_cfg=general)
+        for filename in os.listdir(self.cache.dir):
+            with open(os.path.join(self.cache.dir, filename), "r") as f:
+                self.assertTrue(json.load(f)["cfg"])
+
+        # Entries are loaded by a new cache, from the files.
+        self.cache = ParsedConfigCache(self.tmp_dir)
+        res = self._load(ConfigParserClients, self.clients_path,
+                         general_cfg=general, hit=True)
+        self.assertEqual(res.cfg, exp.cfg)
+
+    def test_100_keys_order(self):
+        """{}: same keys order with and without the cache"""
+        exp = self._load(ConfigParserGeneral, self.general_path, cache=False)
+        self._load(ConfigParserGeneral, self.general_path)
+
+        self.cache = ParsedConfigCache(self.tmp_dir)
+        res = self._load(ConfigParserGeneral, self.general_path, hit=True)
+        self.assertEqual(list(res.cfg["cfg"]["communities"]),
+                         list(exp.cfg["cfg"]["communities"]))
+        self.assertEqual(
+            yaml.dump(res.cfg, Dumper=PrefixListSafeDumper),
+            yaml.dump(exp.cfg, Dumper=PrefixListSafeDumper)
+        )
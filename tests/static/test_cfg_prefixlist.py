@@ -13,11 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from copy import deepcopy
 import unittest
 
 import yaml
 
-from pierky.arouteserver.config.validators import ValidatorPrefixListEntry
+from pierky.arouteserver.config.validators import ValidatorPrefixListEntry, \
+                                                 ValidatorPrefixListEntries
 from pierky.arouteserver.errors import ConfigError
 
 
@@ -132,3 +134,55 @@ class TestPrefixList(unittest.TestCase):
         self.v["ge"] = 32
         self.v["le"] = 32
         self._match("192.168.0.0", 16, False, 32, 32, "test")
+
+class TestPrefixListBulk(unittest.TestCase):
+
+    ENTRIES = [
+        {"prefix": "192.0.2.0", "length": 24},
+        {"prefix": u"192.0.2.0", "length": 24, "comment": u"AS-FOO"},
+        {"prefix": "10.0.0.0", "length": 8, "le": 24, "exact": False},
+        {"prefix": "10.0.0.0", "length": 8, "ge": 16, "le": 24},
+        {"prefix": "10.0.0.0", "length": 8, "ge": 0, "le": None},
+        {"prefix": "0.0.0.0", "length": 0, "exact": True},
+        {"prefix": "10.0.0.0", "length": "8"},
+        {"prefix": "10.0.0.0", "length": 8, "exact": "yes"},
+        {"prefix": "10.0.0.0", "length": 8, "max_length": 1},
+        {"prefix": "2001:db8::", "length": 32},
+        {"prefix": "2001:0DB8:0:0:1:0:0:1", "length": 128},
+        {"prefix": "2001:db8:0:1:1:1:1:1", "length": 64, "le": 128},
+        {"prefix": "::", "length": 0},
+        {"prefix": "::ffff:192.0.2.1", "length": 128},
+        {"prefix": "fe80::1:0:0:0", "length": 64},
+    ]
+
+    BAD_ENTRIES = [
+        {"prefix": "192.0.2.0", "length": 33},
+        {"prefix": "192.0.02.0", "length": 24},
+        {"prefix": "192.0.2.256", "length": 24},
+        {"prefix": "2001:db8:::", "length": 32},
+        {"prefix": "2001:db8::", "length": 32, "ge": 24},
+        {"prefix": "10.0.0.0", "length": 8, "ge": 24, "le": 16},
+        {"prefix": "10.0.0.0", "length": 8, "le": 24, "exact": True},
+        {"prefix": "10.0.0.0", "length": 8, "a": 1},
+        {"prefix": "10.0.0.0"},
+    ]
+
+    def test_same_output(self):
+        """Prefix list bulk validator: same output of per-entry validator"""
+        exp = [ValidatorPrefixListEntry().validate(entry)
+               for entry in deepcopy(self.ENTRIES)]
+        res = ValidatorPrefixListEntries().validate(deepcopy(self.ENTRIES))
+        self.assertEqual(res, exp)
+        for exp_entry, res_entry in zip(exp, res):
+            for prop in exp_entry:
+                self.assertEqual(type(res_entry[prop]),
+                                 type(exp_entry[prop]))
+
+    def test_same_errors(self):
+        """Prefix list bulk validator: same errors of per-entry validator"""
+        for entry in self.BAD_ENTRIES:
+            with self.assertRaises(ConfigError) as exp:
+                ValidatorPrefixListEntry().validate(deepcopy(entry))
+            with self.assertRaises(ConfigError) as res:
+                ValidatorPrefixListEntries().validate([deepcopy(entry)])
+            self.assertEqual(str(res.exception), str(exp.exception))
@@ -0,0 +1,131 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+
+from .cfg_base import TestConfigParserBase
+from pierky.arouteserver.config.profiles import ConfigParserProfiles
+
+
+class TestConfigParserProfiles(TestConfigParserBase):
+
+    CONFIG_PARSER_CLASS = ConfigParserProfiles
+    SHORT_DESCR = "Profiles config parser"
+
+    PROFILES = "\n".join([
+        "profiles:",
+        "  - name: rs1",
+        "    general_overrides:",
+        "      router_id: 192.0.2.1",
+        "      filtering:",
+        "        max_as_path_len: 16",
+        "    targets:",
+        "      - 'bird:4=rs1-bird4.conf'",
+        "      - 'openbgpd=rs1-bgpd.conf'",
+        "  - name: rs2",
+        "    general: general-rs2.yml",
+        "    templates_dir: /etc/arouteserver/templates-rs2",
+        "    ip_ver: 6",
+        "    targets:",
+        "      - 'bird=/etc/bird/rs2-bird6.conf'",
+        "      - 'html:4=/var/www/rs2.html'",
+    ])
+
+    def _setUp(self):
+        self.load_config(yaml=self.PROFILES)
+
+    def test_valid_cfg(self):
+        """{}: valid configuration"""
+        self._contains_err()
+
+        rs1, rs2 = self.cfg.cfg["profiles"]
+        self.assertEqual(rs1["general"], None)
+        self.assertEqual(rs1["general_overrides"],
+                         {"router_id": "192.0.2.1",
+                          "filtering": {"max_as_path_len": 16}})
+        self.assertEqual(rs1["targets"], [
+            {"speaker": "bird", "ip_ver": 4,
+             "output_file": "rs1-bird4.conf"},
+            {"speaker": "openbgpd", "ip_ver": None,
+             "output_file": "rs1-bgpd.conf"}
+        ])
+
+        # Profile's ip_ver is used when the target's one is not set.
+        self.assertEqual(rs2["general_overrides"], None)
+        self.assertEqual([t["ip_ver"] for t in rs2["targets"]], [6, 4])
+
+    def test_relative_paths(self):
+        """{}: relative paths"""
+        tmp_dir = tempfile.mkdtemp(suffix="arouteserver_unittest")
+        try:
+            path = os.path.join(tmp_dir, "profiles.yml")
+            with open(path, "w") as f:
+                f.write(self.PROFILES)
+
+            self.cfg = ConfigParserProfiles()
+            self.cfg.load(path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        rs1, rs2 = self.cfg.cfg["profiles"]
+        self.assertEqual(rs1["targets"][0]["output_file"],
+                         os.path.join(tmp_dir, "rs1-bird4.conf"))
+        self.assertEqual(rs2["general"],
+                         os.path.join(tmp_dir, "general-rs2.yml"))
+        self.assertEqual(rs2["templates_dir"],
+                         "/etc/arouteserver/templates-rs2")
+        self.assertEqual(rs2["targets"][0]["output_file"],
+                         "/etc/bird/rs2-bird6.conf")
+
+    def test_missing_name(self):
+        """{}: missing name"""
+        del self.cfg[0]["name"]
+        self._contains_err("Error parsing 'name' at '' level - Can't be empty.")
+
+    def test_duplicate_name(self):
+        """{}: duplicate name"""
+        self.cfg[1]["name"] = "rs1"
+        self._contains_err("Duplicate profile name: rs1")
+
+    def test_unknown_statement(self):
+        """{}: unknown statement"""
+        self.cfg[0]["test"] = 1
+        self._contains_err("Unknown statement at '' level: 'test'.")
+
+    def test_invalid_overrides(self):
+        """{}: invalid general overrides"""
+        self.cfg[0]["general_overrides"] = "router_id"
+        self._contains_err("Invalid format for 'general_overrides'")
+
+    def test_invalid_ip_ver(self):
+        """{}: invalid ip_ver"""
+        self.cfg[1]["ip_ver"] = 5
+        self._contains_err("Invalid option for 'ip_ver': '5'")
+
+    def test_invalid_target(self):
+        """{}: invalid targets"""
+        for target, err in (
+            ("bird:4", "Invalid target 'bird:4'"),
+            ("bird:5=bird.conf",
+             "Invalid IP version for target 'bird:5=bird.conf'"),
+            ("quagga=bgpd.conf",
+             "Invalid speaker for target 'quagga=bgpd.conf'"),
+            ("bird=", "Missing output file for target 'bird='"),
+        ):
+            self.load_config(yaml=self.PROFILES)
+            self.cfg[0]["targets"] = [target]
+            self._contains_err(err)
@@ -0,0 +1,250 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pierky.arouteserver.cached_objects import CircuitBreakers, \
+                                              FetchDurations, cache_stats, \
+                                              fetch_durations, memory_cache
+from pierky.arouteserver.enrichers.base import BaseConfigEnricher
+from pierky.arouteserver.enrichers.concurrency import ConcurrencyLimiter
+from pierky.arouteserver.enrichers.scheduler import ConfigEnrichersScheduler
+from pierky.arouteserver.enrichers.irrdb import \
+    IRRDBConfigEnricher_OriginASNs
+from pierky.arouteserver.irrdb import ASSet
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def request(self, limiter, latency=1, succeeded=True, external=True):
+        started = limiter.acquire()
+        limiter.release(started - latency, succeeded, external)
+
+    def test_additive_increase(self):
+        """Concurrency limiter: additive increase"""
+        limiter = ConcurrencyLimiter("test", 2, min_limit=1, max_limit=4)
+        for i in range(2):
+            self.request(limiter)
+        self.assertEqual(limiter.get_limit(), 3)
+        for i in range(20):
+            self.request(limiter)
+        self.assertEqual(limiter.get_limit(), 4)
+
+    def test_multiplicative_decrease(self):
+        """Concurrency limiter: multiplicative decrease on errors"""
+        limiter = ConcurrencyLimiter("test", 8, min_limit=3, max_limit=16)
+        self.request(limiter, succeeded=False)
+        self.assertEqual(limiter.get_limit(), 4)
+        limiter.last_decrease = 0
+        self.request(limiter, succeeded=False)
+        self.assertEqual(limiter.get_limit(), 3)
+
+    def test_latency(self):
+        """Concurrency limiter: decrease on latency degradation"""
+        limiter = ConcurrencyLimiter("test", 8, min_limit=1, max_limit=16)
+        self.request(limiter, latency=1)
+        limit = limiter.get_limit()
+        for i in range(10):
+            limiter.last_decrease = 0
+            self.request(limiter, latency=10)
+        self.assertTrue(limiter.get_limit() < limit)
+
+    def test_cache_hits(self):
+        """Concurrency limiter: cache hits don't change the limit"""
+        limiter = ConcurrencyLimiter("test", 2, min_limit=1, max_limit=4)
+        for i in range(10):
+            self.request(limiter, external=False)
+        self.assertEqual(limiter.get_limit(), 2)
+
+    def test_not_adaptive(self):
+        """Concurrency limiter: fixed limit"""
+        limiter = ConcurrencyLimiter("test", 4, min_limit=1, max_limit=16,
+                                     adaptive=False)
+        self.assertEqual(limiter.max_limit, 4)
+        self.request(limiter, succeeded=False)
+        for i in range(10):
+            self.request(limiter)
+        self.assertEqual(limiter.get_limit(), 4)
+
+
+class TestConfigEnrichersScheduler(unittest.TestCase):
+
+    def test_shared_slots(self):
+        """Enrichers scheduler: enrichers with the same source share slots"""
+        used_slots = {}
+
+        class DummyEnricher(BaseConfigEnricher):
+
+            def enrich(self):
+                used_slots[self.__class__.__name__] = self.slots
+
+        class DummyEnricher_A1(DummyEnricher):
+            SOURCE = "a"
+            PROVIDES = ("a1",)
+
+        class DummyEnricher_A2(DummyEnricher):
+            SOURCE = "a"
+            PROVIDES = ("a2",)
+
+        class DummyEnricher_B(DummyEnricher):
+            SOURCE = "b"
+            REQUIRES = ("a1",)
+
+        class DummyEnricher_NoSource(DummyEnricher):
+            pass
+
+        scheduler = ConfigEnrichersScheduler(
+            None, [DummyEnricher_A1, DummyEnricher_A2, DummyEnricher_B,
+                   DummyEnricher_NoSource], [], threads=4
+        )
+        self.assertEqual(sorted(scheduler.sources_slots), ["a", "b"])
+        self.assertTrue(scheduler.run())
+
+        self.assertIs(used_slots["DummyEnricher_A1"],
+                      scheduler.sources_slots["a"])
+        self.assertIs(used_slots["DummyEnricher_A2"],
+                      scheduler.sources_slots["a"])
+        self.assertIs(used_slots["DummyEnricher_B"],
+                      scheduler.sources_slots["b"])
+        self.assertIsNone(used_slots["DummyEnricher_NoSource"])
+
+class DummyBuilder(object):
+
+    def __init__(self, cache_dir, as_set_names):
+        self.cache_dir = cache_dir
+        self.cache_expiry = 43200
+        self.bgpq3_path = "bgpq3"
+        self.bgpq3_host = None
+        self.bgpq3_sources = None
+        self.ip_ver = 4
+        self.irrdb_timeout = None
+        self.fetch_deadline = None
+        self.fetch_retries = 0
+        self.circuit_breakers = CircuitBreakers()
+        self.parsing_pool = None
+        self.enrichers_engine = "threads"
+        self.irrdb_async_concurrency = 1
+        self.as_sets = {}
+        for name in as_set_names:
+            self.as_sets[name] = {"id": name, "name": name, "asns": [],
+                                  "prefixes": [], "used_by": ["client"]}
+
+class TestIRRDBTasksScheduling(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_longest_job_first(self):
+        """IRRDB enricher: longest job first"""
+        with open(os.path.join(self.cache_dir,
+                               FetchDurations.FILENAME), "w") as f:
+            json.dump({"AS-SLOW-as_set.json": 30,
+                       "AS-FAST-as_set.json": 1,
+                       "AS-CACHED-as_set.json": 60}, f)
+        with open(os.path.join(self.cache_dir,
+                               "AS-CACHED-as_set.json"), "w") as f:
+            json.dump({"ts": 0, "data": [1]}, f)
+
+        builder = DummyBuilder(self.cache_dir,
+                               ["AS-FAST", "AS-CACHED", "AS-NEW", "AS-SLOW"])
+        enricher = IRRDBConfigEnricher_OriginASNs(builder, threads=1)
+        enricher.add_tasks()
+
+        order = []
+        while not enricher.tasks_q.empty():
+            order.append(enricher.tasks_q.get()[2])
+        self.assertEqual(order, ["AS-NEW", "AS-SLOW", "AS-FAST", "AS-CACHED"])
+
+class TestIRRDBAsyncEngine(unittest.TestCase):
+
+    # Fake bgpq3: the names of the objects it's executed for are
+    # logged, in the order the processes are started.
+    BGPQ3 = ("#!/bin/sh\n"
+             "for name; do true; done\n"
+             "echo \"$name\" >> {log}\n"
+             "echo \'{{\"asn_list\": [1, 2]}}\'\n")
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.cache_dir, "bgpq3.log")
+        self.bgpq3_path = os.path.join(self.cache_dir, "bgpq3")
+        with open(self.bgpq3_path, "w") as f:
+            f.write(self.BGPQ3.format(log=self.log_path))
+        os.chmod(self.bgpq3_path, 0o755)
+
+        cache_stats.reset()
+        fetch_durations.reset()
+        memory_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        cache_stats.reset()
+        fetch_durations.reset()
+        memory_cache.clear()
+
+    def _get_enricher(self, as_set_names):
+        builder = DummyBuilder(self.cache_dir, as_set_names)
+        builder.bgpq3_path = self.bgpq3_path
+        builder.bgpq3_host = "rr.example.com"
+        builder.bgpq3_sources = "RIPE"
+        builder.enrichers_engine = "async"
+        return IRRDBConfigEnricher_OriginASNs(builder, threads=1)
+
+    def test_cold_build_stats(self):
+        """IRRDB enricher, async engine: cache stats and fetch durations"""
+        with open(os.path.join(self.cache_dir,
+                               "AS-CACHED-as_set.json"), "w") as f:
+            json.dump({"ts": int(time.time()), "data": [1]}, f)
+
+        enricher = self._get_enricher(["AS-ONE", "AS-TWO", "AS-CACHED"])
+        enricher.prefetch()
+
+        # Objects are then loaded by the worker threads.
+        irrdbtools_cfg = enricher._get_irrdbtools_cfg()
+        for name in enricher.builder.as_sets:
+            self.assertEqual(ASSet(name, **irrdbtools_cfg).asns,
+                             [1] if name == "AS-CACHED" else [1, 2])
+
+        self.assertEqual(cache_stats.hits, 1)
+        self.assertEqual(cache_stats.misses, 2)
+        self.assertEqual(sorted(fetch_durations.durations),
+                         ["AS-ONE-as_set.json", "AS-TWO-as_set.json"])
+
+        with open(self.log_path, "r") as f:
+            self.assertEqual(sorted(f.read().split()), ["AS-ONE", "AS-TWO"])
+
+    def test_prefetch_longest_job_first(self):
+        """IRRDB enricher, async engine: longest job first"""
+        with open(os.path.join(self.cache_dir,
+                               FetchDurations.FILENAME), "w") as f:
+            json.dump({"AS-SLOW-as_set.json": 30,
+                       "AS-FAST-as_set.json": 1,
+                       "AS-MEDIUM-as_set.json": 10}, f)
+
+        enricher = self._get_enricher(
+            ["AS-FAST", "AS-NEW", "AS-MEDIUM", "AS-SLOW"])
+        enricher.prefetch()
+
+        with open(self.log_path, "r") as f:
+            self.assertEqual(f.read().split(),
+                             ["AS-NEW", "AS-SLOW", "AS-MEDIUM", "AS-FAST"])
@@ -0,0 +1,122 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import subprocess
+import time
+import unittest
+
+from pierky.arouteserver.errors import IRRDBToolsError
+from pierky.arouteserver.irrdb import AsyncCommandsRunner, ParsingPool, \
+                                     RSet, run_command
+
+
+class TestAsyncCommandsRunner(unittest.TestCase):
+
+    def run_jobs(self, cmds, max_in_flight=2, timeout=None):
+        results = {}
+        self.durations = {}
+
+        def get_callback(idx):
+            def callback(returncode, out, duration):
+                results[idx] = (returncode, out)
+                self.durations[idx] = duration
+            return callback
+
+        AsyncCommandsRunner(max_in_flight, timeout).run(
+            [(cmd, get_callback(idx)) for idx, cmd in enumerate(cmds)]
+        )
+        return [results[idx] for idx in range(len(cmds))]
+
+    def test_output(self):
+        """Async commands runner: output and exit codes"""
+        results = self.run_jobs([
+            ["echo", "a"],
+            ["sh", "-c", "echo b; exit 1"],
+            ["sh", "-c", "sleep 0.1; echo c"],
+        ])
+        self.assertEqual(results, [(0, "a\n"), (1, "b\n"), (0, "c\n")])
+        self.assertTrue(self.durations[2] >= 0.1)
+
+    def test_missing_command(self):
+        """Async commands runner: commands that can't be executed"""
+        results = self.run_jobs([
+            ["/nonexistent/command"],
+            ["echo", "a"],
+        ], max_in_flight=1)
+        self.assertEqual(results, [(None, None), (0, "a\n")])
+        self.assertIsNone(self.durations[0])
+        self.assertIsNotNone(self.durations[1])
+
+    def test_timeout(self):
+        """Async commands runner: commands killed after timeout"""
+        start = time.time()
+        results = self.run_jobs([
+            ["sleep", "10"],
+            ["echo", "a"],
+        ], timeout=0.5)
+        self.assertTrue(time.time() - start < 5)
+        self.assertNotEqual(results[0][0], 0)
+        self.assertEqual(results[1], (0, "a\n"))
+
+class TestRunCommand(unittest.TestCase):
+
+    def test_output(self):
+        """Run command: output and exit code"""
+        self.assertEqual(run_command(["echo", "a"], 5), b"a\n")
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_command(["false"])
+
+    def test_timeout(self):
+        """Run command: killed after timeout"""
+        start = time.time()
+        with self.assertRaises(IRRDBToolsError):
+            run_command(["sleep", "10"], 0.5)
+        self.assertTrue(time.time() - start < 5)
+
+class TestParsingPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ParsingPool(processes=2, min_size=2)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def parse(self, raw_prefixes, parsing_pool):
+        rset = RSet("AS-TEST", 4, cache_dir="var", defer_load=True,
+                    parsing_pool=parsing_pool)
+        return rset._parse_bgpq3_data({"prefix_list": raw_prefixes})
+
+    def test_same_output(self):
+        """Parsing pool: same output of in-thread parsing"""
+        raw_prefixes = [
+            {"prefix": "192.0.2.0/24", "exact": True},
+            {"prefix": "198.51.100.0/24", "exact": False,
+             "greater-equal": 25, "less-equal": 32},
+            {"prefix": "203.0.113.0/24", "exact": False,
+             "less-equal": 28},
+        ]
+        self.assertEqual(self.parse(raw_prefixes, self.pool),
+                         self.parse(raw_prefixes, None))
+
+    def test_invalid_prefix(self):
+        """Parsing pool: invalid prefixes"""
+        raw_prefixes = [
+            {"prefix": "192.0.2.0/24", "exact": True},
+            {"prefix": "198.51.100.0/24", "exact": False,
+             "greater-equal": 16},
+        ]
+        with self.assertRaises(IRRDBToolsError):
+            self.parse(raw_prefixes, self.pool)
@@ -0,0 +1,98 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import unittest
+
+import yaml
+
+from pierky.arouteserver.config.validators import ValidatorPrefixListEntry
+from pierky.arouteserver.irrdb import RSet
+from pierky.arouteserver.prefix_list import PrefixListEntry, \
+                                           PrefixListSafeDumper
+
+
+class TestPrefixListEntry(unittest.TestCase):
+
+    def get_dict(self, comment="AS-TEST"):
+        return ValidatorPrefixListEntry().validate({
+            "prefix": "192.0.2.0",
+            "length": 24,
+            "le": 32,
+            "comment": comment
+        })
+
+    def test_dict_conversion(self):
+        """Prefix list entry: conversion from/to dict"""
+        d = self.get_dict()
+        entry = PrefixListEntry.from_dict(d)
+        self.assertEqual(entry.to_dict(), d)
+        self.assertEqual(entry.prefix, "192.0.2.0")
+        self.assertEqual(entry["le"], 32)
+        self.assertEqual(entry.get("ge"), None)
+        self.assertEqual(entry.get("foo", 1), 1)
+        with self.assertRaises(KeyError):
+            entry["foo"]
+        with self.assertRaises(AttributeError):
+            entry.foo = 1
+
+    def test_equality(self):
+        """Prefix list entry: equality and hashing"""
+        a = PrefixListEntry.from_dict(self.get_dict())
+        b = PrefixListEntry.from_dict(self.get_dict())
+        c = PrefixListEntry.from_dict(self.get_dict("AS-OTHER"))
+        self.assertEqual(a, b)
+        self.assertEqual(a, self.get_dict())
+        self.assertNotEqual(a, c)
+        self.assertEqual(len(set([a, b, c])), 2)
+
+    def test_interned_comments(self):
+        """Prefix list entry: comments are shared"""
+        a = PrefixListEntry("192.0.2.0", 24, 32, comment="".join("AS-X"))
+        b = PrefixListEntry("192.0.2.0", 25, 32, comment="".join("AS-X"))
+        self.assertIs(a.comment, b.comment)
+
+    def test_yaml(self):
+        """Prefix list entry: YAML representation"""
+        d = self.get_dict()
+        entry = PrefixListEntry.from_dict(d)
+        self.assertEqual(
+            yaml.dump([entry], Dumper=PrefixListSafeDumper),
+            yaml.safe_dump([d])
+        )
+
+class TestRSetCache(unittest.TestCase):
+
+    def test_cache(self):
+        """Prefix list entry: R_SET cached data conversion"""
+        rset = RSet("AS-TEST", 4, cache_dir="var", defer_load=True)
+        prefixes = rset._parse_bgpq3_data({"prefix_list": [
+            {"prefix": "192.0.2.0/24", "exact": True},
+            {"prefix": "198.51.100.0/24", "exact": False,
+             "less-equal": 28},
+        ]})
+        self.assertTrue(
+            all(isinstance(_, PrefixListEntry) for _ in prefixes)
+        )
+
+        # Cache files contain plain dicts.
+        data = json.loads(json.dumps(rset._encode_cached_data(prefixes)))
+        self.assertEqual(data, [_.to_dict() for _ in prefixes])
+
+        decoded = rset._decode_cached_data(data)
+        self.assertTrue(
+            all(isinstance(_, PrefixListEntry) for _ in decoded)
+        )
+        self.assertEqual(decoded, prefixes)
@@ -0,0 +1,204 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import ipaddr
+import random
+import unittest
+
+from pierky.arouteserver.prefix_list import PrefixListEntry
+from pierky.arouteserver.prefix_set import PrefixSet, aggregate_prefix_list, \
+                                          prune_prefix_list
+
+
+def brute_force_match(entries, prefix, length):
+    route = ipaddr.IPNetwork("{}/{}".format(prefix, length))
+    for entry in entries:
+        net = ipaddr.IPNetwork("{}/{}".format(entry.prefix, entry.length))
+        if route.version != net.version or \
+            not (route.network in net and route.prefixlen >= net.prefixlen):
+            continue
+        if entry.exact:
+            ge, le = entry.length, entry.length
+        else:
+            ge = entry.ge or entry.length
+            le = entry.le or entry.max_length
+        if ge <= length <= le:
+            return True
+    return False
+
+class TestPrefixSet(unittest.TestCase):
+
+    def get_random_entries(self, rnd, cnt):
+        res = []
+        for _ in range(cnt):
+            length = rnd.randint(8, 14)
+            net = ipaddr.IPNetwork("10.{}.0.0/{}".format(
+                rnd.randint(0, 255), length)).masked()
+            exact = rnd.random() < 0.3
+            ge = le = None
+            if not exact:
+                if rnd.random() < 0.5:
+                    ge = rnd.randint(length, 16)
+                if rnd.random() < 0.5:
+                    le = rnd.randint(ge or length, 16)
+            res.append(PrefixListEntry(str(net.ip), length, 32, exact,
+                                       ge, le))
+        return res
+
+    def get_routes(self):
+        for second in range(0, 256, 3):
+            for length in range(8, 18):
+                net = ipaddr.IPNetwork("10.{}.0.0/{}".format(
+                    second, length)).masked()
+                yield str(net.ip), length
+
+    def test_canonical_order(self):
+        """Prefix set: iteration in canonical order"""
+        s = PrefixSet()
+        s.insert("2001:db8::", 32, ge=48, le=48)
+        s.insert("192.0.2.0", 24, exact=True)
+        s.insert("10.0.0.0", 8, le=24)
+        s.insert("10.0.0.0", 8, ge=25, le=26)
+        s.insert("10.1.0.0", 16)
+        s.insert("::ffff:0:0", 96)
+        self.assertEqual(
+            [(e.prefix, e.length, e.exact, e.ge, e.le) for e in s],
+            [
+                ("10.0.0.0", 8, False, None, 26),
+                ("10.1.0.0", 16, False, None, None),
+                ("192.0.2.0", 24, True, None, None),
+                ("::ffff:0:0", 96, False, None, None),
+                ("2001:db8::", 32, False, 48, 48),
+            ]
+        )
+        self.assertEqual(len(s), 5)
+        self.assertEqual(len(list(s.iter_entries(ip_ver=6))), 2)
+
+    def test_covering(self):
+        """Prefix set: covering entries"""
+        s = PrefixSet()
+        s.insert("10.0.0.0", 8, exact=True)
+        s.insert("10.1.0.0", 16)
+        s.insert("10.2.0.0", 16)
+        self.assertEqual(
+            [(e.prefix, e.length) for e in s.get_covering("10.1.2.0", 24)],
+            [("10.0.0.0", 8), ("10.1.0.0", 16)]
+        )
+        self.assertEqual(s.get_covering("192.0.2.0", 24), [])
+        self.assertFalse(s.match("10.0.0.0", 9))
+        self.assertTrue(s.match("10.0.0.0", 8))
+        self.assertTrue(s.match("10.2.3.0", 24))
+
+    def test_match(self):
+        """Prefix set: same matches of a linear scan"""
+        rnd = random.Random(1)
+        entries = self.get_random_entries(rnd, 200)
+        s = PrefixSet(entries)
+        for prefix, length in self.get_routes():
+            self.assertEqual(s.match(prefix, length),
+                             brute_force_match(entries, prefix, length),
+                             "{}/{}".format(prefix, length))
+
+    def test_union_intersection(self):
+        """Prefix set: union and intersection"""
+        rnd = random.Random(2)
+        entries1 = self.get_random_entries(rnd, 100)
+        entries2 = self.get_random_entries(rnd, 100)
+        s1 = PrefixSet(entries1)
+        s2 = PrefixSet(entries2)
+        union = s1.union(s2)
+        intersection = s1.intersection(s2)
+        for prefix, length in self.get_routes():
+            m1 = brute_force_match(entries1, prefix, length)
+            m2 = brute_force_match(entries2, prefix, length)
+            self.assertEqual(union.match(prefix, length), m1 or m2)
+            self.assertEqual(intersection.match(prefix, length), m1 and m2)
+
+    def test_aggregate(self):
+        """Prefix set: aggregation matches the same routes"""
+        rnd = random.Random(3)
+        for _ in range(2):
+            entries = self.get_random_entries(rnd, 150)
+            aggregated = aggregate_prefix_list(entries)
+            self.assertTrue(len(aggregated) <= len(entries))
+            for prefix, length in self.get_routes():
+                self.assertEqual(
+                    brute_force_match(aggregated, prefix, length),
+                    brute_force_match(entries, prefix, length),
+                    "{}/{}".format(prefix, length)
+                )
+
+    def test_aggregate_adjacent(self):
+        """Prefix set: aggregation of adjacent and covered prefixes"""
+        entries = [
+            PrefixListEntry("10.0.0.0", 24, 32, True, comment="A"),
+            PrefixListEntry("10.0.1.0", 24, 32, True, comment="B"),
+            PrefixListEntry("10.0.2.0", 23, 32, False, 24, 24, comment="C"),
+            PrefixListEntry("10.0.0.0", 25, 32, False, None, 26,
+                            comment="D"),
+            PrefixListEntry("10.0.0.128", 25, 32, True, comment="E"),
+            PrefixListEntry("2001:db8::", 32, 128, False, comment="F"),
+            PrefixListEntry("2001:db8:1::", 48, 128, True, comment="G"),
+        ]
+        self.assertEqual(
+            [(e.prefix, e.length, e.exact, e.ge, e.le, e.comment)
+             for e in aggregate_prefix_list(entries)],
+            [
+                ("10.0.0.0", 22, False, 24, 24, "A, B, C"),
+                ("10.0.0.0", 25, False, None, 26, "D"),
+                ("10.0.0.128", 25, True, None, None, "E"),
+                ("2001:db8::", 32, False, None, None, "F, G"),
+            ]
+        )
+
+    def test_prune(self):
+        """Prefix set: pruning of rejected routes"""
+        rnd = random.Random(4)
+        for _ in range(2):
+            entries = self.get_random_entries(rnd, 100)
+            rejected_entries = self.get_random_entries(rnd, 20)
+            rejected = PrefixSet(rejected_entries)
+            pruned = prune_prefix_list(entries, rejected)
+            for prefix, length in self.get_routes():
+                orig_match = brute_force_match(entries, prefix, length)
+                pruned_match = brute_force_match(pruned, prefix, length)
+                if pruned_match:
+                    self.assertTrue(orig_match)
+                if not brute_force_match(rejected_entries, prefix, length):
+                    self.assertEqual(pruned_match, orig_match)
+
+    def test_prune_clip(self):
+        """Prefix set: pruning, entries clipped or removed"""
+        entries = [
+            PrefixListEntry("10.0.0.0", 16, 32, False, None, None,
+                            comment="A"),
+            PrefixListEntry("10.1.0.0", 24, 32, True, comment="B"),
+            PrefixListEntry("192.0.2.0", 24, 32, True, comment="C"),
+        ]
+        rejected = PrefixSet()
+        rejected.insert_range("0.0.0.0", 0, 25, 32)
+        rejected.insert_range("0.0.0.0", 0, 18, 20)
+        rejected.insert("10.1.0.0", 16)
+        pruned = prune_prefix_list(entries, rejected)
+        self.assertEqual(
+            [(e.prefix, e.length, e.exact, e.ge, e.le, e.comment)
+             for e in pruned],
+            [
+                ("10.0.0.0", 16, False, None, 17, "A"),
+                ("10.0.0.0", 16, False, 21, 24, "A"),
+                ("192.0.2.0", 24, True, None, None, "C"),
+            ]
+        )
+        self.assertIs(pruned[2], entries[2])
@@ -0,0 +1,117 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from jinja2 import ChoiceLoader, ModuleLoader
+
+from pierky.arouteserver.builder import ConfigBuilder
+from pierky.arouteserver.templates_cache import TemplatesBundle, \
+                                                TemplatesBytecodeCache
+
+
+class TestTemplatesCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(suffix="arouteserver_unittest")
+        self.template_dir = tempfile.mkdtemp(suffix="arouteserver_unittest")
+        self._write("main.j2",
+                    "{% import 'macros.j2' as macros %}"
+                    "{% for ip in ips if ip is current_ipver %}"
+                    "{{ macros.show(ip) }}\n"
+                    "{% endfor %}")
+        self._write("macros.j2",
+                    "{% macro show(ip) %}{{ ip }} v{{ ip|ipaddr_ver }}"
+                    "{% endmacro %}")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.template_dir, ignore_errors=True)
+
+    def _write(self, filename, doc):
+        with open(os.path.join(self.template_dir, filename), "w") as f:
+            f.write(doc)
+
+    def _get_env(self, cache_compiled_templates=False):
+        return ConfigBuilder.get_j2_environment(
+            self.template_dir, cache_dir=self.cache_dir,
+            cache_compiled_templates=cache_compiled_templates, ip_ver=4
+        )
+
+    def _render(self, cache_compiled_templates=False):
+        env = self._get_env(cache_compiled_templates)
+        return env.get_template("main.j2").render(
+            ips=["192.0.2.1", "2001:db8::1"]
+        )
+
+    def test_bytecode_cache(self):
+        """Templates cache: bytecode cache"""
+        exp = "192.0.2.1 v4\n"
+        bytecode_dir = os.path.join(self.cache_dir,
+                                    TemplatesBytecodeCache.DIRNAME)
+
+        res = self._render(True)
+        self.assertEqual(res, exp)
+        self.assertEqual(len(os.listdir(bytecode_dir)), 2)
+
+        res = self._render(True)
+        self.assertEqual(res, exp)
+
+        # Template changed: compiled again.
+        self._write("macros.j2",
+                    "{% macro show(ip) %}IP {{ ip }}{% endmacro %}")
+        res = self._render(True)
+        self.assertEqual(res, "IP 192.0.2.1\n")
+        self.assertEqual(len(os.listdir(bytecode_dir)), 2)
+
+    def test_bundle(self):
+        """Templates cache: compiled templates bundle"""
+        exp = self._render()
+
+        bundle = TemplatesBundle(self.cache_dir, self.template_dir)
+        self.assertIsNone(bundle.get_loader())
+
+        ConfigBuilder.compile_templates(self.template_dir, self.cache_dir)
+        self.assertIsNotNone(bundle.get_loader())
+
+        env = self._get_env(True)
+        self.assertIsInstance(env.loader, ChoiceLoader)
+        self.assertIsInstance(env.loader.loaders[0], ModuleLoader)
+
+        # Templates are taken from the bundle: they are not compiled,
+        # so nothing is saved in the bytecode cache.
+        res = self._render(True)
+        self.assertEqual(res, exp)
+        self.assertEqual(os.listdir(
+            os.path.join(self.cache_dir, TemplatesBytecodeCache.DIRNAME)
+        ), [])
+
+        # Templates changed: the bundle is no longer used.
+        self._write("macros.j2",
+                    "{% macro show(ip) %}IP {{ ip }}{% endmacro %}")
+        self.assertIsNone(bundle.get_loader())
+        self.assertEqual(self._render(True), "IP 192.0.2.1\n")
+
+    def test_dirs_mode(self):
+        """Templates cache: directories writable by the owner only"""
+        self._render(True)
+        ConfigBuilder.compile_templates(self.template_dir, self.cache_dir)
+        for dirname in (TemplatesBytecodeCache.DIRNAME,
+                        TemplatesBundle.DIRNAME):
+            mode = os.stat(os.path.join(self.cache_dir, dirname)).st_mode
+            self.assertEqual(mode & 0o777, 0o700)
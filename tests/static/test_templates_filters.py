@@ -0,0 +1,79 @@
+# Copyright (C) 2017 Pier Carlo Chiodi
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from pierky.arouteserver.prefix_list import PrefixListEntry
+from pierky.arouteserver.templates_filters import bird_prefix_list, \
+    bird_asn_list, openbgpd_prefix_list, openbgpd_asn_list
+
+
+class TestTemplatesFilters(unittest.TestCase):
+
+    PREFIX_LIST = [
+        PrefixListEntry("10.0.0.0", 8, 32, le=24, comment="AS-A"),
+        {"prefix": "2001:db8::", "length": 32, "max_length": 128,
+         "exact": True, "ge": None, "le": None, "comment": None},
+        PrefixListEntry("192.0.2.0", 24, 32, ge=25, comment="AS-B"),
+        PrefixListEntry("198.51.100.0", 24, 32, exact=True),
+        PrefixListEntry("203.0.113.0", 24, 32, exact=True),
+        PrefixListEntry("172.16.0.0", 12, 32, exact=True),
+    ]
+
+    def test_bird_prefix_list(self):
+        """Templates filters: BIRD prefix list"""
+        self.assertEqual(
+            bird_prefix_list(self.PREFIX_LIST[:3], 4),
+            "\t\t# AS-A\n\t\t10.0.0.0/8{8,24},\n\n"
+            "\t\t# AS-B\n\t\t192.0.2.0/24{25,32}"
+        )
+        self.assertEqual(
+            bird_prefix_list(self.PREFIX_LIST[:3], 6),
+            "\t\t# None\n\t\t2001:db8::/32"
+        )
+        self.assertEqual(bird_prefix_list([], 4), "")
+
+    def test_bird_prefix_list_group(self):
+        """Templates filters: BIRD prefix list, grouped"""
+        self.assertEqual(
+            bird_prefix_list(self.PREFIX_LIST, 4, group=True),
+            "\t10.0.0.0/8{8,24}, \t192.0.2.0/24{25,32}, "
+            "\t198.51.100.0/24, \t203.0.113.0/24,\n"
+            "\t172.16.0.0/12"
+        )
+
+    def test_bird_asn_list(self):
+        """Templates filters: BIRD ASN list"""
+        self.assertEqual(bird_asn_list([1, 2, 3]), "\t1, 2, 3")
+        self.assertEqual(bird_asn_list(range(1, 7)),
+                         "\t1, 2, 3, 4, 5, \n\t6")
+        self.assertEqual(bird_asn_list(range(1, 6)),
+                         "\t1, 2, 3, 4, 5\n\t")
+
+    def test_openbgpd_prefix_list(self):
+        """Templates filters: OpenBGPD prefix list"""
+        self.assertEqual(
+            openbgpd_prefix_list(self.PREFIX_LIST[:3]),
+            "10.0.0.0/8 prefixlen 8 - 24, 2001:db8::/32, "
+            "192.0.2.0/24 prefixlen 25 - 32"
+        )
+        self.assertEqual(
+            openbgpd_prefix_list(self.PREFIX_LIST[:3], 6),
+            "2001:db8::/32"
+        )
+
+    def test_openbgpd_asn_list(self):
+        """Templates filters: OpenBGPD ASN list"""
+        self.assertEqual(openbgpd_asn_list([1, 2, 3]), "1, 2, 3")